@@ -7,7 +7,6 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent / "src"))
 
 from src.rag_agent import FitnessRAGAgent
-from src.api_wrapper import start_api_server, start_cli
 from src.config import Config
 
 def load_sample_data():
@@ -44,19 +43,49 @@ def setup_agent():
     
     return agent
 
+def print_stats():
+    """Print statistics of the saved index without loading the model"""
+    agent = FitnessRAGAgent()
+    if not agent.load_index():
+        print("No existing index found.")
+        return
+    print(json.dumps(agent.get_stats(), indent=2))
+
+def serve_shard(shard_id: int, host: str, port: int):
+    """Serve one shard of the corpus for a coordinator configured with SHARD_ADDRESSES"""
+    from src.sharding import run_shard, shard_path
+    
+    if not Config.SHARD_AUTHKEY:
+        print("SHARD_AUTHKEY must be set to serve a shard")
+        sys.exit(1)
+    print(f"Serving shard {shard_id} on {host}:{port}")
+    run_shard(shard_path(Config.INDEX_FILE, shard_id), shard_path(Config.METADATA_FILE, shard_id),
+              (host, port), Config.SHARD_AUTHKEY.encode("utf-8"))
+
 def main():
     parser = argparse.ArgumentParser(description="Fitness RAG Agent")
-    parser.add_argument("mode", choices=["cli", "api"], default="cli", nargs="?",
-                       help="Run mode: cli (interactive) or api (server)")
+    parser.add_argument("mode", choices=["cli", "api", "stats", "shard"], default="cli", nargs="?",
+                       help="Run mode: cli (interactive), api (server), stats (print index statistics) "
+                            "or shard (serve one shard)")
     parser.add_argument("--host", default=Config.API_HOST, help="API host")
     parser.add_argument("--port", type=int, default=Config.API_PORT, help="API port")
+    parser.add_argument("--shard-id", type=int, default=0, help="Shard served in shard mode")
+    parser.add_argument("--workers", type=int, default=Config.API_WORKERS,
+                        help="API worker processes sharing one memory-mapped index")
     
     args = parser.parse_args()
     
+    # The API stack (FastAPI, uvicorn) is only imported by the modes that use it
     if args.mode == "api":
+        from src.api_wrapper import start_api_server
         print(f"Starting API server on {args.host}:{args.port}")
-        start_api_server(host=args.host, port=args.port)
+        start_api_server(host=args.host, port=args.port, workers=args.workers)
+    elif args.mode == "stats":
+        print_stats()
+    elif args.mode == "shard":
+        serve_shard(args.shard_id, args.host, args.port)
     else:
+        from src.api_wrapper import start_cli
         print("Starting CLI mode...")
         start_cli()
 
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""End-to-end benchmarks: ingestion, persistence, search latency, HTTP throughput and memory"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+from pathlib import Path
+
+import numpy as np
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from scripts.docstore_memory import synthetic_documents
+from scripts.index_report import synthetic_embeddings
+from scripts.stress_test import HTTPClient
+from src.config import Config
+from src.rag_agent import FitnessRAGAgent
+
+ROOT = Path(__file__).parent.parent
+
+def rss_mb(pid="self") -> float:
+    """Resident set size of a process in MB"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Not Linux: fall back to this process's peak
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale / 1024
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB"""
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale / 1024
+
+def tree_rss_mb(pid: int) -> float:
+    """RSS of a process and its descendants (API workers) in MB; shared pages are counted per process"""
+    children = {}
+    for entry in os.listdir("/proc") if os.path.isdir("/proc") else []:
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    parent = int(f.read().rsplit(")", 1)[1].split()[1])
+                children.setdefault(parent, []).append(int(entry))
+            except (OSError, IndexError, ValueError):
+                continue
+    total, pending = 0.0, [pid]
+    while pending:
+        current = pending.pop()
+        total += rss_mb(current)
+        pending.extend(children.get(current, []))
+    return total
+
+def percentiles(latencies) -> dict:
+    """p50/p99 of latencies given in seconds, in milliseconds"""
+    latencies = np.asarray(latencies) * 1000.0
+    return {"p50_ms": float(np.percentile(latencies, 50)), "p99_ms": float(np.percentile(latencies, 99))}
+
+def timed(fn, *args, **kwargs):
+    """Run fn and return (result, seconds)"""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def query_texts(count: int, seed: int = 1) -> list:
+    """Distinct query strings, so result caches do not flatter the numbers"""
+    return [f"{document['advice']} ({document['exercise']}, {document['condition']})"
+            for document in synthetic_documents(count, seed)]
+
+def bench_search(agent: FitnessRAGAgent, texts: list, vectors: np.ndarray, ks: list, modes: list) -> dict:
+    """Single-query search latency per mode and k, with precomputed query vectors"""
+    results = {}
+    for mode in modes:
+        results[mode] = {}
+        for k in ks:
+            latencies = []
+            for text, vector in zip(texts, vectors):
+                # Vary the text per k so no query is answered from the result cache
+                _, seconds = timed(agent.search_batch, [f"{text} #{k}"], k, mode=mode, embeddings=vector[None])
+                latencies.append(seconds)
+            results[mode][str(k)] = dict(percentiles(latencies), qps=len(latencies) / sum(latencies))
+    return results
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def bench_api(env: dict, texts: list, clients: int, seconds: float, workers: int, k: int,
+              startup_timeout: float = 300) -> dict:
+    """Requests per second of /query from concurrent clients against a server subprocess"""
+    port = free_port()
+    server = subprocess.Popen([sys.executable, "main.py", "api", "--host", "127.0.0.1", "--port", str(port),
+                               "--workers", str(workers)],
+                              cwd=ROOT, env=dict(os.environ, **env),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    client = HTTPClient(f"http://127.0.0.1:{port}")
+    try:
+        # Ready once the index is loaded and the encoder has warmed up
+        deadline = time.time() + startup_timeout
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError(f"API server exited with code {server.returncode}")
+            try:
+                status, body = client.request("GET", "/health")
+                if status == 200 and body["agent_loaded"] and body["model_loaded"]:
+                    break
+            except (urllib.error.URLError, ConnectionError):
+                pass
+            if time.time() > deadline:
+                raise RuntimeError("API server did not become ready")
+            time.sleep(0.5)
+        
+        lock = threading.Lock()
+        latencies, errors = [], []
+        stop = time.perf_counter() + seconds
+        
+        def run_client(seed: int):
+            rng = random.Random(seed)
+            while time.perf_counter() < stop:
+                started = time.perf_counter()
+                try:
+                    status, _ = client.request("POST", "/query", {"query": rng.choice(texts), "k": k})
+                except (urllib.error.URLError, ConnectionError) as e:
+                    status = str(e)
+                elapsed = time.perf_counter() - started
+                with lock:
+                    if status == 200:
+                        latencies.append(elapsed)
+                    else:
+                        errors.append(status)
+        
+        threads = [threading.Thread(target=run_client, args=(seed,)) for seed in range(clients)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        
+        report = {"clients": clients, "workers": workers, "seconds": elapsed, "requests": len(latencies),
+                  "errors": len(errors), "rps": len(latencies) / elapsed, "server_rss_mb": tree_rss_mb(server.pid)}
+        if latencies:
+            report.update(percentiles(latencies))
+        return report
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+def bench_size(size: int, args, directory: str) -> dict:
+    """Run every benchmark on one synthetic corpus"""
+    print(f"\n== {size} documents ==")
+    index_file = os.path.join(directory, f"bench_{size}.faiss")
+    metadata_file = os.path.join(directory, f"bench_{size}.meta")
+    agent = FitnessRAGAgent(index_file=index_file, metadata_file=metadata_file, index_type=args.index_type)
+    dimension = agent.encode_queries(["dimension probe"]).shape[1]
+    row = {"documents": size, "dimension": int(dimension), "rss_mb": {"start": rss_mb()}}
+    
+    documents, row["generate_seconds"] = timed(lambda: list(synthetic_documents(size)))
+    vectors = synthetic_embeddings(size + args.queries, dimension)
+    vectors, query_vectors = vectors[args.queries:], vectors[:args.queries]
+    row["rss_mb"]["corpus"] = rss_mb()
+    
+    # Encoder throughput on a sample; the full corpus is only encoded with --full-encode
+    sample = documents[:min(size, args.encode_sample)]
+    _, seconds = timed(agent.embed_documents, sample)
+    row["encode"] = {"documents": len(sample), "seconds": seconds, "docs_per_s": len(sample) / seconds}
+    print(f"encode:      {row['encode']['docs_per_s']:10.0f} docs/s ({len(sample)} docs)")
+    
+    _, seconds = timed(agent.load_data, documents, None if args.full_encode else vectors)
+    row["load_data"] = {"seconds": seconds, "docs_per_s": size / seconds, "encoded": args.full_encode}
+    row["rss_mb"]["loaded"] = rss_mb()
+    print(f"load_data:   {row['load_data']['docs_per_s']:10.0f} docs/s ({seconds:.2f}s, "
+          f"{'encoding' if args.full_encode else 'precomputed vectors'})")
+    
+    _, row["save_index_seconds"] = timed(agent.save_index)
+    row["index_mb"] = os.path.getsize(index_file) / 1e6
+    row["metadata_mb"] = os.path.getsize(metadata_file) / 1e6
+    print(f"save_index:  {row['save_index_seconds']:10.2f} s ({row['index_mb']:.1f} MB index, "
+          f"{row['metadata_mb']:.1f} MB metadata)")
+    
+    row["load_index_seconds"] = {}
+    for name, mmap in (("read", False), ("mmap", True)):
+        loaded = FitnessRAGAgent(index_file=index_file, metadata_file=metadata_file, mmap=mmap)
+        ok, row["load_index_seconds"][name] = timed(loaded.load_index)
+        assert ok, "saved index did not load"
+        del loaded
+        print(f"load_index:  {row['load_index_seconds'][name]:10.2f} s ({name})")
+    
+    texts = query_texts(args.queries)
+    row["search"] = bench_search(agent, texts, query_vectors, args.k, args.modes)
+    for mode, by_k in row["search"].items():
+        print(f"search:      {mode} " + ", ".join(f"k={k} p50={r['p50_ms']:.2f}ms p99={r['p99_ms']:.2f}ms"
+                                                  for k, r in by_k.items()))
+    row["rss_mb"]["searched"] = rss_mb()
+    
+    if args.api_clients:
+        # The server loads the snapshot just saved; the corpus is released here first
+        del agent, documents, vectors
+        env = {"INDEX_FILE": index_file, "METADATA_FILE": metadata_file, "MODEL_WARMUP": "true",
+               "INDEX_TYPE": args.index_type, "WAL_FILE": os.path.join(directory, f"bench_{size}.wal")}
+        row["api"] = []
+        for clients in args.api_clients:
+            result = bench_api(env, texts, clients, args.api_seconds, args.api_workers, max(args.k[0], 1))
+            row["api"].append(result)
+            print(f"/query:      {result['rps']:10.1f} req/s with {clients} clients, {args.api_workers} "
+                  f"worker(s), p50={result.get('p50_ms', 0):.1f}ms p99={result.get('p99_ms', 0):.1f}ms, "
+                  f"{result['errors']} errors, server RSS {result['server_rss_mb']:.0f} MB")
+    row["rss_mb"]["peak"] = peak_rss_mb()
+    return row
+
+def flatten(report: dict, prefix: str = "") -> dict:
+    """Numeric leaves of a report keyed by dotted path"""
+    values = {}
+    items = report.items() if isinstance(report, dict) else enumerate(report)
+    for key, value in items:
+        path = f"{prefix}{key}"
+        if isinstance(value, (dict, list)):
+            values.update(flatten(value, path + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[path] = value
+    return values
+
+def compare(baseline: dict, report: dict, threshold: float) -> list:
+    """Metrics that moved by more than threshold (a fraction) since the baseline"""
+    old = {f"{row['documents']}.{key}": value for row in baseline["results"] for key, value in flatten(row).items()}
+    new = {f"{row['documents']}.{key}": value for row in report["results"] for key, value in flatten(row).items()}
+    changes = []
+    for key in sorted(old.keys() & new.keys()):
+        if old[key] and abs(new[key] - old[key]) / abs(old[key]) > threshold:
+            changes.append({"metric": key, "baseline": old[key], "current": new[key],
+                            "change": (new[key] - old[key]) / abs(old[key])})
+    return changes
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def int_list(value: str) -> list:
+    return [int(item) for item in value.split(",") if item]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingestion, persistence, search and the HTTP API")
+    parser.add_argument("--sizes", type=int_list, default=[1000, 100000, 1000000],
+                        help="Comma-separated corpus sizes")
+    parser.add_argument("--index-type", default=Config.INDEX_TYPE)
+    parser.add_argument("--k", type=int_list, default=[1, 10, 50], help="Comma-separated k values for search")
+    parser.add_argument("--modes", default="dense", help="Comma-separated search modes (dense, lexical, hybrid)")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per search measurement")
+    parser.add_argument("--encode-sample", type=int, default=1000, help="Documents encoded to measure the model")
+    parser.add_argument("--full-encode", action="store_true",
+                        help="Encode every document in load_data instead of using synthetic vectors")
+    parser.add_argument("--api-clients", type=int_list, default=[],
+                        help="Comma-separated concurrent client counts for /query (default: skip)")
+    parser.add_argument("--api-seconds", type=float, default=10.0, help="Duration of each /query run")
+    parser.add_argument("--api-workers", type=int, default=1, help="API worker processes")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    parser.add_argument("--compare", help="Baseline report to diff against")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Relative change reported by --compare (default 10%%)")
+    args = parser.parse_args()
+    args.modes = [mode for mode in args.modes.split(",") if mode]
+    
+    report = {"commit": git_commit(), "timestamp": time.time(), "model": Config.MODEL_NAME,
+              "encoder_backend": Config.ENCODER_BACKEND, "index_type": args.index_type,
+              "metadata_format": Config.METADATA_FORMAT, "cpu_count": os.cpu_count(), "results": []}
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            report["results"].append(bench_size(size, args, directory))
+    
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        report["baseline_commit"] = baseline.get("commit")
+        report["changes"] = compare(baseline, report, args.threshold)
+        print(f"\nChanged by more than {args.threshold:.0%} since {baseline.get('commit')}:")
+        for change in report["changes"]:
+            print(f"  {change['metric']:<48} {change['baseline']:>12.4g} -> {change['current']:>12.4g} "
+                  f"({change['change']:+.0%})")
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+if __name__ == "__main__":
+    main()
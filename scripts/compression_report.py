@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""Memory saved and recall lost by each vector storage setting, with and without exact re-ranking"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from scripts.index_report import data_embeddings, measure, recall_at_k, synthetic_embeddings
+from src.config import Config
+from src.index_factory import (INDEX_TYPES, VECTOR_STORAGE, base_index, build_index, index_description,
+                               keeps_rerank_vectors)
+
+def index_sizes(index) -> dict:
+    """Bytes searched in RAM (the codes) and bytes of full-precision vectors kept for re-ranking"""
+    total = faiss.serialize_index(index).nbytes
+    codes = faiss.serialize_index(base_index(index)).nbytes
+    return {"index_mb": total / 1e6, "codes_mb": codes / 1e6, "rerank_mb": (total - codes) / 1e6}
+
+def _resident_mb() -> dict:
+    """Private (anonymous) and file-backed resident memory of this process from /proc, in MB"""
+    try:
+        with open("/proc/self/status") as f:
+            fields = dict(line.split(":", 1) for line in f)
+    except OSError:
+        return {}
+    return {name: int(fields[name].split()[0]) / 1e3 for name in ("RssAnon", "RssFile") if name in fields}
+
+def _load_and_search(path: str, queries: np.ndarray, k: int, mmap: bool, k_factor: float) -> dict:
+    """Resident memory growth from loading the index file and searching it once"""
+    before = _resident_mb()
+    index = faiss.read_index(path, faiss.IO_FLAG_MMAP_IFC if mmap else 0)
+    if isinstance(index, faiss.IndexRefine):
+        index.k_factor = k_factor
+    index.search(queries, k)
+    after = _resident_mb()
+    return {name: after[name] - before[name] for name in before}
+
+def resident_memory(index, queries, k: int, mmap: bool) -> dict:
+    """
+    Memory an agent holds for the saved index after serving the queries
+    
+    The index is loaded in a fresh process the way the agent does it:
+    memory-mapped when mmap is set, which is the default whenever it keeps
+    re-rank vectors. Private memory is the agent's own; file-backed pages
+    are evictable page cache shared with other processes mapping the file.
+    """
+    k_factor = index.k_factor if isinstance(index, faiss.IndexRefine) else 1
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "index.faiss")
+        faiss.write_index(index, path)
+        with multiprocessing.get_context("spawn").Pool(1) as pool:
+            grown = pool.apply(_load_and_search, (path, queries, k, mmap, k_factor))
+    if not grown:
+        return {"mapped": mmap}
+    return {"mapped": mmap, "private_mb": grown["RssAnon"], "page_cache_mb": grown["RssFile"]}
+
+def mapped_latency(index, queries, k: int) -> np.ndarray:
+    """Search latencies after saving the index and mapping it back like INDEX_MMAP does"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "index.faiss")
+        faiss.write_index(index, path)
+        mapped = faiss.read_index(path, faiss.IO_FLAG_MMAP_IFC)
+        if isinstance(mapped, faiss.IndexRefine):
+            mapped.k_factor = index.k_factor
+        return measure(mapped, queries, k)[1]
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare vector storage settings against float32")
+    parser.add_argument("--data", help="JSON data file to embed with the configured model")
+    parser.add_argument("--synthetic", type=int, default=100000,
+                        help="Number of synthetic vectors when --data is not given")
+    parser.add_argument("--dim", type=int, default=384, help="Synthetic vector dimension")
+    parser.add_argument("--queries", type=int, default=200, help="Number of query vectors")
+    parser.add_argument("--k", type=int, default=10, help="Neighbours per query")
+    parser.add_argument("--index-type", default="flat", choices=list(INDEX_TYPES))
+    parser.add_argument("--storage", default=",".join(VECTOR_STORAGE), help="Comma-separated storage settings")
+    parser.add_argument("--rerank-factors", default="0,4", help="Comma-separated re-rank factors (0 = off)")
+    parser.add_argument("--pq-m", type=int, help="PQ sub-quantizers (default: Config.PQ_M)")
+    parser.add_argument("--mmap", action="store_true",
+                        help="Also time searches on the memory-mapped index and measure every index mapped")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+    
+    if args.data:
+        vectors = data_embeddings(args.data, Config.MODEL_NAME)
+    else:
+        vectors = synthetic_embeddings(args.synthetic + args.queries, args.dim)
+    vectors, queries = vectors[args.queries:], vectors[:args.queries]
+    k = min(args.k, len(vectors))
+    factors = [int(factor) for factor in args.rerank_factors.split(",") if factor]
+    
+    # Ground truth and the memory baseline come from exact float32 search
+    reference = build_index(vectors, "flat", vector_storage="float32")
+    _, truth = reference.search(queries, k)
+    baseline_mb = index_sizes(reference)["index_mb"]
+    
+    print(f"Corpus: {len(vectors)} vectors x {vectors.shape[1]} dims, {len(queries)} queries, k={k}, "
+          f"index_type={args.index_type}")
+    print(f"{'description':<28} {'codes MB':>9} {'rerank MB':>10} {'saved':>7} {'private MB':>11} "
+          f"{'cache MB':>9} {'recall':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    
+    report = []
+    for storage in [s for s in args.storage.split(",") if s]:
+        for factor in factors if storage != "float32" else [0]:
+            overrides = {"vector_storage": storage, "rerank_factor": factor, "pq_m": args.pq_m}
+            start = time.perf_counter()
+            index = build_index(vectors, args.index_type, **overrides)
+            build_seconds = time.perf_counter() - start
+            
+            ids, latencies = measure(index, queries, k)
+            row = {
+                "storage": storage,
+                "rerank_factor": factor,
+                "description": index_description(args.index_type, vectors.shape[1], len(vectors), **overrides),
+                "build_seconds": build_seconds,
+                "recall_at_k": recall_at_k(ids, truth),
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p99_ms": float(np.percentile(latencies, 99))
+            }
+            row.update(index_sizes(index))
+            # Memory saved counts only the codes; re-rank vectors are read from disk when mapped
+            row["ram_saved"] = 1.0 - row["codes_mb"] / baseline_mb
+            # Agents map indexes with re-rank vectors, so only the rows they re-score are paged in
+            row["resident"] = resident_memory(index, queries, k, args.mmap or keeps_rerank_vectors(
+                args.index_type, **overrides))
+            if args.mmap:
+                mapped = mapped_latency(index, queries, k)
+                row["mmap_p50_ms"] = float(np.percentile(mapped, 50))
+                row["mmap_p99_ms"] = float(np.percentile(mapped, 99))
+            report.append(row)
+            
+            resident = row["resident"]
+            print(f"{row['description']:<28} {row['codes_mb']:>9.1f} {row['rerank_mb']:>10.1f} "
+                  f"{row['ram_saved']:>6.0%} {resident.get('private_mb', float('nan')):>11.1f} "
+                  f"{resident.get('page_cache_mb', float('nan')):>9.1f} {row['recall_at_k']:>8.3f} "
+                  f"{row['p50_ms']:>8.3f} {row['p99_ms']:>8.3f}")
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"corpus_size": len(vectors), "dimension": int(vectors.shape[1]), "queries": len(queries),
+                       "k": k, "index_type": args.index_type, "baseline_mb": baseline_mb,
+                       "results": report}, f, indent=2)
+        print(f"Wrote report to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Measure document metadata memory: list of dicts vs the columnar DocumentStore"""
+
+import argparse
+import gc
+import json
+import random
+import sys
+import tracemalloc
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.docstore import DocumentStore
+
+EXERCISES = [f"exercise_{i}" for i in range(60)]
+CONTEXTS = ["personalization", "injury", "rehab", "performance", "general"]
+CONDITIONS = [f"condition_{i}" for i in range(25)]
+WORDS = ("start with light weight and focus on form keep your core braced control the "
+         "descent breathe out on the way up progress slowly rest between sets").split()
+
+def synthetic_documents(count, seed=0):
+    """Generate documents with realistic field cardinality and advice length"""
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield {
+            "exercise": rng.choice(EXERCISES),
+            "context": rng.choice(CONTEXTS),
+            "condition": rng.choice(CONDITIONS),
+            "advice": " ".join(rng.choice(WORDS) for _ in range(rng.randint(12, 30))).capitalize() + "."
+        }
+
+def traced(build):
+    """Run build() and return (result, bytes still allocated)"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare metadata memory footprints")
+    parser.add_argument("--docs", type=int, default=1000000, help="Number of synthetic documents")
+    args = parser.parse_args()
+    
+    scale = 1e6 / args.docs
+    print(f"Measuring {args.docs} synthetic documents...")
+    
+    # Round-trip through JSON so every string is its own object, as after json.load
+    documents, list_bytes = traced(lambda: [json.loads(json.dumps(doc)) for doc in synthetic_documents(args.docs)])
+    del documents
+    store, store_bytes = traced(lambda: DocumentStore(synthetic_documents(args.docs)))
+    
+    print(f"{'layout':<16} {'total MB':>10} {'MB / 1M docs':>14} {'bytes / doc':>12}")
+    for name, total in (("list of dicts", list_bytes), ("DocumentStore", store_bytes)):
+        print(f"{name:<16} {total / 1e6:>10.1f} {total * scale / 1e6:>14.1f} {total / args.docs:>12.1f}")
+    print(f"Reduction: {list_bytes / store_bytes:.1f}x")
+    
+    print("\nDocumentStore breakdown:")
+    for part, size in store.memory_usage().items():
+        print(f"  {part:<16} {size / 1e6:>8.2f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Compare encoder backends: cosine parity with the fp32 reference, latency and throughput"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.config import Config
+from src.encoder import ENCODER_BACKENDS, cosine_parity, encode_normalized, load_encoder
+from src.rag_agent import FitnessRAGAgent
+
+QUERIES = [
+    "beginner squat advice", "knee pain during lunges", "how to progress push ups",
+    "deadlift form for back pain", "plank variations for core stability",
+    "shoulder friendly overhead press", "hip mobility before squats", "wrist pain push up",
+]
+
+def corpus_texts(count: int) -> list:
+    """Document texts from DATA_FILE, repeated with light variation up to count"""
+    with open(Config.DATA_FILE) as f:
+        documents = json.load(f)
+    texts = [FitnessRAGAgent.create_document_text(document) for document in documents]
+    rng = random.Random(0)
+    while len(texts) < count:
+        words = rng.choice(texts).split()
+        rng.shuffle(words)
+        texts.append(" ".join(words))
+    return texts[:count]
+
+def percentile(samples, pct: float) -> float:
+    """Percentile of a list of samples"""
+    return float(np.percentile(samples, pct))
+
+def measure(model, texts: list, queries: list, batch_size: int, repeats: int):
+    """Corpus embeddings plus single-query latency and batched throughput"""
+    encode_normalized(model, queries[:2])  # Warm up kernels and tokenizer
+    latencies = []
+    for _ in range(repeats):
+        for query in queries:
+            started = time.perf_counter()
+            encode_normalized(model, [query])
+            latencies.append((time.perf_counter() - started) * 1000.0)
+    
+    started = time.perf_counter()
+    embeddings = encode_normalized(model, texts, batch_size=batch_size)
+    elapsed = time.perf_counter() - started
+    return embeddings, {
+        "query_p50_ms": percentile(latencies, 50),
+        "query_p99_ms": percentile(latencies, 99),
+        "throughput_texts_per_s": len(texts) / elapsed
+    }
+
+def topk_agreement(reference_docs, reference_queries, docs, queries, k: int) -> float:
+    """Mean overlap of the top-k documents retrieved with each backend's vectors"""
+    reference_top = np.argsort(-(reference_queries @ reference_docs.T), axis=1)[:, :k]
+    top = np.argsort(-(queries @ docs.T), axis=1)[:, :k]
+    return float(np.mean([len(set(a) & set(b)) / k for a, b in zip(reference_top, top)]))
+
+def main():
+    parser = argparse.ArgumentParser(description="Encoder backend parity and latency report")
+    parser.add_argument("--backends", nargs="+", default=list(ENCODER_BACKENDS), choices=ENCODER_BACKENDS)
+    parser.add_argument("--threads", nargs="+", type=int, default=[Config.ENCODER_THREADS],
+                        help="Intra-op thread counts to compare (0 = library default)")
+    parser.add_argument("--texts", type=int, default=1000, help="Corpus texts for throughput and parity")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--repeats", type=int, default=5, help="Passes over the query set for latency")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--min-cosine", type=float, default=0.99,
+                        help="Parity threshold on the minimum cosine against the reference")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+    
+    texts = corpus_texts(args.texts)
+    reference = load_encoder(Config.MODEL_NAME, "torch", args.threads[0])
+    reference_docs = encode_normalized(reference, texts, batch_size=args.batch_size)
+    reference_queries = encode_normalized(reference, QUERIES)
+    del reference
+    
+    report = {"model": Config.MODEL_NAME, "texts": len(texts), "results": []}
+    passed = True
+    for backend in args.backends:
+        for threads in args.threads:
+            started = time.perf_counter()
+            try:
+                model = load_encoder(Config.MODEL_NAME, backend, threads)
+            except ImportError as e:
+                print(f"{backend}: skipped ({e})")
+                break
+            result = {"backend": backend, "threads": threads, "load_s": time.perf_counter() - started}
+            
+            docs, timings = measure(model, texts, QUERIES, args.batch_size, args.repeats)
+            queries = encode_normalized(model, QUERIES)
+            result.update(timings)
+            result.update(cosine_parity(reference_docs, docs))
+            result[f"top{args.k}_agreement"] = topk_agreement(reference_docs, reference_queries,
+                                                              docs, queries, min(args.k, len(texts)))
+            result["parity_ok"] = result["min_cosine"] >= args.min_cosine
+            passed = passed and result["parity_ok"]
+            report["results"].append(result)
+            
+            print(f"{backend:10s} threads={threads:<2d} p50={result['query_p50_ms']:7.2f}ms "
+                  f"p99={result['query_p99_ms']:7.2f}ms {result['throughput_texts_per_s']:8.1f} texts/s "
+                  f"min_cos={result['min_cosine']:.4f} top{args.k}={result[f'top{args.k}_agreement']:.3f} "
+                  f"{'ok' if result['parity_ok'] else 'PARITY FAILED'}")
+            del model
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    sys.exit(0 if passed else 1)
+
+if __name__ == "__main__":
+    main()
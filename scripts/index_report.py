@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Recall vs latency report for the FAISS index backends"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.config import Config
+from src.index_factory import INDEX_TYPES, build_index
+
+def synthetic_embeddings(count, dimension, clusters=256, seed=0):
+    """Generate clustered unit vectors that behave like sentence embeddings"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension)).astype('float32')
+    labels = rng.integers(0, clusters, size=count)
+    vectors = centers[labels] + 0.5 * rng.standard_normal((count, dimension)).astype('float32')
+    faiss.normalize_L2(vectors)
+    return vectors
+
+def data_embeddings(data_file, model_name):
+    """Embed a JSON data file with the agent's document text"""
+    from src.rag_agent import FitnessRAGAgent
+    
+    with open(data_file, 'r') as f:
+        data = json.load(f)
+    agent = FitnessRAGAgent(model_name=model_name)
+    texts = [agent.create_document_text(item) for item in data]
+    vectors = agent.model.encode(texts, convert_to_numpy=True).astype('float32')
+    faiss.normalize_L2(vectors)
+    return vectors
+
+def measure(index, queries, k):
+    """Time single-query searches and return (ids, latencies in ms)"""
+    ids = np.empty((len(queries), k), dtype='int64')
+    latencies = np.empty(len(queries))
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        _, row = index.search(queries[i:i + 1], k)
+        latencies[i] = (time.perf_counter() - start) * 1000.0
+        ids[i] = row[0]
+    return ids, latencies
+
+def recall_at_k(ids, truth):
+    """Fraction of the exact top-k found by the approximate search"""
+    hits = sum(len(set(row[row != -1]) & set(exact)) for row, exact in zip(ids, truth))
+    return hits / truth.size
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare index backends against the flat index")
+    parser.add_argument("--data", help="JSON data file to embed with the configured model")
+    parser.add_argument("--synthetic", type=int, default=100000,
+                        help="Number of synthetic vectors when --data is not given")
+    parser.add_argument("--dim", type=int, default=384, help="Synthetic vector dimension")
+    parser.add_argument("--queries", type=int, default=200, help="Number of query vectors")
+    parser.add_argument("--k", type=int, default=10, help="Neighbours per query")
+    parser.add_argument("--types", default=",".join(INDEX_TYPES), help="Comma-separated index types")
+    parser.add_argument("--nlist", type=int, help="IVF list count (default: Config.IVF_NLIST)")
+    parser.add_argument("--nprobe", type=int, help="IVF lists scanned (default: Config.IVF_NPROBE)")
+    parser.add_argument("--hnsw-m", type=int, help="HNSW graph degree (default: Config.HNSW_M)")
+    parser.add_argument("--ef-search", type=int, help="HNSW search depth (default: Config.HNSW_EF_SEARCH)")
+    parser.add_argument("--pq-m", type=int, help="PQ sub-quantizers (default: Config.PQ_M)")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+    
+    if args.data:
+        vectors = data_embeddings(args.data, Config.MODEL_NAME)
+    else:
+        vectors = synthetic_embeddings(args.synthetic + args.queries, args.dim)
+    vectors, queries = vectors[args.queries:], vectors[:args.queries]
+    k = min(args.k, len(vectors))
+    overrides = {"nlist": args.nlist, "nprobe": args.nprobe, "hnsw_m": args.hnsw_m,
+                 "ef_search": args.ef_search, "pq_m": args.pq_m}
+    
+    print(f"Corpus: {len(vectors)} vectors x {vectors.shape[1]} dims, {len(queries)} queries, k={k}")
+    print(f"{'type':<10} {'build s':>9} {'recall':>8} {'p50 ms':>8} {'p99 ms':>8} {'MB':>8}")
+    
+    truth = None
+    report = []
+    for index_type in ["flat"] + [t for t in args.types.split(",") if t and t != "flat"]:
+        start = time.perf_counter()
+        index = build_index(vectors, index_type, **overrides)
+        build_seconds = time.perf_counter() - start
+        
+        ids, latencies = measure(index, queries, k)
+        if truth is None:
+            truth = ids
+        
+        row = {
+            "index_type": index_type,
+            "build_seconds": build_seconds,
+            "recall_at_k": recall_at_k(ids, truth),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "size_mb": faiss.serialize_index(index).nbytes / 1e6
+        }
+        report.append(row)
+        print(f"{index_type:<10} {row['build_seconds']:>9.2f} {row['recall_at_k']:>8.3f} "
+              f"{row['p50_ms']:>8.3f} {row['p99_ms']:>8.3f} {row['size_mb']:>8.1f}")
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"corpus_size": len(vectors), "dimension": int(vectors.shape[1]),
+                       "queries": len(queries), "k": k, "results": report}, f, indent=2)
+        print(f"Wrote report to {args.output}")
+
+if __name__ == "__main__":
+    main()
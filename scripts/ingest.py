@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""Stream a local NDJSON or JSON array file into the fitness index"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.config import Config
+from src.ingest import iter_records
+from src.rag_agent import FitnessRAGAgent
+
+def print_progress(stats):
+    """Overwrite a single progress line"""
+    print(f"\r  {stats['documents']} documents, {stats['batches']} batches, "
+          f"{stats['documents_per_second']:.0f} docs/s", end="", flush=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest documents in fixed-size batches")
+    parser.add_argument("path", help="Data file (.ndjson/.jsonl, or a JSON array)")
+    parser.add_argument("--batch-size", type=int, default=Config.INGEST_BATCH_SIZE,
+                        help="Documents embedded per batch")
+    parser.add_argument("--append", action="store_true",
+                        help="Add to the existing index instead of replacing it")
+    args = parser.parse_args()
+    
+    agent = FitnessRAGAgent()
+    if args.append and not agent.load_index():
+        print("No existing index found to append to.")
+        sys.exit(1)
+    
+    print(f"Ingesting {args.path}...")
+    stats = agent.ingest(iter_records(args.path), batch_size=args.batch_size,
+                         replace=not args.append, progress=print_progress)
+    print()
+    agent.save_index()
+    print(f"Done: {stats['documents']} documents in {stats['seconds']:.1f}s")
+
+if __name__ == "__main__":
+    main()
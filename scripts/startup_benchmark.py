@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Measure cold start: import time, index load, model load and first-query latency"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.config import Config
+
+ROOT = Path(__file__).parent.parent
+
+# Runs in a fresh interpreter so every import and load is cold
+PROBE = r"""
+import json, sys, time
+started = time.perf_counter()
+timings = {}
+
+def mark(name, since):
+    now = time.perf_counter()
+    timings[name] = now - since
+    return now
+
+t = time.perf_counter()
+# Imported eagerly by the agent modules: load_index() needs it on every startup path
+import faiss
+t = mark("import_faiss_s", t)
+from src.rag_agent import FitnessRAGAgent
+t = mark("import_agent_s", t)
+if "--api" in sys.argv:
+    import src.api_wrapper
+    t = mark("import_api_s", t)
+
+agent = FitnessRAGAgent()
+t = mark("init_s", t)
+assert agent.load_index(), "no index to load"
+t = mark("load_index_s", t)
+if "--warmup" in sys.argv:
+    agent.warm_up(background=True)
+agent.get_stats()
+t = mark("stats_s", t)
+timings["ready_s"] = t - started
+
+# Idle time before the first request arrives, which a background warm-up can use
+time.sleep(float(sys.argv[1]))
+t = time.perf_counter()
+agent.search("beginner squat advice", k=3)
+t = mark("first_query_s", t)
+agent.search("knee pain during lunges", k=3)
+t = mark("second_query_s", t)
+
+print(json.dumps(timings))
+"""
+
+def build_index(directory: str) -> dict:
+    """Build an index from DATA_FILE in a scratch directory and return its env overrides"""
+    from src.rag_agent import FitnessRAGAgent
+    
+    env = {
+        "INDEX_FILE": os.path.join(directory, "index.faiss"),
+        "METADATA_FILE": os.path.join(directory, "metadata.pkl"),
+    }
+    with open(Config.DATA_FILE) as f:
+        data = json.load(f)
+    agent = FitnessRAGAgent(index_file=env["INDEX_FILE"], metadata_file=env["METADATA_FILE"])
+    agent.load_data(data)
+    agent.save_index()
+    return env
+
+def run_probe(env: dict, api: bool, warmup: bool, delay: float) -> dict:
+    """Time one cold start in a subprocess"""
+    args = [sys.executable, "-c", PROBE, str(delay)] + (["--api"] if api else []) + (["--warmup"] if warmup else [])
+    result = subprocess.run(args, cwd=ROOT, env=dict(os.environ, **env), capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold-start latency")
+    parser.add_argument("--runs", type=int, default=3, help="Cold starts per configuration")
+    parser.add_argument("--existing-index", action="store_true",
+                        help="Use the configured INDEX_FILE instead of building a scratch index")
+    parser.add_argument("--api", action="store_true", help="Also time importing the API module")
+    parser.add_argument("--first-query-delay", type=float, default=0.0,
+                        help="Seconds between startup and the first query")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as directory:
+        env = {} if args.existing_index else build_index(directory)
+        
+        report = {"model": Config.MODEL_NAME, "runs": args.runs,
+                  "first_query_delay_s": args.first_query_delay, "configurations": {}}
+        for name, warmup in (("lazy", False), ("background_warmup", True)):
+            runs = [run_probe(env, args.api, warmup, args.first_query_delay) for _ in range(args.runs)]
+            medians = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+            report["configurations"][name] = medians
+            
+            print(f"\n{name} (median of {args.runs}):")
+            for key, value in medians.items():
+                print(f"  {key:24s} {value * 1000:9.1f} ms")
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""Hammer /query and /add_document concurrently and check results stay consistent"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+QUERIES = ["beginner squat advice", "knee pain during lunges", "how to progress push ups",
+           "plank variations for core stability", "shoulder friendly overhead press"]
+EXERCISES = ["squat", "push_up", "plank", "lunge", "deadlift"]
+
+class HTTPClient:
+    """Minimal JSON client for a running server"""
+    
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+    
+    def request(self, method: str, path: str, payload=None):
+        """Send a request and return (status code, decoded JSON body)"""
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read() or b"null")
+
+class InProcessClient:
+    """Same interface over FastAPI's TestClient, for runs without a server"""
+    
+    def __init__(self, client):
+        self.client = client
+    
+    def request(self, method: str, path: str, payload=None):
+        response = self.client.request(method, path, json=payload)
+        return response.status_code, response.json()
+
+def stress_document(run_id: str, writer: int, i: int) -> dict:
+    """A document whose advice names its exercise, so any hit can be checked"""
+    exercise = EXERCISES[(writer + i) % len(EXERCISES)]
+    return {"exercise": exercise, "context": "stress", "condition": f"writer_{writer}",
+            "advice": f"stress {run_id} {writer} {i} exercise {exercise}"}
+
+def check_hit(hit: dict, run_id: str) -> bool:
+    """Whether a hit is a whole document with fields from the same record"""
+    if not all(field in hit for field in ("exercise", "context", "condition", "advice", "similarity_score")):
+        return False
+    if hit["advice"].startswith(f"stress {run_id} "):
+        return hit["advice"].endswith(f"exercise {hit['exercise']}") and hit["context"] == "stress"
+    return True
+
+def run_stress(client, readers: int = 8, writers: int = 2, adds_per_writer: int = 50,
+               seconds: float = None, k: int = 5) -> dict:
+    """
+    Run reader and writer threads against a client and return a report
+    
+    Readers issue /query (dense, lexical and filtered) until the writers are
+    done, or for the given number of seconds. Every hit is checked to be a
+    whole document, and the final document count must equal the starting
+    count plus every acknowledged add.
+    """
+    run_id = uuid.uuid4().hex[:8]
+    status, body = client.request("GET", "/stats")
+    if status != 200:
+        raise RuntimeError(f"/stats failed with {status}: {body}")
+    initial = body["stats"]["total_documents"]
+    
+    lock = threading.Lock()
+    report = {"queries": 0, "adds": 0, "errors": [], "inconsistent_hits": 0}
+    query_latencies, add_latencies = [], []
+    writers_done = threading.Event()
+    deadline = time.perf_counter() + seconds if seconds else None
+    
+    def reader(seed: int):
+        rng = random.Random(seed)
+        while not writers_done.is_set() and (deadline is None or time.perf_counter() < deadline):
+            payload = {"query": rng.choice(QUERIES), "k": k, "mode": rng.choice(["dense", "lexical"])}
+            if rng.random() < 0.25:
+                payload["filters"] = {"exercise": rng.choice(EXERCISES)}
+            started = time.perf_counter()
+            status, body = client.request("POST", "/query", payload)
+            elapsed = time.perf_counter() - started
+            with lock:
+                report["queries"] += 1
+                query_latencies.append(elapsed)
+                if status != 200:
+                    report["errors"].append(f"/query {status}: {body}")
+                    continue
+                results = body["results"]
+                report["inconsistent_hits"] += sum(not check_hit(hit, run_id) for hit in results)
+                if "filters" in payload:
+                    report["inconsistent_hits"] += sum(hit["exercise"] != payload["filters"]["exercise"]
+                                                       for hit in results)
+    
+    def writer(writer_id: int):
+        for i in range(adds_per_writer):
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            started = time.perf_counter()
+            status, body = client.request("POST", "/add_document", stress_document(run_id, writer_id, i))
+            elapsed = time.perf_counter() - started
+            with lock:
+                add_latencies.append(elapsed)
+                if status == 200:
+                    report["adds"] += 1
+                else:
+                    report["errors"].append(f"/add_document {status}: {body}")
+    
+    reader_threads = [threading.Thread(target=reader, args=(seed,)) for seed in range(readers)]
+    writer_threads = [threading.Thread(target=writer, args=(writer_id,)) for writer_id in range(writers)]
+    started = time.perf_counter()
+    for thread in reader_threads + writer_threads:
+        thread.start()
+    for thread in writer_threads:
+        thread.join()
+    if deadline is not None:
+        time.sleep(max(0.0, deadline - time.perf_counter()))
+    writers_done.set()
+    for thread in reader_threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    
+    status, body = client.request("GET", "/stats")
+    report["final_documents"] = body["stats"]["total_documents"] if status == 200 else None
+    report["expected_documents"] = initial + report["adds"]
+    report["consistent"] = (not report["errors"] and not report["inconsistent_hits"]
+                            and report["final_documents"] == report["expected_documents"])
+    report["seconds"] = elapsed
+    report["query_rps"] = report["queries"] / elapsed
+    report["add_rps"] = report["adds"] / elapsed
+    for name, latencies in (("query", query_latencies), ("add", add_latencies)):
+        if latencies:
+            report[f"{name}_p50_ms"] = float(np.percentile(latencies, 50) * 1000)
+            report[f"{name}_p99_ms"] = float(np.percentile(latencies, 99) * 1000)
+    report["errors"] = report["errors"][:20]
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent /query and /add_document stress test")
+    parser.add_argument("--url", help="Base URL of a running server (default: run the app in-process)")
+    parser.add_argument("--readers", type=int, default=8, help="Concurrent /query threads")
+    parser.add_argument("--writers", type=int, default=2, help="Concurrent /add_document threads")
+    parser.add_argument("--adds", type=int, default=50, help="Documents added per writer")
+    parser.add_argument("--seconds", type=float, help="Run for this long instead of until the adds finish")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+    
+    options = dict(readers=args.readers, writers=args.writers, adds_per_writer=args.adds,
+                   seconds=args.seconds, k=args.k)
+    if args.url:
+        report = run_stress(HTTPClient(args.url), **options)
+    else:
+        from fastapi.testclient import TestClient
+        from src.api_wrapper import app
+        with TestClient(app) as client:
+            report = run_stress(InProcessClient(client), **options)
+    
+    print(f"{report['queries']} queries ({report['query_rps']:.1f}/s), {report['adds']} adds "
+          f"({report['add_rps']:.1f}/s) in {report['seconds']:.1f}s")
+    for name in ("query", "add"):
+        if f"{name}_p50_ms" in report:
+            print(f"  {name:5s} p50={report[f'{name}_p50_ms']:.1f}ms p99={report[f'{name}_p99_ms']:.1f}ms")
+    print(f"  documents: {report['final_documents']} (expected {report['expected_documents']}), "
+          f"inconsistent hits: {report['inconsistent_hits']}, errors: {len(report['errors'])}")
+    for error in report["errors"]:
+        print(f"  {error}")
+    print("CONSISTENT" if report["consistent"] else "INCONSISTENT")
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    sys.exit(0 if report["consistent"] else 1)
+
+if __name__ == "__main__":
+    main()
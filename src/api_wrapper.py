@@ -1,24 +1,55 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Iterator, Optional, Union
 import json
+import os
+import time
 import uvicorn
 import sys
 from pathlib import Path
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Import our modules
-from .rag_agent import FitnessRAGAgent
+from .rag_agent import FitnessRAGAgent, RebuildInProgressError
+from .batching import QueryBatcher
+from .executor import AgentExecutor, ExecutorBusyError
+from .ingest import Ingestor, NDJSONParser
+from .metrics import METRICS
+from .profiling import RequestProfiler, run_profiled
+from .wal import Compactor
+from .workers import SharedIndex, prepare_shared_index, worker_environment
 from .config import Config
 
 # Pydantic models for API
 class QueryRequest(BaseModel):
     query: str
-    k: int = 3
+    k: int = Field(3, ge=1)
+    filters: Optional[Dict[str, Union[str, List[str]]]] = None
+    mode: Optional[str] = None
+    fusion: Optional[str] = None
+    fields: Optional[List[str]] = None  # Result fields to return, e.g. ["id", "similarity_score"]
+    render: bool = True  # Include the text response
 
 class QueryResponse(BaseModel):
     query: str
     results: List[Dict[str, Any]]
-    response: str
+    response: Optional[str] = None
+
+class QueryBatchRequest(BaseModel):
+    queries: List[str]
+    k: int = Field(3, ge=1)
+    filters: Optional[Dict[str, Union[str, List[str]]]] = None
+    mode: Optional[str] = None
+    fusion: Optional[str] = None
+    fields: Optional[List[str]] = None
+    render: bool = True
+
+class QueryBatchResponse(BaseModel):
+    results: List[QueryResponse]
 
 class AddDocumentRequest(BaseModel):
     exercise: str
@@ -29,60 +60,317 @@ class AddDocumentRequest(BaseModel):
 class StatsResponse(BaseModel):
     stats: Dict[str, Any]
 
+class FastJSONResponse(Response):
+    """JSON response encoded with orjson when it is installed, else with the json module"""
+    
+    media_type = "application/json"
+    
+    def render(self, content: Any) -> bytes:
+        return _dumps(content).encode("utf-8") if orjson is None else orjson.dumps(content)
+
+def _dumps(payload: Any) -> str:
+    """Compact JSON text, from orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(payload).decode("utf-8")
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+def _project(results: List[Dict[str, Any]], fields: Optional[List[str]]) -> List[Dict[str, Any]]:
+    """Keep only the requested fields of each result; fields a result lacks are left out"""
+    if fields is None:
+        return results
+    return [{field: result[field] for field in fields if field in result} for result in results]
+
 # Initialize FastAPI app
 app = FastAPI(title="Fitness RAG Agent API", version="1.0.0")
 
 # Global agent instance
 agent = None
+batcher = None
+executor = None
+compactor = None
+shared = None
+# Opt-in request profiling, configured by the PROFILE_* settings
+profiler = RequestProfiler()
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    """Record the latency of every request by route template, method and status"""
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    METRICS.histogram("fitness_rag_http_request_seconds", "API request latency until the response starts",
+                      method=request.method, route=route.path if route is not None else "unmatched",
+                      status=response.status_code).observe(time.perf_counter() - started)
+    return response
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize the RAG agent on startup"""
-    global agent
+    global agent, batcher, executor, compactor, shared
     agent = FitnessRAGAgent()
     
+    if Config.API_WORKERS > 1:
+        # Worker process: map the shared snapshot and follow its changes; without
+        # one, the first worker to get the lock builds it and the others map it
+        shared = SharedIndex(agent)
+        if not shared.start():
+            shared.write(_load_sample_data)
     # Try to load existing index
-    if not agent.load_index():
-        print("No existing index found. Loading sample data...")
-        try:
-            with open(Config.DATA_FILE, 'r') as f:
-                sample_data = json.load(f)
-            agent.load_data(sample_data)
-            agent.save_index()
-        except FileNotFoundError:
-            print(f"Warning: {Config.DATA_FILE} not found.")
+    elif not agent.load_index():
+        _load_sample_data()
+    
+    # Load the encoder off the startup path so the server accepts requests sooner
+    if Config.MODEL_WARMUP:
+        agent.warm_up(background=True)
+    
+    executor = AgentExecutor(agent)
+    if agent.wal is not None:
+        compactor = Compactor(agent)
+        compactor.start()
+    if Config.BATCH_ENABLED:
+        batcher = QueryBatcher(agent, search_fn=executor.search_batch)
 
-@app.post("/load_data", response_model=Dict[str, str])
-async def load_data(data: List[Dict[str, Any]]):
-    """Load fitness data and create vector index"""
+def _load_sample_data() -> None:
+    """Build and save the index from DATA_FILE unless one is already loaded"""
+    if agent.index is not None:
+        return
+    print("No existing index found. Loading sample data...")
     try:
-        agent.load_data(data)
+        with open(Config.DATA_FILE, 'r') as f:
+            sample_data = json.load(f)
+        agent.load_data(sample_data)
+        agent.save_index()
+    except FileNotFoundError:
+        print(f"Warning: {Config.DATA_FILE} not found.")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Fold the WAL into a snapshot and release the executor pools on shutdown"""
+    if shared is not None:
+        shared.stop()
+    if compactor is not None:
+        compactor.stop()
+    if agent is not None and agent.wal is not None:
+        agent.compact()
+        agent.wal.close()
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+def _write(fn, *args):
+    """Run a write; with API_WORKERS > 1 it is serialized across the worker processes"""
+    if shared is not None:
+        return shared.write(fn, *args)
+    return fn(*args)
+
+def _add_and_save(document: Dict[str, Any]) -> None:
+    """Add a document to the index and persist it"""
+    agent.add_document(document)
+    # With a WAL the add is already durable; the compactor folds it into the snapshot
+    if not agent.is_durable():
+        agent.save_index()
+
+@app.post("/load_data", response_model=Dict[str, str])
+async def load_data(data: List[Dict[str, Any]], background: bool = False):
+    """
+    Load fitness data and create vector index
+    
+    The new index is built beside the live one, validated and swapped in;
+    queries keep being served from the previous version meanwhile. With
+    background=true the request returns at once and GET /load_data/status
+    reports progress.
+    """
+    with profiler.profile("/load_data", {"documents": len(data), "background": background}) as session:
+        try:
+            if background:
+                agent.rebuild(data, save=True, background=True)
+                return {"message": f"Rebuilding index from {len(data)} documents",
+                        "from_version": str(agent.rebuild_status["from_version"])}
+            # Background rebuilds run in their own thread and are not profiled
+            await executor.run(run_profiled, session, _write, agent.rebuild, data)
+            return {"message": f"Successfully loaded {len(data)} documents",
+                    "version": str(agent.generation.version)}
+        except RebuildInProgressError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        except ExecutorBusyError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/load_data/status", response_model=Dict[str, Any])
+async def load_data_status():
+    """Progress of the last index rebuild and the generation being served"""
+    return agent.get_generation_stats()
+
+def _log_ingest_progress(stats: Dict[str, Any]) -> None:
+    """Print ingestion progress"""
+    print(f"Ingested {stats['documents']} documents in {stats['batches']} batches "
+          f"({stats['documents_per_second']:.0f} docs/s)")
+
+def _ingest_batch(ingestor: Ingestor, records: List[Dict[str, Any]]) -> None:
+    """Index parsed records; appends are saved per batch when workers share the index"""
+    batches = ingestor.batches
+    ingestor.add_many(records)
+    if shared is not None and not ingestor.replace and ingestor.batches > batches:
         agent.save_index()
-        return {"message": f"Successfully loaded {len(data)} documents"}
+
+def _finish_ingest(ingestor: Ingestor) -> Dict[str, Any]:
+    """Index the last batch and persist the result"""
+    stats = ingestor.finish()
+    if ingestor.replace or not agent.is_durable():
+        agent.save_index()
+    return stats
+
+@app.post("/ingest", response_model=Dict[str, Any])
+async def ingest(request: Request, replace: bool = True, batch_size: Optional[int] = None):
+    """Stream NDJSON documents (one per line) into the index in fixed-size batches"""
+    try:
+        ingestor = Ingestor(agent, batch_size=batch_size, replace=replace, progress=_log_ingest_progress)
+        parser = NDJSONParser()
+        
+        # Parse while the body arrives; awaiting each batch applies back-pressure
+        async for chunk in request.stream():
+            records = parser.feed(chunk)
+            if records:
+                await executor.run(_write, _ingest_batch, ingestor, records)
+        await executor.run(_write, _ingest_batch, ingestor, parser.close())
+        
+        stats = await executor.run(_write, _finish_ingest, ingestor)
+        return {"message": f"Successfully ingested {stats['documents']} documents", **stats}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ExecutorBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/query", response_model=QueryResponse)
 async def query_agent(request: QueryRequest):
     """Query the fitness agent"""
+    metadata = {"query": request.query, "k": request.k, "filters": request.filters,
+                "mode": request.mode, "fusion": request.fusion}
+    with profiler.profile("/query", metadata) as session:
+        try:
+            if agent.index is None:
+                raise HTTPException(status_code=400, detail="No data loaded. Please load data first.")
+            
+            if batcher is not None:
+                results = await batcher.search(request.query, request.k, request.filters,
+                                               request.mode, request.fusion, session=session)
+            else:
+                results = (await executor.search_batch([request.query], request.k, request.filters,
+                                                       request.mode, request.fusion, session=session))[0]
+            response = None
+            if request.render:
+                response = run_profiled(session, agent.format_response, request.query, results)
+            
+            # Results are plain dicts already; encode them directly instead of through the model
+            return FastJSONResponse({
+                "query": request.query,
+                "results": _project(results, request.fields),
+                "response": response
+            })
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except ExecutorBusyError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+# Media types of the /query/stream formats
+STREAM_FORMATS = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+def _stream_events(query: str, hits: Iterator[Dict[str, Any]], stream_format: str,
+                   fields: Optional[List[str]] = None, render: bool = True) -> Iterator[str]:
+    """Encode a streamed query as NDJSON lines or server-sent events"""
+    def encode(event: str, payload: Dict[str, Any]) -> str:
+        if stream_format == "sse":
+            return f"event: {event}\ndata: {_dumps(payload)}\n\n"
+        return _dumps({"event": event, **payload}) + "\n"
+    
+    started = time.perf_counter()
+    start = {"query": query}
+    if render:
+        start["text"] = FitnessRAGAgent.format_header(query)
+    yield encode("start", start)
+    count = 0
+    try:
+        for count, hit in enumerate(hits, 1):
+            result = {"result": _project([hit], fields)[0]}
+            if render:
+                result["text"] = FitnessRAGAgent.format_result(count, hit)
+            yield encode("result", result)
+    except Exception as e:
+        # The status line has been sent, so failures are reported in the stream
+        yield encode("error", {"detail": str(e)})
+        return
+    end = {"count": count, "elapsed_ms": (time.perf_counter() - started) * 1000.0}
+    if render and not count:
+        end["text"] = "I couldn't find any relevant fitness advice for your query."
+    yield encode("end", end)
+
+@app.post("/query/stream")
+async def query_stream(request: QueryRequest, http_request: Request, format: Optional[str] = None):
+    """
+    Stream the hits of a query as they are hydrated
+    
+    Sends NDJSON lines, or server-sent events with format=sse or an
+    Accept: text/event-stream header. A start event carries the response
+    header, each result event one hit with its text section, and the end
+    event the hit count. Errors after the first byte arrive as an error event.
+    """
+    if format is None:
+        format = "sse" if "text/event-stream" in http_request.headers.get("accept", "") else "ndjson"
+    format = format.lower()
+    if format not in STREAM_FORMATS:
+        raise HTTPException(status_code=400,
+                            detail=f"Unknown stream format: {format}. Choose from {', '.join(STREAM_FORMATS)}")
+    try:
+        # Ranking runs in the executor; the hits are then hydrated while the body streams
+        hits = await executor.run(agent.search_stream, request.query, request.k, request.filters,
+                                  request.mode, request.fusion)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ExecutorBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    # Starlette iterates a synchronous body in its threadpool, off the event loop
+    return StreamingResponse(_stream_events(request.query, hits, format, request.fields, request.render),
+                             media_type=STREAM_FORMATS[format], headers={"Cache-Control": "no-cache"})
+
+@app.post("/query_batch", response_model=QueryBatchResponse)
+async def query_batch(request: QueryBatchRequest):
+    """Query the fitness agent with many questions in one encode and one index search"""
     try:
         if agent.index is None:
             raise HTTPException(status_code=400, detail="No data loaded. Please load data first.")
+        if len(request.queries) > Config.QUERY_BATCH_MAX_SIZE:
+            raise ValueError(f"At most {Config.QUERY_BATCH_MAX_SIZE} queries per batch")
         
-        results = agent.search(request.query, request.k)
-        response = agent.query(request.query, request.k)
+        batch_results = await executor.search_batch(request.queries, request.k, request.filters,
+                                                    request.mode, request.fusion)
         
-        return QueryResponse(
-            query=request.query,
-            results=results,
-            response=response
-        )
+        return FastJSONResponse({"results": [
+            {"query": query, "results": _project(results, request.fields),
+             "response": agent.format_response(query, results) if request.render else None}
+            for query, results in zip(request.queries, batch_results)
+        ]})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ExecutorBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/add_document", response_model=Dict[str, str])
 async def add_document(request: AddDocumentRequest):
     """Add a new document to the index"""
+    if shared is not None:
+        # Each add would copy the mapped index and rewrite the shared snapshot
+        raise HTTPException(status_code=409, detail="Single-document adds are disabled with API_WORKERS > 1; "
+                                                    "send documents in batches to /ingest?replace=false")
     try:
         if agent.index is None:
             raise HTTPException(status_code=400, detail="No data loaded. Please load data first.")
@@ -94,10 +382,11 @@ async def add_document(request: AddDocumentRequest):
             "advice": request.advice
         }
         
-        agent.add_document(document)
-        agent.save_index()
+        await executor.run(_write, _add_and_save, document)
         
         return {"message": "Document added successfully"}
+    except ExecutorBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -108,30 +397,73 @@ async def get_stats():
         if agent.index is None:
             raise HTTPException(status_code=400, detail="No data loaded. Please load data first.")
         
-        stats = agent.get_stats()
+        stats = await executor.run(agent.get_stats)
+        stats["cache"] = agent.get_cache_stats()
+        stats["wal"] = agent.get_wal_stats()
+        stats["executor"] = executor.get_stats()
+        if batcher is not None:
+            stats["batching"] = batcher.get_stats()
+        if shared is not None:
+            stats["workers"] = shared.get_stats()
+        stats["latency"] = METRICS.get_stats()
+        stats["profiling"] = profiler.get_stats()
         return StatsResponse(stats=stats)
+    except ExecutorBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "agent_loaded": agent is not None and agent.index is not None}
+    return {
+        "status": "healthy",
+        "agent_loaded": agent is not None and agent.index is not None,
+        "model_loaded": agent is not None and agent.model_loaded
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Latency histograms and index gauges in the Prometheus text format"""
+    if agent is not None:
+        METRICS.set_gauge("fitness_rag_documents", len(agent.documents), "Documents in the served index")
+        METRICS.set_gauge("fitness_rag_index_generation", agent.generation.version,
+                          "Version of the served index generation")
+        for name, cache in (("embeddings", agent.embedding_cache), ("results", agent.result_cache)):
+            cache_stats = cache.get_stats()
+            METRICS.set_gauge("fitness_rag_cache_hit_ratio", cache_stats["hit_ratio"],
+                              "Query cache hit ratio since startup", cache=name)
+    if executor is not None:
+        METRICS.set_gauge("fitness_rag_executor_in_flight", executor.in_flight,
+                          "Agent calls queued or running in the executor")
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
 
-def start_api_server(host: str = None, port: int = None):
-    """Start the FastAPI server"""
+def start_api_server(host: str = None, port: int = None, workers: int = None):
+    """Start the FastAPI server, optionally as worker processes sharing one mapped index"""
     host = host or Config.API_HOST
     port = port or Config.API_PORT
+    workers = workers or Config.API_WORKERS
     
     print(f"Starting API server on {host}:{port}")
-    uvicorn.run(app, host=host, port=port)
+    if workers > 1:
+        # Build or fold the snapshot once here; the workers only map it
+        os.environ.update(worker_environment(workers))
+        if not prepare_shared_index():
+            return
+        uvicorn.run("src.api_wrapper:app", host=host, port=port, workers=workers)
+    else:
+        uvicorn.run(app, host=host, port=port)
 
 def start_cli():
     """Start the CLI interface"""
     global agent
     
     if agent is None:
-        agent = FitnessRAGAgent()
+        if Config.SHARDS > 0 or Config.SHARD_ADDRESSES:
+            from .sharding import ShardedAgent
+            agent = ShardedAgent()
+        else:
+            agent = FitnessRAGAgent()
         
         # Try to load existing index
         if not agent.load_index():
@@ -177,7 +509,7 @@ def start_cli():
                     print("Please provide a query after 'query'")
             else:
                 print("Unknown command. Try 'query <question>', 'stats', or 'quit'")
-                
+        
         except KeyboardInterrupt:
             print("\nGoodbye!")
             break
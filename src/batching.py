@@ -0,0 +1,139 @@
+import asyncio
+import time
+from collections import deque
+from typing import List, Dict, Any, Optional
+from .config import Config
+from .filters import normalize_filters
+from .profiling import run_profiled
+
+class QueryBatcher:
+    """Coalesces concurrent queries into batched agent searches"""
+    
+    def __init__(self, agent, max_batch_size: int = None, max_wait_ms: float = None,
+                 latency_window: int = 1000, search_fn=None):
+        """
+        Initialize the query batcher
+        
+        Args:
+            agent: FitnessRAGAgent used to run the batched searches
+            max_batch_size: Flush as soon as this many queries are pending
+            max_wait_ms: Longest time a query waits for others to join its batch
+            latency_window: Number of recent latencies kept for percentiles
+            search_fn: Async callable (queries, k, filters, mode, fusion) running the batched search;
+                defaults to agent.search_batch in the loop's default executor. Batches holding
+                a profiled query also pass its session as the session keyword
+        """
+        self.agent = agent
+        self.search_fn = search_fn or self._default_search
+        self.max_batch_size = max(1, max_batch_size or Config.BATCH_MAX_SIZE)
+        self.max_wait_ms = Config.BATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms
+        
+        self._pending = {}
+        self._flush_handle = None
+        
+        self.total_queries = 0
+        self.total_batches = 0
+        self.max_observed_batch = 0
+        self.batch_size_counts = {}
+        self._latencies_ms = deque(maxlen=latency_window)
+        self._wait_ms = deque(maxlen=latency_window)
+    
+    async def search(self, query: str, k: int = 3, filters: Optional[Dict[str, Any]] = None,
+                     mode: str = None, fusion: str = None, session=None) -> List[Dict[str, Any]]:
+        """Queue a query and wait for its slice of the batched results; session profiles its batch"""
+        if k < 1:
+            # One bad k would otherwise fail the whole batch it joins
+            raise ValueError(f"k must be at least 1, got {k}")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        # Queries only share a batch with queries using the same search options
+        options = (filters, mode, fusion)
+        group = self._pending.setdefault((normalize_filters(filters), mode, fusion), [])
+        group.append((query, k, future, time.perf_counter(), options, session))
+        
+        if len(group) >= self.max_batch_size:
+            self._flush(loop)
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait_ms / 1000.0, self._flush, loop)
+        
+        return await future
+    
+    def _flush(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Hand the pending queries to a batch task"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        
+        pending, self._pending = self._pending, {}
+        for group in pending.values():
+            for start in range(0, len(group), self.max_batch_size):
+                loop.create_task(self._run_batch(group[start:start + self.max_batch_size]))
+    
+    async def _run_batch(self, batch: List[tuple]) -> None:
+        """Run one batched search and resolve each caller's future"""
+        started = time.perf_counter()
+        queries = [query for query, _, _, _, _, _ in batch]
+        max_k = max(k for _, k, _, _, _, _ in batch)
+        options = batch[0][4]
+        # At most one query per process is profiled, and the whole batch is its search
+        session = next((session for *_, session in batch if session is not None), None)
+        
+        self._record_batch(len(batch))
+        for _, _, _, enqueued, _, _ in batch:
+            self._wait_ms.append((started - enqueued) * 1000.0)
+        
+        try:
+            if session is None:
+                batch_results = await self.search_fn(queries, max_k, *options)
+            else:
+                batch_results = await self.search_fn(queries, max_k, *options, session=session)
+        except Exception as e:
+            for _, _, future, _, _, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        finished = time.perf_counter()
+        for (_, k, future, enqueued, _, _), results in zip(batch, batch_results):
+            self._latencies_ms.append((finished - enqueued) * 1000.0)
+            if not future.done():
+                future.set_result(results[:k])
+    
+    async def _default_search(self, queries: List[str], k: int, filters: Optional[Dict[str, Any]] = None,
+                              mode: str = None, fusion: str = None, session=None) -> List[List[Dict[str, Any]]]:
+        """Run agent.search_batch in the loop's default executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, run_profiled, session, self.agent.search_batch, queries, k,
+                                          filters, mode, fusion)
+    
+    def _record_batch(self, size: int) -> None:
+        """Update the batch size counters"""
+        self.total_queries += size
+        self.total_batches += 1
+        self.max_observed_batch = max(self.max_observed_batch, size)
+        self.batch_size_counts[size] = self.batch_size_counts.get(size, 0) + 1
+    
+    @staticmethod
+    def _percentile(samples, pct: float) -> Optional[float]:
+        """Nearest-rank percentile of a sample window"""
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+        return ordered[rank]
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get batching counters and latency percentiles"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "total_queries": self.total_queries,
+            "total_batches": self.total_batches,
+            "mean_batch_size": self.total_queries / self.total_batches if self.total_batches else 0.0,
+            "max_observed_batch": self.max_observed_batch,
+            "batch_size_counts": {str(size): count for size, count in sorted(self.batch_size_counts.items())},
+            "queue_wait_p50_ms": self._percentile(self._wait_ms, 50),
+            "queue_wait_p99_ms": self._percentile(self._wait_ms, 99),
+            "latency_p50_ms": self._percentile(self._latencies_ms, 50),
+            "latency_p99_ms": self._percentile(self._latencies_ms, 99),
+        }
@@ -8,21 +8,121 @@ except ImportError:
 class Config:
     """Configuration settings for the Fitness RAG Agent"""
     
-    # Model settings
+    # Model settings: the model is loaded on first encode; MODEL_WARMUP loads it
+    # in a background thread when the API starts
     MODEL_NAME = os.getenv("MODEL_NAME", "all-MiniLM-L6-v2")
+    MODEL_WARMUP = os.getenv("MODEL_WARMUP", "True").lower() == "true"
+    # Encoder runtime: torch, torch_int8 (dynamic int8 quantization) or onnx;
+    # ENCODER_THREADS sets intra-op threads (0 keeps the library default)
+    ENCODER_BACKEND = os.getenv("ENCODER_BACKEND", "torch")
+    ENCODER_THREADS = int(os.getenv("ENCODER_THREADS", 0))
     
     # File paths
     INDEX_FILE = os.getenv("INDEX_FILE", "storage/fitness_index.faiss")
     METADATA_FILE = os.getenv("METADATA_FILE", "storage/fitness_metadata.pkl")
     DATA_FILE = os.getenv("DATA_FILE", "data/sample_fitness_data.json")
+    WAL_FILE = os.getenv("WAL_FILE", "")  # Defaults to <INDEX_FILE>.wal
+    
+    # Storage formats: METADATA_FORMAT is pickle or offsets (memory-mappable,
+    # decoded lazily); INDEX_MMAP maps the FAISS index instead of reading it
+    METADATA_FORMAT = os.getenv("METADATA_FORMAT", "pickle")
+    INDEX_MMAP = os.getenv("INDEX_MMAP", "False").lower() == "true"
+    
+    # Index settings: flat, ivf_flat, hnsw or ivf_pq
+    INDEX_TYPE = os.getenv("INDEX_TYPE", "flat")
+    IVF_NLIST = int(os.getenv("IVF_NLIST", 1024))
+    IVF_NPROBE = int(os.getenv("IVF_NPROBE", 16))
+    HNSW_M = int(os.getenv("HNSW_M", 32))
+    HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", 40))
+    HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", 64))
+    PQ_M = int(os.getenv("PQ_M", 16))
+    PQ_NBITS = int(os.getenv("PQ_NBITS", 8))
+    # Vector codes: float32, fp16, sq8 or pq; with RERANK_FACTOR > 0 compressed
+    # indexes also keep full-precision vectors and re-score RERANK_FACTOR * k
+    # candidates exactly (such indexes are always memory-mapped, so the full
+    # vectors stay on disk)
+    VECTOR_STORAGE = os.getenv("VECTOR_STORAGE", "float32")
+    RERANK_FACTOR = int(os.getenv("RERANK_FACTOR", 0))
+    
+    # Retrieval: SEARCH_MODE is dense, lexical (BM25) or hybrid; hybrid fuses
+    # the top HYBRID_CANDIDATES of both by rrf or weighted (HYBRID_ALPHA = dense weight)
+    SEARCH_MODE = os.getenv("SEARCH_MODE", "dense")
+    FUSION_METHOD = os.getenv("FUSION_METHOD", "rrf")
+    HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", 50))
+    HYBRID_ALPHA = float(os.getenv("HYBRID_ALPHA", 0.5))
+    RRF_K = int(os.getenv("RRF_K", 60))
+    BM25_K1 = float(os.getenv("BM25_K1", 1.5))
+    BM25_B = float(os.getenv("BM25_B", 0.75))
+    
+    # Filtered searches over at most this many documents are scored exactly
+    FILTER_EXACT_MAX = int(os.getenv("FILTER_EXACT_MAX", 50000))
+    
+    # Sharded mode: SHARDS local worker processes, or the shard servers listed in
+    # SHARD_ADDRESSES (host:port,...), each own a slice of the corpus partitioned
+    # by hash of the document text or by exercise
+    SHARDS = int(os.getenv("SHARDS", 0))
+    SHARD_PARTITION = os.getenv("SHARD_PARTITION", "hash")
+    SHARD_ADDRESSES = os.getenv("SHARD_ADDRESSES", "")
+    SHARD_AUTHKEY = os.getenv("SHARD_AUTHKEY", "")  # Required with SHARD_ADDRESSES
     
     # API settings
     API_HOST = os.getenv("API_HOST", "0.0.0.0")
     API_PORT = int(os.getenv("API_PORT", 8000))
+    # Multi-worker serving: API_WORKERS > 1 runs that many uvicorn processes that
+    # map one shared snapshot; each polls the snapshot files every
+    # RELOAD_POLL_SECONDS and reloads when another process replaced them
+    API_WORKERS = int(os.getenv("API_WORKERS", 1))
+    RELOAD_POLL_SECONDS = float(os.getenv("RELOAD_POLL_SECONDS", 1.0))
+    
+    # Query batching settings
+    BATCH_ENABLED = os.getenv("BATCH_ENABLED", "True").lower() == "true"
+    BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", 32))
+    BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", 5))
+    
+    # Largest number of queries accepted by one /query_batch request
+    QUERY_BATCH_MAX_SIZE = int(os.getenv("QUERY_BATCH_MAX_SIZE", 1024))
+    
+    # Documents built per chunk by /query/stream after the top hit
+    STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", 16))
+    
+    # Write-ahead log settings: WAL_SYNC_MODE is always, group or none
+    WAL_ENABLED = os.getenv("WAL_ENABLED", "True").lower() == "true"
+    WAL_SYNC_MODE = os.getenv("WAL_SYNC_MODE", "always")
+    WAL_GROUP_COMMIT_MS = float(os.getenv("WAL_GROUP_COMMIT_MS", 5))
+    COMPACTION_INTERVAL_SECONDS = float(os.getenv("COMPACTION_INTERVAL_SECONDS", 60))
+    COMPACTION_MIN_RECORDS = int(os.getenv("COMPACTION_MIN_RECORDS", 1000))
+    
+    # Streaming ingestion settings
+    INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 256))
+    INGEST_TRAIN_SIZE = int(os.getenv("INGEST_TRAIN_SIZE", 50000))  # Vectors used to train IVF/PQ indexes
+    
+    # Persistent document embedding cache keyed by (model, document text) hash
+    EMBEDDING_STORE_ENABLED = os.getenv("EMBEDDING_STORE_ENABLED", "True").lower() == "true"
+    EMBEDDING_STORE_FILE = os.getenv("EMBEDDING_STORE_FILE", "")  # Defaults to <INDEX_FILE>.emb
+    
+    # Query cache settings (a size of 0 disables the cache)
+    EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", 10000))
+    RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", 10000))
+    CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", 0))
+    
+    # Executor settings
+    EXECUTOR_TYPE = os.getenv("EXECUTOR_TYPE", "thread")
+    EXECUTOR_WORKERS = int(os.getenv("EXECUTOR_WORKERS", min(4, os.cpu_count() or 1)))
+    EXECUTOR_QUEUE_DEPTH = int(os.getenv("EXECUTOR_QUEUE_DEPTH", 256))
+    
+    # Latency histograms for the query hot path and the API, served at /metrics
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True").lower() == "true"
+    
+    # Request profiling, off by default: cProfile a PROFILE_SAMPLE_RATE fraction of
+    # requests to PROFILE_ENDPOINTS, and with PROFILE_SLOW_MS > 0 profile every one
+    # it can (one at a time per process) but keep only those at least that slow;
+    # PROFILE_MAX_FILES caps the disk use
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+    PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", 0))
+    PROFILE_ENDPOINTS = os.getenv("PROFILE_ENDPOINTS", "/query,/load_data")
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "storage/profiles")
+    PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", 200))
     
     # Debug
     DEBUG = os.getenv("DEBUG", "True").lower() == "true"
-    
-    # Ensure storage directory exists
-    os.makedirs(os.path.dirname(INDEX_FILE), exist_ok=True)
-    os.makedirs(os.path.dirname(DATA_FILE), exist_ok=True)
+
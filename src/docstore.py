@@ -0,0 +1,337 @@
+import json
+import mmap
+import os
+import struct
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Iterator, List, Sequence
+
+import numpy as np
+
+# Fields stored as small-int codes into a per-field vocabulary
+CATEGORICAL_FIELDS = ("exercise", "context", "condition")
+TEXT_FIELD = "advice"
+DOCUMENT_FIELDS = CATEGORICAL_FIELDS + (TEXT_FIELD,)
+
+# File header: magic, snapshot id, document count, manifest length
+DOC_MAGIC = b"FRAGDOC2"
+DOC_HEADER = struct.Struct("<8s16sQQ")
+SECTION_ALIGNMENT = 8
+
+class GrowableArray:
+    """Append-only numpy array with amortized growth, optionally backed by a read-only base"""
+    
+    def __init__(self, dtype, base: np.ndarray = None):
+        """
+        Initialize the array
+        
+        Args:
+            dtype: Element type
+            base: Initial contents; read-only (memory-mapped) bases are copied
+                into RAM on the first append
+        """
+        if base is None:
+            self._data = np.empty(16, dtype=dtype)
+            self.size = 0
+        else:
+            self._data = base
+            self.size = len(base)
+    
+    @property
+    def dtype(self):
+        return self._data.dtype
+    
+    @property
+    def array(self) -> np.ndarray:
+        """View of the stored elements"""
+        return self._data[:self.size]
+    
+    def _reserve(self, extra: int) -> None:
+        """Make room for extra elements, copying read-only bases into RAM"""
+        needed = self.size + extra
+        if needed > len(self._data) or not self._data.flags.writeable:
+            data = np.empty(max(16, needed, 2 * len(self._data)), dtype=self._data.dtype)
+            data[:self.size] = self._data[:self.size]
+            self._data = data
+    
+    def append(self, value) -> None:
+        self._reserve(1)
+        self._data[self.size] = value
+        self.size += 1
+    
+    def extend(self, values) -> None:
+        values = np.asarray(values, dtype=self._data.dtype)
+        self._reserve(len(values))
+        self._data[self.size:self.size + len(values)] = values
+        self.size += len(values)
+    
+    def promote(self, dtype) -> None:
+        """Widen the element type"""
+        self._data = self.array.astype(dtype)
+    
+    @property
+    def nbytes(self) -> int:
+        return self._data.nbytes
+
+class DocumentView(Mapping):
+    """Read-only view of one stored document, decoding fields on access"""
+    
+    def __init__(self, store: "DocumentStore", idx: int):
+        self._store = store
+        self._idx = idx
+    
+    def __getitem__(self, field: str) -> Any:
+        return self._store.get_field(self._idx, field)
+    
+    def __iter__(self) -> Iterator[str]:
+        yield from DOCUMENT_FIELDS
+        yield from self._store._extras.get(self._idx, {})
+    
+    def __len__(self) -> int:
+        return len(DOCUMENT_FIELDS) + len(self._store._extras.get(self._idx, {}))
+
+class DocumentStore:
+    """
+    Columnar document store with list-like lookups
+    
+    exercise/context/condition are dictionary-encoded into uint16 code arrays
+    (widened to uint32 past 65535 distinct values), advice text lives in one
+    UTF-8 buffer addressed by an offset array, and any other fields are kept
+    in a sparse side table.
+    """
+    
+    def __init__(self, documents: Iterable[Dict[str, Any]] = None):
+        self._vocab = {field: [] for field in CATEGORICAL_FIELDS}
+        self._lookup = {field: {} for field in CATEGORICAL_FIELDS}
+        self._codes = {field: GrowableArray(np.uint16) for field in CATEGORICAL_FIELDS}
+        self._offsets = GrowableArray(np.uint64)
+        self._offsets.append(0)
+        self._text = GrowableArray(np.uint8)
+        self._extras = {}
+        # Per-field, per-code sorted document ids; built on first use by ids_for()
+        self._postings = None
+        self.snapshot_id = None
+        self._mmap = None
+        if documents is not None:
+            self.extend(documents)
+    
+    def __len__(self) -> int:
+        return self._offsets.size - 1
+    
+    def _check_index(self, idx) -> int:
+        idx = int(idx)
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError("document index out of range")
+        return idx
+    
+    def get_field(self, idx: int, field: str) -> Any:
+        """Decode a single field of a document"""
+        idx = self._check_index(idx)
+        if field in self._codes:
+            return self._vocab[field][self._codes[field].array[idx]]
+        if field == TEXT_FIELD:
+            offsets = self._offsets.array
+            return self._text.array[offsets[idx]:offsets[idx + 1]].tobytes().decode('utf-8')
+        return self._extras.get(idx, {})[field]
+    
+    def get(self, idx: int, fields: Sequence[str] = None) -> Dict[str, Any]:
+        """Build a new dict for a document, optionally with only some fields"""
+        idx = self._check_index(idx)
+        if fields is None:
+            document = {field: self.get_field(idx, field) for field in DOCUMENT_FIELDS}
+            extras = self._extras.get(idx)
+            if extras:
+                document.update(extras)
+            return document
+        return {field: self.get_field(idx, field) for field in fields}
+    
+    def get_many(self, ids: np.ndarray) -> List[Dict[str, Any]]:
+        """Build dicts for many documents, gathering each column with one fancy index"""
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) and (ids.min() < 0 or ids.max() >= len(self)):
+            raise IndexError("document index out of range")
+        
+        columns = {}
+        for field in CATEGORICAL_FIELDS:
+            vocab = np.empty(len(self._vocab[field]), dtype=object)
+            vocab[:] = self._vocab[field]
+            columns[field] = vocab[self._codes[field].array[ids]].tolist()
+        offsets = self._offsets.array
+        text = self._text.array
+        columns[TEXT_FIELD] = [text[start:end].tobytes().decode('utf-8')
+                               for start, end in zip(offsets[ids].tolist(), offsets[ids + 1].tolist())]
+        
+        documents = [dict(zip(DOCUMENT_FIELDS, values))
+                     for values in zip(*(columns[field] for field in DOCUMENT_FIELDS))]
+        if self._extras:
+            for document, idx in zip(documents, ids.tolist()):
+                extras = self._extras.get(idx)
+                if extras:
+                    document.update(extras)
+        return documents
+    
+    def view(self, idx: int) -> DocumentView:
+        """Lazy read-only view of a document"""
+        return DocumentView(self, self._check_index(idx))
+    
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self.get(i) for i in range(*idx.indices(len(self)))]
+        return self.get(idx)
+    
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for idx in range(len(self)):
+            yield self.get(idx)
+    
+    def _encode(self, field: str, value: Any) -> int:
+        """Look up or assign the code for a categorical value"""
+        code = self._lookup[field].get(value)
+        if code is None:
+            code = len(self._vocab[field])
+            self._vocab[field].append(value)
+            self._lookup[field][value] = code
+            if code > np.iinfo(self._codes[field].dtype).max:
+                self._codes[field].promote(np.uint32)
+        return code
+    
+    def append(self, document: Dict[str, Any]) -> None:
+        """Add a document"""
+        idx = len(self)
+        for field in CATEGORICAL_FIELDS:
+            code = self._encode(field, document[field])
+            self._codes[field].append(code)
+            if self._postings is not None:
+                postings = self._postings[field]
+                if code == len(postings):
+                    postings.append(GrowableArray(np.int64))
+                postings[code].append(idx)
+        
+        text = document[TEXT_FIELD].encode('utf-8')
+        self._text.extend(np.frombuffer(text, dtype=np.uint8))
+        self._offsets.append(self._text.size)
+        
+        extras = {key: value for key, value in document.items() if key not in DOCUMENT_FIELDS}
+        if extras:
+            self._extras[idx] = extras
+    
+    def extend(self, documents: Iterable[Dict[str, Any]]) -> None:
+        """Add several documents"""
+        for document in documents:
+            self.append(document)
+    
+    def vocabulary(self, field: str) -> List[Any]:
+        """Distinct values of a categorical field"""
+        return list(self._vocab[field])
+    
+    def codes(self, field: str) -> np.ndarray:
+        """Per-document codes of a categorical field"""
+        return self._codes[field].array
+    
+    def _build_postings(self) -> None:
+        """Group document ids by code for every categorical field"""
+        postings = {}
+        for field in CATEGORICAL_FIELDS:
+            codes = self.codes(field)
+            order = np.argsort(codes, kind='stable')
+            bounds = np.cumsum(np.bincount(codes, minlength=len(self._vocab[field])))[:-1]
+            postings[field] = [GrowableArray(np.int64, ids.astype(np.int64)) for ids in np.split(order, bounds)]
+        self._postings = postings
+    
+    def ids_for(self, field: str, values: Iterable[Any]) -> np.ndarray:
+        """Sorted ids of the documents whose field holds any of the values"""
+        if field not in self._vocab:
+            raise ValueError(f"Cannot filter on '{field}'. Filterable fields: {', '.join(CATEGORICAL_FIELDS)}")
+        if self._postings is None:
+            self._build_postings()
+        
+        codes = {self._lookup[field][value] for value in values if value in self._lookup[field]}
+        lists = [self._postings[field][code].array for code in codes]
+        if not lists:
+            return np.empty(0, dtype=np.int64)
+        if len(lists) == 1:
+            return lists[0]
+        return np.sort(np.concatenate(lists))
+    
+    def memory_usage(self) -> Dict[str, int]:
+        """Approximate bytes held by each part of the store"""
+        usage = {f"{field}_codes": self._codes[field].nbytes for field in CATEGORICAL_FIELDS}
+        usage["advice_offsets"] = self._offsets.nbytes
+        usage["advice_text"] = self._text.nbytes
+        usage["vocabulary"] = sum(len(str(value)) + 64 for vocab in self._vocab.values() for value in vocab)
+        if self._postings is not None:
+            usage["postings"] = sum(ids.nbytes for lists in self._postings.values() for ids in lists)
+        usage["total"] = sum(usage.values())
+        return usage
+    
+    def save(self, path: str, snapshot_id: bytes) -> None:
+        """
+        Write the store in a memory-mappable columnar file
+        
+        Layout: header, JSON manifest (vocabularies, extras, section table),
+        then 8-byte aligned sections for each code array, the advice offsets
+        and the advice text.
+        """
+        arrays = [(f"{field}_codes", self._codes[field].array) for field in CATEGORICAL_FIELDS]
+        arrays += [("advice_offsets", self._offsets.array), ("advice_text", self._text.array)]
+        
+        sections = {}
+        position = 0
+        for name, array in arrays:
+            sections[name] = {"dtype": array.dtype.str, "count": len(array), "offset": position}
+            position += -(-array.nbytes // SECTION_ALIGNMENT) * SECTION_ALIGNMENT
+        
+        manifest = json.dumps({
+            "vocab": self._vocab,
+            "extras": {str(idx): extras for idx, extras in self._extras.items()},
+            "sections": sections
+        }).encode('utf-8')
+        manifest += b" " * (-len(manifest) % SECTION_ALIGNMENT)
+        data_start = DOC_HEADER.size + len(manifest)
+        
+        with open(path, 'wb') as f:
+            f.write(DOC_HEADER.pack(DOC_MAGIC, snapshot_id, len(self), len(manifest)))
+            f.write(manifest)
+            for name, array in arrays:
+                f.seek(data_start + sections[name]["offset"])
+                f.write(array.tobytes())
+            f.truncate(data_start + position)
+            f.flush()
+            os.fsync(f.fileno())
+    
+    @classmethod
+    def open(cls, path: str) -> "DocumentStore":
+        """Map a saved store; sections stay on disk until read or modified"""
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        magic, snapshot_id, count, manifest_length = DOC_HEADER.unpack_from(mapped, 0)
+        if magic != DOC_MAGIC:
+            raise ValueError(f"{path} is not a document store file")
+        manifest = json.loads(mapped[DOC_HEADER.size:DOC_HEADER.size + manifest_length])
+        data_start = DOC_HEADER.size + manifest_length
+        
+        def section(name):
+            info = manifest["sections"][name]
+            return np.frombuffer(mapped, dtype=np.dtype(info["dtype"]), count=info["count"],
+                                 offset=data_start + info["offset"])
+        
+        store = cls()
+        store._mmap = mapped
+        store.snapshot_id = snapshot_id
+        store._vocab = manifest["vocab"]
+        store._lookup = {field: {value: code for code, value in enumerate(vocab)}
+                         for field, vocab in store._vocab.items()}
+        store._codes = {field: GrowableArray(None, section(f"{field}_codes")) for field in CATEGORICAL_FIELDS}
+        store._offsets = GrowableArray(None, section("advice_offsets"))
+        store._text = GrowableArray(None, section("advice_text"))
+        store._extras = {int(idx): extras for idx, extras in manifest["extras"].items()}
+        return store
+
+def is_document_file(path: str) -> bool:
+    """Whether a metadata file uses the columnar document store format"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(DOC_MAGIC)) == DOC_MAGIC
+    except OSError:
+        return False
@@ -0,0 +1,182 @@
+import hashlib
+import os
+import struct
+import threading
+from typing import Any, Dict, Iterable, List, Tuple
+
+import numpy as np
+
+# File header: magic + vector dimension; fixed-size (key, vector) records follow
+EMB_MAGIC = b"FRAGEMB1"
+EMB_HEADER = struct.Struct("<8sI")
+KEY_SIZE = 16
+
+class EmbeddingStore:
+    """
+    Persistent document embedding cache keyed by content hash
+    
+    Each record is a 16-byte BLAKE2b digest of (model name, document text)
+    followed by the normalized float32 vector. The file is appended to,
+    memory-mapped for reads, so only the key index lives in RAM, and
+    compacted down to the live documents when a snapshot is saved.
+    """
+    
+    def __init__(self, path: str, model_name: str):
+        """
+        Initialize the embedding store
+        
+        Args:
+            path: Store file path
+            model_name: Model the vectors come from; part of every key so a
+                model change never reuses stale vectors
+        """
+        self.path = path
+        self.model_name = model_name
+        self.dimension = None
+        self._rows = None
+        self._records = None
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+        self.last_hits = 0
+        self.last_misses = 0
+    
+    def key(self, text: str) -> bytes:
+        """Content key of a document text"""
+        digest = hashlib.blake2b(digest_size=KEY_SIZE)
+        digest.update(self.model_name.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(text.encode("utf-8"))
+        return digest.digest()
+    
+    def _record_dtype(self) -> np.dtype:
+        return np.dtype([("key", f"S{KEY_SIZE}"), ("vector", "<f4", (self.dimension,))])
+    
+    def _load(self) -> None:
+        """Read the key index from disk, dropping a torn tail or an unreadable file"""
+        self._rows = {}
+        self._records = None
+        try:
+            with open(self.path, 'rb') as f:
+                header = f.read(EMB_HEADER.size)
+        except FileNotFoundError:
+            return
+        if len(header) < EMB_HEADER.size or EMB_HEADER.unpack(header)[0] != EMB_MAGIC:
+            print(f"Warning: ignoring unreadable embedding store {self.path}")
+            os.remove(self.path)
+            return
+        
+        self.dimension = EMB_HEADER.unpack(header)[1]
+        record_size = self._record_dtype().itemsize
+        count = (os.path.getsize(self.path) - EMB_HEADER.size) // record_size
+        with open(self.path, 'r+b') as f:
+            f.truncate(EMB_HEADER.size + count * record_size)  # Torn tail from an interrupted append
+        
+        self._remap()
+        keys = self._records["key"] if self._records is not None else []
+        self._rows = {bytes(key): row for row, key in enumerate(keys)}
+    
+    def _remap(self) -> None:
+        """Map the records currently on disk"""
+        record_size = self._record_dtype().itemsize
+        count = (os.path.getsize(self.path) - EMB_HEADER.size) // record_size
+        self._records = np.memmap(self.path, dtype=self._record_dtype(), mode='r',
+                                  offset=EMB_HEADER.size, shape=(count,)) if count else None
+    
+    def lookup(self, keys: List[bytes]) -> Tuple[np.ndarray, np.ndarray]:
+        """Stored vectors for the keys found and a boolean hit mask over keys"""
+        with self._lock:
+            if self._rows is None:
+                self._load()
+            rows = np.array([self._rows.get(key, -1) for key in keys], dtype=np.int64)
+            found = rows >= 0
+            
+            self.last_hits = int(found.sum())
+            self.last_misses = len(keys) - self.last_hits
+            self.hits += self.last_hits
+            self.misses += self.last_misses
+            
+            if not self.last_hits:
+                return np.empty((0, self.dimension or 0), dtype='float32'), found
+            return np.array(self._records["vector"][rows[found]], dtype='float32'), found
+    
+    def put(self, keys: List[bytes], vectors: np.ndarray) -> None:
+        """Append vectors for keys not stored yet"""
+        vectors = np.asarray(vectors, dtype='float32')
+        if not len(keys):
+            return
+        with self._lock:
+            if self._rows is None:
+                self._load()
+            if self.dimension is None or self.dimension != vectors.shape[1]:
+                self._create(vectors.shape[1])
+            
+            new_rows = {}
+            selected = []
+            for i, key in enumerate(keys):
+                if key not in self._rows and key not in new_rows:
+                    new_rows[key] = len(self._rows) + len(new_rows)
+                    selected.append(i)
+            if not selected:
+                return
+            
+            records = np.empty(len(selected), dtype=self._record_dtype())
+            records["key"] = [keys[i] for i in selected]
+            records["vector"] = vectors[selected]
+            with open(self.path, 'ab') as f:
+                f.write(records.tobytes())
+            self._rows.update(new_rows)
+            self._remap()
+    
+    def compact(self, keys: Iterable[bytes]) -> int:
+        """Rewrite the file keeping only the records of keys; returns how many were dropped"""
+        with self._lock:
+            if self._rows is None:
+                self._load()
+            rows = sorted({self._rows[key] for key in keys if key in self._rows})
+            dropped = len(self._rows) - len(rows)
+            if not dropped:
+                return 0
+            
+            records = np.asarray(self._records[rows])
+            with open(self.path + ".tmp", 'wb') as f:
+                f.write(EMB_HEADER.pack(EMB_MAGIC, self.dimension))
+                f.write(records.tobytes())
+            os.replace(self.path + ".tmp", self.path)
+            self._rows = {bytes(key): row for row, key in enumerate(records["key"])}
+            self._remap()
+            return dropped
+    
+    def _create(self, dimension: int) -> None:
+        """Start an empty store for vectors of the given dimension"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'wb') as f:
+            f.write(EMB_HEADER.pack(EMB_MAGIC, dimension))
+        self.dimension = dimension
+        self._rows = {}
+        self._records = None
+    
+    def __len__(self) -> int:
+        with self._lock:
+            if self._rows is None:
+                self._load()
+            return len(self._rows)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit counters for the last lookup and overall"""
+        total = self.hits + self.misses
+        last_total = self.last_hits + self.last_misses
+        return {
+            "path": self.path,
+            "entries": len(self),
+            "size_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "last_hits": self.last_hits,
+            "last_misses": self.last_misses,
+            "last_hit_ratio": self.last_hits / last_total if last_total else 0.0
+        }
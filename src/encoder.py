@@ -0,0 +1,87 @@
+import warnings
+from typing import List
+
+import numpy as np
+
+from .config import Config
+
+# torch: reference fp32 PyTorch; torch_int8: dynamic int8 quantization of the
+# Linear layers; onnx: ONNX Runtime export (needs sentence-transformers>=3.2
+# and optimum[onnxruntime])
+ENCODER_BACKENDS = ("torch", "torch_int8", "onnx")
+
+# First sentence-transformers release with the backend="onnx" argument
+ONNX_MIN_VERSION = (3, 2)
+
+def _version_tuple(version: str) -> tuple:
+    """(major, minor) of a version string such as 2.2.2 or 3.2.0.dev0"""
+    parts = []
+    for part in version.split(".")[:2]:
+        digits = "".join(ch for ch in part if ch.isdigit())
+        parts.append(int(digits or 0))
+    return tuple(parts)
+
+def encoder_id(model_name: str, backend: str = None) -> str:
+    """Identifier of the vectors a model/backend pair produces, used to key stored embeddings"""
+    backend = (backend or Config.ENCODER_BACKEND).lower()
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+def load_encoder(model_name: str, backend: str = None, threads: int = None):
+    """
+    Load a sentence transformer for the given backend
+    
+    Args:
+        model_name: Sentence transformer model name or path
+        backend: One of ENCODER_BACKENDS
+        threads: Intra-op threads for the forward pass (0 keeps the library default)
+    """
+    backend = (backend or Config.ENCODER_BACKEND).lower()
+    threads = Config.ENCODER_THREADS if threads is None else threads
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"Unknown encoder backend: {backend}. Choose from {', '.join(ENCODER_BACKENDS)}")
+    
+    import torch
+    import sentence_transformers
+    from sentence_transformers import SentenceTransformer
+    
+    if threads > 0:
+        torch.set_num_threads(threads)
+    
+    if backend == "onnx":
+        if _version_tuple(sentence_transformers.__version__) < ONNX_MIN_VERSION:
+            raise ImportError(f"ENCODER_BACKEND=onnx requires sentence-transformers>="
+                              f"{'.'.join(map(str, ONNX_MIN_VERSION))} (installed: {sentence_transformers.__version__}): "
+                              f"pip install 'sentence-transformers>=3.2' optimum[onnxruntime]")
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError("ENCODER_BACKEND=onnx requires onnxruntime: pip install optimum[onnxruntime]")
+        session_options = onnxruntime.SessionOptions()
+        if threads > 0:
+            session_options.intra_op_num_threads = threads
+            session_options.inter_op_num_threads = 1
+        return SentenceTransformer(model_name, backend="onnx",
+                                   model_kwargs={"session_options": session_options,
+                                                 "provider": "CPUExecutionProvider"})
+    
+    model = SentenceTransformer(model_name, device="cpu" if backend == "torch_int8" else None)
+    if backend == "torch_int8":
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+def encode_normalized(model, texts: List[str], batch_size: int = 32) -> np.ndarray:
+    """Encode texts into L2-normalized float32 vectors"""
+    embeddings = model.encode(texts, batch_size=batch_size, convert_to_numpy=True).astype('float32')
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+def cosine_parity(reference: np.ndarray, candidate: np.ndarray) -> dict:
+    """Per-text cosine similarity between normalized reference and candidate embeddings"""
+    cosines = np.sum(reference * candidate, axis=1)
+    return {
+        "min_cosine": float(cosines.min()),
+        "mean_cosine": float(cosines.mean()),
+        "p01_cosine": float(np.percentile(cosines, 1))
+    }
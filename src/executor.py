@@ -0,0 +1,123 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import List, Dict, Any, Callable, Optional
+from .profiling import ProfileSession, run_profiled
+from .config import Config
+
+class ExecutorBusyError(RuntimeError):
+    """Raised when the executor queue is full"""
+
+# Per-process agent used by process pool workers
+_worker_agent = None
+_worker_signature = None
+
+def _index_signature(agent) -> tuple:
+    """Modification times of the persisted index files"""
+    signature = []
+    for path in (agent.index_file, agent.metadata_file, agent.wal_file):
+        try:
+            signature.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+def _init_worker(model_name: str, index_file: str, metadata_file: str) -> None:
+    """Create the worker-local agent for a process pool worker"""
+    global _worker_agent
+    from .rag_agent import FitnessRAGAgent
+    _worker_agent = FitnessRAGAgent(model_name=model_name, index_file=index_file,
+                                    metadata_file=metadata_file)
+
+def _worker_search_batch(queries: List[str], k: int, filters: Optional[Dict[str, Any]] = None,
+                         mode: str = None, fusion: str = None) -> List[List[Dict[str, Any]]]:
+    """Run a batched search in a process pool worker, reloading the index when it changed on disk"""
+    global _worker_signature
+    signature = _index_signature(_worker_agent)
+    if signature != _worker_signature:
+        _worker_agent.load_index()
+        _worker_signature = signature
+    return _worker_agent.search_batch(queries, k, filters, mode, fusion)
+
+class AgentExecutor:
+    """Runs CPU-bound agent work off the event loop in a thread or process pool"""
+    
+    def __init__(self, agent, kind: str = None, max_workers: int = None, queue_depth: int = None):
+        """
+        Initialize the executor
+        
+        Args:
+            agent: FitnessRAGAgent the work runs against
+            kind: "thread" or "process"; process pools serve searches from
+                worker-local agents that load the persisted index
+            max_workers: Pool size
+            queue_depth: Maximum running plus queued tasks before rejecting work
+        """
+        self.agent = agent
+        self.kind = (kind or Config.EXECUTOR_TYPE).lower()
+        self.max_workers = max_workers or Config.EXECUTOR_WORKERS
+        self.queue_depth = queue_depth or Config.EXECUTOR_QUEUE_DEPTH
+        
+        if self.kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor type: {self.kind}")
+        
+        self._threads = ThreadPoolExecutor(max_workers=self.max_workers,
+                                           thread_name_prefix="rag-agent")
+        self._processes = None
+        if self.kind == "process":
+            self._processes = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(agent.model_name, agent.index_file, agent.metadata_file)
+            )
+        
+        self.in_flight = 0
+        self.rejected = 0
+        self.completed = 0
+    
+    async def _submit(self, pool, func: Callable, *args) -> Any:
+        """Submit work to a pool, enforcing the queue depth"""
+        if self.in_flight >= self.queue_depth:
+            self.rejected += 1
+            raise ExecutorBusyError(f"Executor queue is full ({self.queue_depth} tasks)")
+        
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(pool, func, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+    
+    async def run(self, func: Callable, *args) -> Any:
+        """Run a callable against the in-process agent in the thread pool"""
+        return await self._submit(self._threads, func, *args)
+    
+    async def search_batch(self, queries: List[str], k: int = 3, filters: Optional[Dict[str, Any]] = None,
+                           mode: str = None, fusion: str = None,
+                           session: Optional[ProfileSession] = None) -> List[List[Dict[str, Any]]]:
+        """Run a batched search in the configured pool, profiled by session when in-process"""
+        if self._processes is not None:
+            return await self._submit(self._processes, _worker_search_batch, list(queries), k,
+                                      filters, mode, fusion)
+        return await self._submit(self._threads, run_profiled, session, self.agent.search_batch, list(queries), k,
+                                  filters, mode, fusion)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get executor configuration and load counters"""
+        return {
+            "type": self.kind,
+            "max_workers": self.max_workers,
+            "queue_depth": self.queue_depth,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected
+        }
+    
+    def shutdown(self, wait: bool = True) -> None:
+        """Shut down the worker pools"""
+        self._threads.shutdown(wait=wait)
+        if self._processes is not None:
+            self._processes.shutdown(wait=wait)
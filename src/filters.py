@@ -0,0 +1,102 @@
+import faiss
+import numpy as np
+from typing import Any, Dict, Optional, Tuple
+from .config import Config
+from .index_factory import base_index
+
+# Queries are scored against gathered vectors in blocks of this many documents
+SUBSET_BLOCK_SIZE = 16384
+
+def normalize_filters(filters: Optional[Dict[str, Any]]) -> Tuple:
+    """Canonical hashable form of a filter dict; () means unfiltered"""
+    if not filters:
+        return ()
+    normalized = []
+    for field, values in sorted(filters.items()):
+        if isinstance(values, (str, bytes)) or not hasattr(values, '__iter__'):
+            values = [values]
+        normalized.append((field, tuple(sorted(set(values)))))
+    return tuple(normalized)
+
+def allowed_ids(store, filters: Tuple) -> np.ndarray:
+    """
+    Sorted ids matching every field filter
+    
+    Values within a field are OR-ed, fields are AND-ed; intersections start
+    from the smallest id-set.
+    """
+    id_sets = sorted((store.ids_for(field, values) for field, values in filters), key=len)
+    ids = id_sets[0]
+    for other in id_sets[1:]:
+        if not len(ids):
+            break
+        ids = np.intersect1d(ids, other, assume_unique=True)
+    return ids
+
+def _supports_reconstruct(index: faiss.Index) -> bool:
+    """Whether stored vectors can be gathered by id (IVF indexes need the direct map configure_index adds)"""
+    try:
+        index.reconstruct(0)
+        return True
+    except RuntimeError:
+        return False
+
+def search_subset(index: faiss.Index, embeddings: np.ndarray, ids: np.ndarray,
+                  k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Exact inner product top-k over the given ids only, in faiss result layout"""
+    n_queries = len(embeddings)
+    best_scores = np.full((n_queries, k), -np.inf, dtype='float32')
+    best_ids = np.full((n_queries, k), -1, dtype='int64')
+    
+    for start in range(0, len(ids), SUBSET_BLOCK_SIZE):
+        block = ids[start:start + SUBSET_BLOCK_SIZE]
+        scores = embeddings @ index.reconstruct_batch(block).T
+        
+        # Merge this block's candidates with the running top-k
+        scores = np.concatenate([best_scores, scores], axis=1)
+        candidates = np.concatenate([best_ids, np.broadcast_to(block, (n_queries, len(block)))], axis=1)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k] if scores.shape[1] > k else \
+            np.broadcast_to(np.arange(scores.shape[1]), (n_queries, scores.shape[1]))
+        best_scores = np.take_along_axis(scores, top, axis=1)
+        best_ids = np.take_along_axis(candidates, top, axis=1)
+    
+    order = np.argsort(-best_scores, axis=1, kind='stable')
+    best_scores = np.take_along_axis(best_scores, order, axis=1)
+    best_ids = np.take_along_axis(best_ids, order, axis=1)
+    best_ids[~np.isfinite(best_scores)] = -1
+    return best_scores, best_ids
+
+def _selector_params(index: faiss.Index, ids: np.ndarray) -> faiss.SearchParameters:
+    """Search parameters restricting an index to the given ids"""
+    selector = faiss.IDSelectorBatch(ids)
+    base = base_index(index)
+    ivf = faiss.try_extract_index_ivf(base)
+    if ivf is not None:
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    elif hasattr(base, "hnsw"):
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=base.hnsw.efSearch)
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    if base is not index:
+        # The refine stage only re-scores what the selector let through
+        return faiss.IndexRefineSearchParameters(k_factor=index.k_factor, base_index_params=params)
+    return params
+
+def filtered_search(index: faiss.Index, embeddings: np.ndarray, k: int,
+                    ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Search only the allowed ids
+    
+    Flat indexes and subsets up to FILTER_EXACT_MAX documents are scored
+    exactly against the gathered vectors, which costs O(len(ids)) instead of
+    O(ntotal) and keeps full recall. Larger subsets on ANN indexes go through
+    a faiss IDSelector so only allowed ids are returned.
+    """
+    if not len(ids):
+        return (np.full((len(embeddings), k), -np.inf, dtype='float32'),
+                np.full((len(embeddings), k), -1, dtype='int64'))
+    
+    exact = isinstance(index, faiss.IndexFlat) or len(ids) <= Config.FILTER_EXACT_MAX
+    if exact and _supports_reconstruct(index):
+        return search_subset(index, embeddings, ids, k)
+    return index.search(embeddings, k, params=_selector_params(index, ids))
@@ -0,0 +1,171 @@
+import faiss
+import numpy as np
+from typing import Any, Dict
+from .config import Config
+
+# Supported index types and what they trade off
+INDEX_TYPES = {
+    "flat": "Exact brute-force inner product search",
+    "ivf_flat": "Inverted file over trained centroids; scans nprobe of nlist lists",
+    "hnsw": "Hierarchical navigable small world graph; no training required",
+    "ivf_pq": "Inverted file with product-quantized codes; smallest memory footprint"
+}
+
+# Per-vector codes the index stores, from exact to most compact
+VECTOR_STORAGE = {
+    "float32": "Full-precision vectors, 4 bytes per dimension",
+    "fp16": "Half-precision scalar quantizer, 2 bytes per dimension",
+    "sq8": "8-bit scalar quantizer, 1 byte per dimension",
+    "pq": "Product quantizer, pq_m codes of pq_nbits bits per vector"
+}
+
+# k-means wants roughly this many training points per centroid
+MIN_POINTS_PER_CENTROID = 39
+
+def get_index_params(**overrides) -> Dict[str, Any]:
+    """Get index tuning parameters from Config, with optional overrides"""
+    params = {
+        "nlist": Config.IVF_NLIST,
+        "nprobe": Config.IVF_NPROBE,
+        "hnsw_m": Config.HNSW_M,
+        "ef_construction": Config.HNSW_EF_CONSTRUCTION,
+        "ef_search": Config.HNSW_EF_SEARCH,
+        "pq_m": Config.PQ_M,
+        "pq_nbits": Config.PQ_NBITS,
+        "vector_storage": Config.VECTOR_STORAGE,
+        "rerank_factor": Config.RERANK_FACTOR
+    }
+    params.update({key: value for key, value in overrides.items() if value is not None})
+    return params
+
+def _pq_subquantizers(dimension: int, pq_m: int) -> int:
+    """Largest number of sub-quantizers <= pq_m that divides the dimension"""
+    for m in range(min(pq_m, dimension), 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+def _storage_codes(storage: str, dimension: int, ntotal: int, params: Dict[str, Any]) -> str:
+    """index_factory encoding for a vector storage setting"""
+    if storage == "fp16":
+        return "SQfp16"
+    if storage == "sq8":
+        return "SQ8"
+    if storage == "pq":
+        pq_m = _pq_subquantizers(dimension, params['pq_m'])
+        pq_nbits = max(1, min(params['pq_nbits'], int(np.log2(max(ntotal, 2)))))
+        return f"PQ{pq_m}x{pq_nbits}"
+    return "Flat"
+
+def keeps_rerank_vectors(index_type: str = None, **overrides) -> bool:
+    """
+    Whether indexes built with these settings keep full-precision vectors for re-ranking
+    
+    Those vectors are as large as a float32 index, so agents memory-map such
+    indexes to keep them out of RAM.
+    """
+    params = get_index_params(**overrides)
+    compressed = (index_type or Config.INDEX_TYPE).lower() == "ivf_pq" or params['vector_storage'].lower() != "float32"
+    return compressed and params['rerank_factor'] > 0
+
+def index_description(index_type: str, dimension: int, ntotal: int, **overrides) -> str:
+    """
+    Build the faiss index_factory string for an index type
+    
+    IVF list counts and PQ code sizes are clamped so that small corpora
+    still have enough points to train on. Compressed storage (fp16, sq8, pq;
+    ivf_pq is always pq) with rerank_factor > 0 appends a refine stage that
+    keeps the full-precision vectors and re-scores rerank_factor * k
+    candidates exactly.
+    """
+    params = get_index_params(**overrides)
+    index_type = index_type.lower()
+    storage = params['vector_storage'].lower()
+    if storage not in VECTOR_STORAGE:
+        raise ValueError(f"Unknown vector storage: {storage}. Expected one of {', '.join(VECTOR_STORAGE)}")
+    if index_type == "ivf_pq":
+        storage = "pq"
+    codes = _storage_codes(storage, dimension, ntotal, params)
+    
+    if index_type == "flat":
+        description = codes
+    elif index_type == "hnsw":
+        description = f"HNSW{params['hnsw_m']}" if storage == "float32" else f"HNSW{params['hnsw_m']}_{codes}"
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        nlist = max(1, min(params['nlist'], ntotal // MIN_POINTS_PER_CENTROID))
+        description = f"IVF{nlist},{codes}"
+    else:
+        raise ValueError(f"Unknown index type: {index_type}. Expected one of {', '.join(INDEX_TYPES)}")
+    
+    if keeps_rerank_vectors(index_type, **overrides):
+        description += ",RFlat"
+    return description
+
+def configure_index(index: faiss.Index, **overrides) -> faiss.Index:
+    """
+    Apply search-time parameters (nprobe, efSearch, re-rank depth) to an index
+    
+    IVF indexes also get their direct map (8 bytes per vector) here, while
+    the index is built or loaded and not yet shared with searches.
+    """
+    params = get_index_params(**overrides)
+    
+    ivf = faiss.try_extract_index_ivf(index)
+    base = base_index(index)
+    if ivf is not None:
+        ivf.nprobe = min(params['nprobe'], ivf.nlist)
+        if base is index and ivf.direct_map.no():
+            # Lets filtered searches gather vectors by id without modifying the index;
+            # a refine stage reconstructs from its own full-precision vectors instead
+            ivf.make_direct_map()
+    if hasattr(base, "hnsw"):
+        base.hnsw.efSearch = params['ef_search']
+    if base is not index:
+        index.k_factor = max(1, params['rerank_factor'])
+    
+    return index
+
+def base_index(index: faiss.Index) -> faiss.Index:
+    """The approximate index under a refine stage, or the index itself"""
+    if isinstance(index, faiss.IndexRefine):
+        return faiss.downcast_index(index.base_index)
+    return index
+
+def create_index(dimension: int, index_type: str = None, train_size: int = 0, **overrides) -> faiss.Index:
+    """
+    Create an empty inner product index
+    
+    Args:
+        dimension: Vector dimension
+        index_type: One of INDEX_TYPES; defaults to Config.INDEX_TYPE
+        train_size: Number of vectors the index will be trained on, used to
+            size IVF lists and PQ codes
+        **overrides: Tuning parameters overriding Config (nlist, nprobe,
+            hnsw_m, ef_construction, ef_search, pq_m, pq_nbits,
+            vector_storage, rerank_factor)
+    """
+    index_type = index_type or Config.INDEX_TYPE
+    description = index_description(index_type, dimension, train_size, **overrides)
+    index = faiss.index_factory(dimension, description, faiss.METRIC_INNER_PRODUCT)
+    if hasattr(base_index(index), "hnsw"):
+        base_index(index).hnsw.efConstruction = get_index_params(**overrides)['ef_construction']
+    return configure_index(index, **overrides)
+
+def build_index(embeddings: np.ndarray, index_type: str = None, **overrides) -> faiss.Index:
+    """
+    Create, train and fill an inner product index
+    
+    Args:
+        embeddings: L2-normalized float32 vectors, one row per document
+        index_type: One of INDEX_TYPES; defaults to Config.INDEX_TYPE
+        **overrides: Tuning parameters overriding Config
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+    ntotal, dimension = embeddings.shape
+    
+    index = create_index(dimension, index_type, ntotal, **overrides)
+    if not index.is_trained:
+        index.train(embeddings)
+    index.add(embeddings)
+    
+    return index
@@ -0,0 +1,225 @@
+import json
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TextIO
+
+import numpy as np
+
+from .config import Config
+from .docstore import DocumentStore
+from .index_factory import create_index
+
+REQUIRED_FIELDS = ("exercise", "context", "condition", "advice")
+
+def validate_record(record: Any, position: int) -> Dict[str, Any]:
+    """Check that a parsed record is a document with every required field"""
+    if not isinstance(record, dict):
+        raise ValueError(f"Record {position}: expected a JSON object")
+    missing = [field for field in REQUIRED_FIELDS if field not in record]
+    if missing:
+        raise ValueError(f"Record {position}: missing fields {', '.join(missing)}")
+    return record
+
+class NDJSONParser:
+    """Incremental newline-delimited JSON parser fed with arbitrary byte chunks"""
+    
+    def __init__(self):
+        self._buffer = b""
+        self.records = 0
+    
+    def feed(self, chunk: bytes) -> List[Dict[str, Any]]:
+        """Parse every complete line in the chunk"""
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split(b"\n")
+        return [record for record in map(self._parse, lines) if record is not None]
+    
+    def close(self) -> List[Dict[str, Any]]:
+        """Parse a final line without a trailing newline"""
+        line, self._buffer = self._buffer, b""
+        record = self._parse(line)
+        return [record] if record is not None else []
+    
+    def _parse(self, line: bytes) -> Optional[Dict[str, Any]]:
+        line = line.strip()
+        if not line:
+            return None
+        self.records += 1
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Record {self.records}: invalid JSON ({e})")
+        return validate_record(record, self.records)
+
+def iter_ndjson(f, chunk_size: int = 1 << 16) -> Iterator[Dict[str, Any]]:
+    """Yield documents from a binary NDJSON stream"""
+    parser = NDJSONParser()
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+def iter_json_array(f: TextIO, chunk_size: int = 1 << 16) -> Iterator[Dict[str, Any]]:
+    """Yield documents from a text stream holding one JSON array, without loading it whole"""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    started = False
+    
+    while True:
+        chunk = f.read(chunk_size)
+        buffer += chunk
+        while True:
+            buffer = buffer.lstrip()
+            if not started:
+                if not buffer:
+                    break
+                if buffer[0] != "[":
+                    raise ValueError("Expected a JSON array of documents")
+                buffer = buffer[1:]
+                started = True
+                continue
+            if buffer[:1] == ",":
+                buffer = buffer[1:]
+                continue
+            if buffer[:1] == "]":
+                return
+            try:
+                record, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise ValueError(f"Record {position + 1}: invalid or truncated JSON")
+                break  # Need more data
+            position += 1
+            yield validate_record(record, position)
+            buffer = buffer[end:]
+        if not chunk:
+            if started:
+                raise ValueError("Unterminated JSON array")
+            return
+
+def iter_records(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield documents from a NDJSON (.ndjson/.jsonl) or JSON array file"""
+    if path.endswith((".ndjson", ".jsonl")):
+        with open(path, 'rb') as f:
+            yield from iter_ndjson(f)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from iter_json_array(f)
+
+class Ingestor:
+    """Embeds and indexes a stream of documents in fixed-size batches"""
+    
+    def __init__(self, agent, batch_size: int = None, replace: bool = True,
+                 progress: Callable[[Dict[str, Any]], None] = None):
+        """
+        Initialize the ingestor
+        
+        Args:
+            agent: FitnessRAGAgent receiving the documents
+            batch_size: Documents embedded and indexed per batch
+            replace: Build a new corpus that replaces the agent's when finished;
+                otherwise batches are appended to the live index as they arrive
+            progress: Callback receiving progress stats after each batch
+        """
+        self.agent = agent
+        self.batch_size = max(1, batch_size or Config.INGEST_BATCH_SIZE)
+        self.replace = replace
+        self.progress = progress
+        
+        if not replace and agent.index is None:
+            raise ValueError("No index loaded. Please load data first.")
+        
+        self.documents = DocumentStore()
+        self.index = None
+        self._batch = []
+        # Batches held back until there are enough vectors to train the index
+        self._training = []
+        self._training_size = 0
+        
+        self.total_documents = 0
+        self.batches = 0
+        self.reused_embeddings = 0
+        self._started = time.perf_counter()
+    
+    def add(self, record: Dict[str, Any]) -> None:
+        """Queue one document, indexing the batch once it is full"""
+        self._batch.append(record)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+    
+    def add_many(self, records: Iterable[Dict[str, Any]]) -> None:
+        """Queue documents from an iterable"""
+        for record in records:
+            self.add(record)
+    
+    def flush(self) -> None:
+        """Embed and index the queued documents"""
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+        embeddings = self.agent.embed_documents(batch)
+        if self.agent.embedding_store is not None:
+            self.reused_embeddings += self.agent.embedding_store.last_hits
+        
+        if not self.replace:
+            self.agent.add_documents(batch, embeddings)
+        elif self.index is None and not self._training and self._starts_trained(embeddings.shape[1]):
+            self.index = create_index(embeddings.shape[1], self.agent.index_type)
+            self.documents.extend(batch)
+            self.index.add(embeddings)
+        elif self.index is None:
+            self._training.append((batch, embeddings))
+            self._training_size += len(batch)
+            if self._training_size >= Config.INGEST_TRAIN_SIZE:
+                self._train()
+        else:
+            self.documents.extend(batch)
+            self.index.add(embeddings)
+        
+        self.total_documents += len(batch)
+        self.batches += 1
+        self._report()
+    
+    def _starts_trained(self, dimension: int) -> bool:
+        """Whether the configured index type can be filled without training (flat, HNSW)"""
+        return create_index(dimension, self.agent.index_type, Config.INGEST_TRAIN_SIZE).is_trained
+    
+    def _train(self) -> None:
+        """Create the new index, train it on the held-back batches and add them"""
+        sample = np.vstack([embeddings for _, embeddings in self._training])
+        self.index = create_index(sample.shape[1], self.agent.index_type, len(sample))
+        if not self.index.is_trained:
+            self.index.train(sample)
+        self.index.add(sample)
+        for batch, _ in self._training:
+            self.documents.extend(batch)
+        self._training = []
+        self._training_size = 0
+    
+    def _report(self) -> None:
+        """Send progress stats to the callback"""
+        if self.progress is not None:
+            self.progress(self.get_stats())
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get ingestion progress"""
+        elapsed = time.perf_counter() - self._started
+        return {
+            "documents": self.total_documents,
+            "batches": self.batches,
+            "reused_embeddings": self.reused_embeddings,
+            "seconds": elapsed,
+            "documents_per_second": self.total_documents / elapsed if elapsed > 0 else 0.0
+        }
+    
+    def finish(self) -> Dict[str, Any]:
+        """Index the final partial batch and, when replacing, swap the new corpus in"""
+        self.flush()
+        if self.replace:
+            if self._training:
+                self._train()
+            if self.index is None:
+                raise ValueError("No documents to ingest")
+            self.agent.replace_corpus(self.documents, self.index)
+        return self.get_stats()
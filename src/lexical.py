@@ -0,0 +1,209 @@
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .config import Config
+from .docstore import DOCUMENT_FIELDS, GrowableArray
+
+SEARCH_MODES = ("dense", "lexical", "hybrid")
+FUSION_METHODS = ("rrf", "weighted")
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+# Posting lists at least this long keep their BM25 impacts cached until the next add
+IMPACT_CACHE_MIN_POSTINGS = 1024
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric tokens; underscores split terms such as push_up"""
+    return _TOKEN.findall(text.lower())
+
+def document_tokens(document: Dict[str, Any]) -> List[str]:
+    """Tokens of the searchable fields of a document"""
+    return tokenize(" ".join(str(document[field]) for field in DOCUMENT_FIELDS))
+
+class BM25Index:
+    """
+    Okapi BM25 over an inverted index with compact postings
+    
+    Each term maps to a sorted uint32 array of document ids and a parallel
+    uint16 array of term frequencies; document lengths are a uint32 array.
+    A query touches only the postings of its own terms.
+    """
+    
+    def __init__(self, k1: float = None, b: float = None):
+        """
+        Initialize the index
+        
+        Args:
+            k1: Term frequency saturation
+            b: Document length normalization
+        """
+        self.k1 = Config.BM25_K1 if k1 is None else k1
+        self.b = Config.BM25_B if b is None else b
+        self._terms = {}
+        self._doc_ids = []
+        self._freqs = []
+        self._lengths = GrowableArray(np.uint32)
+        self._total_length = 0
+        # Per-document length normalization and per-term impacts, dropped on add
+        self._norms = None
+        self._impacts = {}
+    
+    def __len__(self) -> int:
+        return self._lengths.size
+    
+    def add(self, documents: Iterable[Dict[str, Any]]) -> None:
+        """Index documents; ids continue from the current document count"""
+        start = len(self)
+        terms, doc_ids, freqs, lengths = [], [], [], []
+        for offset, document in enumerate(documents):
+            tokens = document_tokens(document)
+            for token, count in Counter(tokens).items():
+                term = self._terms.get(token)
+                if term is None:
+                    term = self._terms[token] = len(self._doc_ids)
+                    self._doc_ids.append(GrowableArray(np.uint32))
+                    self._freqs.append(GrowableArray(np.uint16))
+                terms.append(term)
+                doc_ids.append(start + offset)
+                freqs.append(count)
+            lengths.append(len(tokens))
+        if not lengths:
+            return
+        
+        # Group the batch by term so each posting list grows once per batch
+        terms = np.array(terms, dtype=np.int64)
+        order = np.argsort(terms, kind='stable')
+        terms = terms[order]
+        doc_ids = np.array(doc_ids, dtype=np.uint32)[order]
+        freqs = np.minimum(np.array(freqs, dtype=np.int64), np.iinfo(np.uint16).max)[order]
+        bounds = np.flatnonzero(np.r_[True, terms[1:] != terms[:-1], True]).tolist()
+        for begin, end in zip(bounds[:-1], bounds[1:]):
+            term = int(terms[begin])
+            self._doc_ids[term].extend(doc_ids[begin:end])
+            self._freqs[term].extend(freqs[begin:end])
+        
+        self._lengths.extend(lengths)
+        self._total_length += sum(lengths)
+        self._norms = None
+        self._impacts = {}
+    
+    def _length_norms(self) -> np.ndarray:
+        """k1 * (1 - b + b * length / average length) for every document"""
+        norms = self._norms
+        if norms is None or len(norms) != len(self):
+            lengths = self._lengths.array
+            average_length = max(self._total_length / len(self), 1e-9)
+            norms = self._norms = (self.k1 * (1.0 - self.b + self.b * lengths / average_length)).astype('float32')
+        return norms
+    
+    def _postings(self, term: int, n_docs: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Ids below n_docs holding a term and the term's BM25 contribution to each"""
+        cache = self._impacts
+        postings = cache.get(term)
+        if postings is None:
+            doc_ids = self._doc_ids[term].array
+            freqs = self._freqs[term].array
+            norms = self._length_norms()
+            # Postings of an add in progress may run ahead of the document lengths
+            count = min(len(doc_ids), len(freqs), int(np.searchsorted(doc_ids, len(norms))))
+            doc_ids, freqs = doc_ids[:count], freqs[:count].astype('float32')
+            idf = math.log(1.0 + (len(norms) - count + 0.5) / (count + 0.5))
+            postings = doc_ids, (idf * (self.k1 + 1.0)) * freqs / (freqs + norms[doc_ids])
+            if count >= IMPACT_CACHE_MIN_POSTINGS:
+                cache[term] = postings
+        
+        doc_ids, impacts = postings
+        if len(doc_ids) and doc_ids[-1] >= n_docs:
+            count = int(np.searchsorted(doc_ids, n_docs))
+            doc_ids, impacts = doc_ids[:count], impacts[:count]
+        return doc_ids, impacts
+    
+    def search(self, query: str, k: int, allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (scores, ids) for a query, optionally restricted to sorted allowed ids"""
+        n_docs = len(self)
+        terms = [self._terms[token] for token in set(tokenize(query)) if token in self._terms]
+        if not terms or not n_docs or k <= 0:
+            return np.empty(0, dtype='float32'), np.empty(0, dtype=np.int64)
+        
+        total = sum(self._doc_ids[term].size for term in terms)
+        if len(terms) > 1 and total > n_docs // 8:
+            # Large candidate sets: accumulate into one score per document
+            accumulator = np.zeros(n_docs, dtype='float32')
+            for term in terms:
+                doc_ids, impacts = self._postings(term, n_docs)
+                accumulator[doc_ids] += impacts  # Ids are unique within a posting list
+            return self._top_dense(accumulator, k, allowed)
+        
+        ids, scores = zip(*(self._postings(term, n_docs) for term in terms))
+        if len(terms) == 1:
+            ids, scores = ids[0].astype(np.int64), scores[0]
+        else:
+            # Sum the per-term contributions of each document
+            ids = np.concatenate(ids).astype(np.int64)
+            scores = np.concatenate(scores)
+            order = np.argsort(ids, kind='stable')
+            ids, scores = ids[order], scores[order]
+            starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+            ids, scores = ids[starts], np.add.reduceat(scores, starts)
+        if allowed is not None:
+            keep = np.isin(ids, allowed, assume_unique=True)
+            ids, scores = ids[keep], scores[keep]
+        
+        if len(ids) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            ids, scores = ids[top], scores[top]
+        order = np.lexsort((ids, -scores))
+        return scores[order], ids[order].astype(np.int64)
+    
+    @staticmethod
+    def _top_dense(accumulator: np.ndarray, k: int,
+                   allowed: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k of a per-document score array, skipping unmatched documents"""
+        ids = np.arange(len(accumulator)) if allowed is None else allowed
+        scores = accumulator if allowed is None else accumulator[allowed]
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            ids, scores = ids[top], scores[top]
+        matched = scores > 0
+        ids, scores = ids[matched], scores[matched]
+        order = np.lexsort((ids, -scores))
+        return scores[order], ids[order].astype(np.int64)
+    
+    def memory_usage(self) -> Dict[str, int]:
+        """Bytes held by the postings and document lengths"""
+        return {
+            "terms": len(self._terms),
+            "postings": sum(ids.nbytes + freqs.nbytes for ids, freqs in zip(self._doc_ids, self._freqs)),
+            "lengths": self._lengths.nbytes
+        }
+
+def reciprocal_rank_fusion(rankings: List[np.ndarray], k: int, rrf_k: int = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Fuse ranked id lists by summing 1 / (rrf_k + rank)"""
+    rrf_k = Config.RRF_K if rrf_k is None else rrf_k
+    fused = {}
+    for ranking in rankings:
+        for rank, idx in enumerate(ranking.tolist(), 1):
+            fused[idx] = fused.get(idx, 0.0) + 1.0 / (rrf_k + rank)
+    return _top(fused, k)
+
+def weighted_fusion(results: List[Tuple[np.ndarray, np.ndarray]], weights: List[float],
+                    k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Fuse (scores, ids) lists by a weighted sum of min-max normalized scores"""
+    fused = {}
+    for (scores, ids), weight in zip(results, weights):
+        if not len(ids):
+            continue
+        low, high = float(scores.min()), float(scores.max())
+        normalized = (scores - low) / (high - low) if high > low else np.ones_like(scores)
+        for idx, score in zip(ids.tolist(), normalized.tolist()):
+            fused[idx] = fused.get(idx, 0.0) + weight * score
+    return _top(fused, k)
+
+def _top(fused: Dict[int, float], k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Highest k fused scores as (scores, ids), ties broken by id"""
+    ranked = sorted(fused.items(), key=lambda item: (-item[1], item[0]))[:k]
+    return (np.array([score for _, score in ranked], dtype='float32'),
+            np.array([idx for idx, _ in ranked], dtype=np.int64))
@@ -0,0 +1,178 @@
+import bisect
+import math
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+from .config import Config
+
+# Latency buckets in seconds, from 10us (copying a few hits) to 10s (a cold model load)
+LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class _Timer:
+    """Context manager adding the elapsed time of its block to a histogram"""
+    
+    __slots__ = ("histogram", "started")
+    
+    def __init__(self, histogram: "Histogram"):
+        self.histogram = histogram
+    
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+class _NullTimer:
+    """Timer used while metrics are disabled"""
+    
+    __slots__ = ()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is one bisect and three additions under a lock"""
+    
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS, enabled: bool = True):
+        self.buckets = tuple(sorted(buckets))
+        self.enabled = enabled
+        # One count per bucket plus the +Inf overflow; not cumulative until rendered
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float) -> None:
+        """Record one value"""
+        if not self.enabled:
+            return
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+    
+    def time(self):
+        """Time a block: with histogram.time(): ..."""
+        return _Timer(self) if self.enabled else _NULL_TIMER
+    
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        """Consistent (per-bucket counts, sum, count)"""
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+    
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (inf past the last bucket)"""
+        counts, _, count = self.snapshot()
+        if not count:
+            return 0.0
+        rank, seen = q * count, 0
+        for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return math.inf
+
+def _label_key(labels: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class MetricsRegistry:
+    """Process-wide histograms and gauges rendered in the Prometheus text format"""
+    
+    def __init__(self, enabled: bool = None):
+        """
+        Initialize the registry
+        
+        Args:
+            enabled: Record observations (defaults to Config.METRICS_ENABLED);
+                disabled histograms turn timers into no-ops
+        """
+        self.enabled = Config.METRICS_ENABLED if enabled is None else enabled
+        self._histograms: Dict[str, Dict[Tuple, Histogram]] = {}
+        self._gauges: Dict[str, Dict[Tuple, float]] = {}
+        self._help: Dict[str, str] = {}
+        self._lock = threading.Lock()
+    
+    def histogram(self, name: str, help: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+                  **labels) -> Histogram:
+        """Get or create the histogram for a name and label set; resolve once, observe often"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            self._help.setdefault(name, help)
+            if key not in series:
+                series[key] = Histogram(buckets, self.enabled)
+            return series[key]
+    
+    def set_gauge(self, name: str, value: float, help: str, **labels) -> None:
+        """Set a gauge to its current value"""
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+            self._help.setdefault(name, help)
+    
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            histograms = {name: dict(series) for name, series in self._histograms.items()}
+            gauges = {name: dict(series) for name, series in self._gauges.items()}
+        
+        lines = []
+        for name in sorted(histograms):
+            lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in sorted(histograms[name].items()):
+                counts, total, count = histogram.snapshot()
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets + (math.inf,), counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_format_labels(labels, (('le', _format_value(bound)),))} "
+                                 f"{cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        for name in sorted(gauges):
+            lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in sorted(gauges[name].items()):
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Count, mean and bucketed p50/p99 in milliseconds of every histogram series"""
+        with self._lock:
+            series = [(name, labels, histogram) for name, by_labels in self._histograms.items()
+                      for labels, histogram in by_labels.items()]
+        stats = {}
+        for name, labels, histogram in sorted(series, key=lambda item: (item[0], item[1])):
+            _, total, count = histogram.snapshot()
+            p50, p99 = histogram.quantile(0.5), histogram.quantile(0.99)
+            stats[f"{name}{_format_labels(labels)}"] = {
+                "count": count,
+                "mean_ms": total / count * 1000.0 if count else 0.0,
+                # None past the last bucket; JSON has no infinity
+                "p50_ms": p50 * 1000.0 if p50 != math.inf else None,
+                "p99_ms": p99 * 1000.0 if p99 != math.inf else None
+            }
+        return stats
+
+# Shared by every agent and the API in this process, like a Prometheus default registry
+METRICS = MetricsRegistry()
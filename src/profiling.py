@@ -0,0 +1,202 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from .config import Config
+
+# Python 3.12+ allows one active profiler per process, so one request is profiled at a time
+_ACTIVE = threading.Lock()
+
+class ProfileSession:
+    """cProfile of one request, collected from whichever threads run its work"""
+    
+    def __init__(self, endpoint: str, metadata: Dict[str, Any], sampled: bool):
+        self.endpoint = endpoint
+        self.metadata = metadata
+        self.sampled = sampled
+        self.profile = cProfile.Profile()
+        self._enabled = threading.Lock()
+        self.calls = 0
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+    
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn in the current thread with the profiler enabled, unprofiled if another thread has it"""
+        if not self._enabled.acquire(blocking=False):
+            return fn(*args, **kwargs)
+        try:
+            self.calls += 1
+            self.profile.enable()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.profile.disable()
+        finally:
+            self._enabled.release()
+    
+    def top_functions(self, limit: int = 25) -> List[Dict[str, Any]]:
+        """Functions with the most cumulative time"""
+        stats = pstats.Stats(self.profile, stream=io.StringIO())
+        rows = []
+        for (filename, line, name), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+            rows.append({"function": f"{filename}:{line}({name})", "ncalls": ncalls,
+                         "tottime_ms": tottime * 1000.0, "cumtime_ms": cumtime * 1000.0})
+        rows.sort(key=lambda row: row["cumtime_ms"], reverse=True)
+        return rows[:limit]
+
+def run_profiled(session: Optional[ProfileSession], fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run fn, under the session's profiler when the request is being profiled"""
+    if session is None:
+        return fn(*args, **kwargs)
+    return session.call(fn, *args, **kwargs)
+
+class RequestProfiler:
+    """
+    Profiles a sample of API requests, or keeps the profiles of slow ones
+    
+    A PROFILE_SAMPLE_RATE fraction of requests to PROFILE_ENDPOINTS is
+    profiled and saved. With PROFILE_SLOW_MS set, every such request is
+    profiled and saved only if it took at least that long. Only one request
+    per process is profiled at a time; requests arriving meanwhile run
+    unprofiled and are counted as skipped. Each profile is a .prof file
+    (open with pstats or snakeviz) beside a .json file holding the request
+    metadata and the top functions.
+    """
+    
+    def __init__(self, sample_rate: float = None, slow_ms: float = None, directory: str = None,
+                 endpoints: str = None, max_files: int = None):
+        """
+        Initialize the profiler
+        
+        Args:
+            sample_rate: Fraction of requests profiled and always saved
+            slow_ms: Save the profile of any request at least this slow (0 = off)
+            directory: Where profiles are written
+            endpoints: Comma-separated endpoints that may be profiled
+            max_files: Profiles kept on disk; the oldest are deleted first
+        """
+        self.sample_rate = Config.PROFILE_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.slow_ms = Config.PROFILE_SLOW_MS if slow_ms is None else slow_ms
+        self.directory = directory or Config.PROFILE_DIR
+        self.endpoints = {endpoint.strip() for endpoint in
+                          (Config.PROFILE_ENDPOINTS if endpoints is None else endpoints).split(",")
+                          if endpoint.strip()}
+        self.max_files = Config.PROFILE_MAX_FILES if max_files is None else max_files
+        self._lock = threading.Lock()
+        
+        self.profiled = 0
+        self.skipped = 0
+        self.saved = 0
+        self.last_saved = None
+    
+    @property
+    def enabled(self) -> bool:
+        return bool(self.endpoints) and (self.sample_rate > 0 or self.slow_ms > 0)
+    
+    def start(self, endpoint: str, metadata: Dict[str, Any] = None) -> Optional[ProfileSession]:
+        """Begin profiling a request if it is sampled or slow requests are being caught"""
+        if not self.enabled or endpoint not in self.endpoints:
+            return None
+        sampled = random.random() < self.sample_rate
+        if not sampled and self.slow_ms <= 0:
+            return None
+        if not _ACTIVE.acquire(blocking=False):
+            self.skipped += 1
+            return None
+        self.profiled += 1
+        return ProfileSession(endpoint, metadata or {}, sampled)
+    
+    def finish(self, session: ProfileSession, status: int) -> Optional[str]:
+        """Save the session if it was sampled or slow; returns the .prof path"""
+        try:
+            return self._save(session, status)
+        finally:
+            _ACTIVE.release()
+    
+    def _save(self, session: ProfileSession, status: int) -> Optional[str]:
+        elapsed_ms = (time.perf_counter() - session.started) * 1000.0
+        slow = self.slow_ms > 0 and elapsed_ms >= self.slow_ms
+        if not session.calls or not (session.sampled or slow):
+            return None
+        
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.localtime(session.started_at))
+        with self._lock:
+            self.saved += 1
+            name = (f"{stamp}_{re.sub(r'[^A-Za-z0-9]+', '_', session.endpoint).strip('_')}"
+                    f"_{elapsed_ms:.0f}ms_{os.getpid()}_{self.saved}")
+        path = os.path.join(self.directory, name)
+        session.profile.dump_stats(path + ".prof")
+        with open(path + ".json", 'w') as f:
+            json.dump({
+                "endpoint": session.endpoint,
+                "status": status,
+                "elapsed_ms": elapsed_ms,
+                "reason": "sampled" if session.sampled else "slow",
+                "started_at": session.started_at,
+                "pid": os.getpid(),
+                "request": session.metadata,
+                "top_functions": session.top_functions()
+            }, f, indent=2, default=str)
+        self.last_saved = path + ".prof"
+        self._prune()
+        return path + ".prof"
+    
+    def _prune(self) -> None:
+        """Delete the oldest profiles beyond max_files"""
+        if self.max_files <= 0:
+            return
+        profiles = sorted((entry for entry in os.scandir(self.directory) if entry.name.endswith(".prof")),
+                          key=lambda entry: entry.stat().st_mtime)
+        for entry in profiles[:max(0, len(profiles) - self.max_files)]:
+            for path in (entry.path, entry.path[:-len(".prof")] + ".json"):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+    
+    @contextmanager
+    def profile(self, endpoint: str, metadata: Dict[str, Any] = None) -> Iterator[Optional[ProfileSession]]:
+        """
+        Profile the request handled inside the block, yielding None when it is not profiled
+        
+        Work in the block must go through session.call (or run_profiled) to
+        be profiled, including work handed to executor threads. The status
+        saved is taken from an escaping exception's status_code, else 200.
+        """
+        session = self.start(endpoint, metadata)
+        if session is None:
+            yield None
+            return
+        status = 200
+        try:
+            yield session
+        except Exception as e:
+            status = getattr(e, "status_code", 500)
+            raise
+        finally:
+            try:
+                self.finish(session, status)
+            except Exception as e:
+                print(f"Warning: could not save request profile: {e}")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get profiler settings and counters"""
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "slow_ms": self.slow_ms,
+            "endpoints": sorted(self.endpoints),
+            "directory": self.directory,
+            "profiled": self.profiled,
+            "skipped": self.skipped,
+            "saved": self.saved,
+            "last_saved": self.last_saved
+        }
@@ -1,17 +1,67 @@
 import json
 import faiss
 import numpy as np
-from typing import List, Dict, Any, Optional
-from sentence_transformers import SentenceTransformer
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Iterator, Callable
 import pickle
 import os
+import threading
+import time
+import uuid
+import weakref
+from contextlib import nullcontext
+from .cache import LRUCache
+from .docstore import DocumentStore, is_document_file
+from .embedding_store import EmbeddingStore
+from .encoder import encoder_id, load_encoder
+from .filters import allowed_ids, filtered_search, normalize_filters
+from .lexical import (BM25Index, FUSION_METHODS, SEARCH_MODES, reciprocal_rank_fusion,
+                      weighted_fusion)
+from .index_factory import build_index, configure_index, keeps_rerank_vectors
+from .metrics import METRICS
+from .rwlock import FileLock, ReadWriteLock
+from .wal import WriteAheadLog
 from .config import Config
 
+# Query hot-path stages timed into fitness_rag_stage_seconds, once per batch
+STAGES = ("encode", "normalize", "search", "hydrate", "format")
+
+class RebuildInProgressError(RuntimeError):
+    """Raised when an index rebuild is requested while another one is running"""
+
+class IndexGeneration:
+    """
+    One version of the searchable state: FAISS index, documents and BM25 index
+    
+    Rebuilds and reloads publish a new generation with a single reference
+    swap. Searches keep the generation they started on, so an old generation
+    is freed once its last in-flight query finishes.
+    """
+    
+    def __init__(self, version: int, index: Optional[faiss.Index] = None,
+                 documents: Optional[DocumentStore] = None, lexical: Optional[BM25Index] = None,
+                 mapped: bool = False):
+        """
+        Initialize the generation
+        
+        Args:
+            version: Generation number, increasing with every swap
+            index: FAISS index over the documents
+            documents: Documents, one per index vector
+            lexical: BM25 index over the documents, or None to build on first use
+            mapped: Whether index is a read-only view of the index file
+        """
+        self.version = version
+        self.index = index
+        self.documents = documents if documents is not None else DocumentStore()
+        self.lexical = lexical
+        self.mapped = mapped
+
 class FitnessRAGAgent:
     """Fitness RAG Agent using FAISS vector database for semantic search"""
     
     def __init__(self, model_name: str = None, index_file: str = None, 
-                 metadata_file: str = None):
+                 metadata_file: str = None, index_type: str = None, wal_file: str = None,
+                 mmap: bool = None, embedding_store_file: str = None, encoder_backend: str = None):
         """
         Initialize the RAG agent with FAISS vector database
         
@@ -19,147 +69,768 @@ class FitnessRAGAgent:
             model_name: Sentence transformer model name
             index_file: Path to FAISS index file
             metadata_file: Path to metadata pickle file
+            index_type: FAISS index type (flat, ivf_flat, hnsw, ivf_pq)
+            wal_file: Path to the write-ahead log (defaults to <index_file>.wal)
+            mmap: Memory-map the index in load_index() and after save_index()
+                instead of holding it in RAM; defaults to INDEX_MMAP, or on when
+                the index keeps full-precision re-rank vectors
+            embedding_store_file: Path to the persistent document embedding
+                cache (defaults to <index_file>.emb)
+            encoder_backend: Encoder runtime (torch, torch_int8, onnx)
         """
         self.model_name = model_name or Config.MODEL_NAME
         self.index_file = index_file or Config.INDEX_FILE
         self.metadata_file = metadata_file or Config.METADATA_FILE
+        self.index_type = index_type or Config.INDEX_TYPE
+        self.wal_file = wal_file or Config.WAL_FILE or f"{self.index_file}.wal"
+        if mmap is None:
+            # Re-rank vectors are as large as a float32 index; only their candidate rows are read
+            mmap = Config.INDEX_MMAP or keeps_rerank_vectors(self.index_type)
+        self.mmap = mmap
+        self.encoder_backend = (encoder_backend or Config.ENCODER_BACKEND).lower()
+        self.embedding_store_file = (embedding_store_file or Config.EMBEDDING_STORE_FILE
+                                     or f"{self.index_file}.emb")
         
         print(f"Initializing agent with model: {self.model_name}")
-        self.model = SentenceTransformer(self.model_name)
-        self.index = None
-        self.documents = []
-        self.dimension = None
+        # The encoder (and torch) is loaded on first use; see the model property
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._warm_up_thread = None
+        # Index, documents and BM25 index are swapped together as one generation;
+        # retired generations are tracked until in-flight queries release them
+        self.generation = IndexGeneration(0)
+        self._retired = []
+        self._rebuild_thread = None
+        # Documents and embeddings added while a rebuild builds, replayed onto its generation
+        self._rebuild_adds = None
+        self.rebuild_status = {"state": "idle"}
+        
+        # Query caches; result keys carry the index version so index changes invalidate them
+        self.index_version = 0
+        self.embedding_cache = LRUCache(Config.EMBEDDING_CACHE_SIZE, Config.CACHE_TTL_SECONDS)
+        self.result_cache = LRUCache(Config.RESULT_CACHE_SIZE, Config.CACHE_TTL_SECONDS)
+        # Document vectors persisted across rebuilds; only new or changed texts are encoded
+        self.embedding_store = (EmbeddingStore(self.embedding_store_file,
+                                               encoder_id(self.model_name, self.encoder_backend))
+                                if Config.EMBEDDING_STORE_ENABLED else None)
         
-    def create_document_text(self, item: Dict[str, Any]) -> str:
+        # Documents added since the last snapshot are logged to the WAL; the
+        # snapshot id ties the log to the snapshot it extends (None = unsaved)
+        self.wal = WriteAheadLog(self.wal_file) if Config.WAL_ENABLED else None
+        self.snapshot_id = None
+        self._replayed = 0
+        # Writers serialize on _write_lock and hold the write side of _rw_lock only
+        # while mutating the live index; searches share its read side
+        self._write_lock = threading.RLock()
+        self._rw_lock = ReadWriteLock()
+        # Set when worker processes share the snapshot files (see workers.SharedIndex)
+        self.snapshot_lock: Optional[FileLock] = None
+        # Stage latency histograms, resolved once so timing a stage costs two clock reads
+        self.stage_timers = {stage: METRICS.histogram("fitness_rag_stage_seconds",
+                                                      "Query hot-path stage latency per batch", stage=stage)
+                             for stage in STAGES}
+    
+    @property
+    def index(self) -> Optional[faiss.Index]:
+        return self.generation.index
+    
+    @property
+    def documents(self) -> DocumentStore:
+        return self.generation.documents
+    
+    @property
+    def lexical(self) -> Optional[BM25Index]:
+        return self.generation.lexical
+    
+    @property
+    def index_mapped(self) -> bool:
+        return self.generation.mapped
+    
+    @property
+    def dimension(self) -> Optional[int]:
+        return self.index.d if self.index is not None else None
+    
+    @property
+    def model(self):
+        """The sentence transformer, imported and loaded on first access"""
+        model = self._model
+        if model is None:
+            with self._model_lock:
+                if self._model is None:
+                    print(f"Loading model: {self.model_name} ({self.encoder_backend})")
+                    self._model = load_encoder(self.model_name, self.encoder_backend)
+                model = self._model
+        return model
+    
+    @property
+    def model_loaded(self) -> bool:
+        """Whether the encoder has been loaded"""
+        return self._model is not None
+    
+    def warm_up(self, background: bool = False) -> Optional[threading.Thread]:
+        """Load the encoder and run one encode, optionally in a daemon thread"""
+        if not background:
+            self.model.encode(["warm up"], convert_to_numpy=True)
+            return None
+        if self._warm_up_thread is None:
+            self._warm_up_thread = threading.Thread(target=self.warm_up, name="model-warm-up", daemon=True)
+            self._warm_up_thread.start()
+        return self._warm_up_thread
+    
+    @staticmethod
+    def create_document_text(item: Dict[str, Any]) -> str:
         """Create searchable text from JSON item"""
         return f"Exercise: {item['exercise']} | Context: {item['context']} | Condition: {item['condition']} | Advice: {item['advice']}"
     
-    def load_data(self, json_data: List[Dict[str, Any]]) -> None:
-        """Load JSON data and create embeddings"""
-        print(f"Loading {len(json_data)} documents...")
-        
-        # Store original documents
-        self.documents = json_data
+    def embed_documents(self, documents: List[Dict[str, Any]]) -> np.ndarray:
+        """Create normalized float32 embeddings for documents, reusing stored vectors"""
+        texts = [self.create_document_text(item) for item in documents]
+        if self.embedding_store is None:
+            return self._encode_texts(texts)
         
-        # Create text representations for embedding
-        texts = [self.create_document_text(item) for item in json_data]
-        
-        # Generate embeddings
-        print("Generating embeddings...")
-        embeddings = self.model.encode(texts, convert_to_numpy=True)
+        keys = [self.embedding_store.key(text) for text in texts]
+        stored, found = self.embedding_store.lookup(keys)
+        if found.all():
+            return stored
         
-        # Get embedding dimension
-        self.dimension = embeddings.shape[1]
+        missing = np.flatnonzero(~found)
+        encoded = self._encode_texts([texts[i] for i in missing])
+        self.embedding_store.put([keys[i] for i in missing], encoded)
         
-        # Create FAISS index
-        self.index = faiss.IndexFlatIP(self.dimension)
+        if not found.any():
+            return encoded
+        embeddings = np.empty((len(texts), encoded.shape[1]), dtype='float32')
+        embeddings[found] = stored
+        embeddings[missing] = encoded
+        return embeddings
+    
+    def _encode_texts(self, texts: List[str]) -> np.ndarray:
+        """Encode texts into normalized float32 embeddings"""
+        embeddings = self.model.encode(texts, convert_to_numpy=True).astype('float32')
         
         # Normalize embeddings for cosine similarity
         faiss.normalize_L2(embeddings)
+        return embeddings
+    
+    def load_data(self, json_data: List[Dict[str, Any]], embeddings: np.ndarray = None) -> None:
+        """Load JSON data and create embeddings, unless precomputed embeddings are given"""
+        print(f"Loading {len(json_data)} documents...")
         
-        # Add embeddings to index
-        self.index.add(embeddings.astype('float32'))
+        # Generate embeddings
+        if embeddings is None:
+            print("Generating embeddings...")
+            embeddings = self.embed_documents(json_data)
+            if self.embedding_store is not None:
+                reused = self.embedding_store.last_hits
+                print(f"Reused {reused} of {len(json_data)} stored embeddings "
+                      f"({reused / len(json_data) if json_data else 0.0:.0%} hit ratio)")
         
+        # Create, train and fill the FAISS index
+        self.replace_corpus(json_data, build_index(embeddings, self.index_type), embeddings)
         print(f"Created FAISS index with {self.index.ntotal} documents")
+    
+    def replace_corpus(self, documents: List[Dict[str, Any]], index: faiss.Index,
+                       embeddings: np.ndarray = None) -> IndexGeneration:
+        """
+        Validate a new document list and matching index and swap them in as a new generation
         
-    def save_index(self) -> None:
-        """Save FAISS index and metadata to disk"""
-        if self.index is not None:
+        Queries already running finish on the previous generation. The new
+        corpus is not durable until save_index().
+        """
+        if not isinstance(documents, DocumentStore):
+            documents = DocumentStore(documents)
+        self._validate(index, documents, embeddings)
+        lexical = BM25Index()
+        lexical.add(documents)
+        with self._write_lock:
+            generation = IndexGeneration(self.generation.version + 1, index, documents, lexical)
+            if self._rebuild_adds is not None and threading.current_thread() is self._rebuild_thread:
+                # Adds since the rebuild started went to the old generation; carry them over
+                for added, added_embeddings in self._rebuild_adds:
+                    documents.extend(added)
+                    index.add(added_embeddings)
+                    lexical.add(added)
+                self._rebuild_adds = None
+            self._publish(generation)
+            self.snapshot_id = None
+        return generation
+    
+    @staticmethod
+    def _validate(index: faiss.Index, documents: DocumentStore, embeddings: np.ndarray = None) -> None:
+        """Check a rebuilt index before it is published; raises ValueError"""
+        if index.ntotal != len(documents):
+            raise ValueError(f"Index has {index.ntotal} vectors but there are {len(documents)} documents")
+        if not index.is_trained:
+            raise ValueError("Index is not trained")
+        if embeddings is not None and len(embeddings):
+            # Probe with a few stored vectors: every probe must find a valid neighbour
+            probe = np.unique(np.linspace(0, len(embeddings) - 1, min(8, len(embeddings))).astype(np.int64))
+            scores, indices = index.search(np.ascontiguousarray(embeddings[probe], dtype='float32'), 1)
+            if (indices < 0).any() or (indices >= index.ntotal).any() or not np.isfinite(scores).all():
+                raise ValueError("Rebuilt index failed validation: probe vectors found no valid neighbours")
+    
+    def _publish(self, generation: IndexGeneration) -> IndexGeneration:
+        """Make a generation current; callers hold the write lock"""
+        previous = self.generation
+        self.generation = generation
+        if previous.index is not None:
+            self._retired = [ref for ref in self._retired if ref() is not None] + [weakref.ref(previous)]
+        self._bump_index_version()
+        return generation
+    
+    def rebuild(self, json_data: List[Dict[str, Any]], save: bool = True,
+                background: bool = False) -> Optional[threading.Thread]:
+        """
+        Build a new generation from json_data off to the side and swap it in
+        
+        The current generation keeps serving queries during the build, and
+        documents added meanwhile are replayed onto the new one before it is
+        swapped in. With background=True the build runs in a thread that is
+        returned; rebuild_status tracks its progress. Raises
+        RebuildInProgressError if another rebuild is running.
+        """
+        with self._write_lock:
+            if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+                raise RebuildInProgressError("An index rebuild is already running")
+            self.rebuild_status = {"state": "building", "documents": len(json_data),
+                                   "from_version": self.generation.version, "started_at": time.time()}
+            self._rebuild_thread = threading.current_thread()
+            self._rebuild_adds = []
+            if background:
+                self._rebuild_thread = threading.Thread(target=self._run_rebuild, args=(json_data, save),
+                                                        name="index-rebuild", daemon=True)
+                self._rebuild_thread.start()
+                return self._rebuild_thread
+        try:
+            self._run_rebuild(json_data, save, raise_errors=True)
+        finally:
+            self._rebuild_thread = None
+        return None
+    
+    def _run_rebuild(self, json_data: List[Dict[str, Any]], save: bool, raise_errors: bool = False) -> None:
+        """Build, validate, swap in and optionally save a new generation, recording the outcome"""
+        try:
+            with self._snapshot_lock():
+                self.load_data(json_data)
+                if save:
+                    self.save_index()
+        except Exception as e:
+            self.rebuild_status = dict(self.rebuild_status, state="failed", error=str(e), finished_at=time.time())
+            if raise_errors:
+                raise
+            print(f"Index rebuild failed: {e}")
+            return
+        finally:
+            with self._write_lock:
+                self._rebuild_adds = None
+        self.rebuild_status = dict(self.rebuild_status, state="swapped", version=self.generation.version,
+                                   finished_at=time.time())
+    
+    def ingest(self, records: Iterable[Dict[str, Any]], batch_size: int = None,
+               replace: bool = True, progress: Callable[[Dict[str, Any]], None] = None) -> Dict[str, Any]:
+        """
+        Stream documents into the index in fixed-size batches
+        
+        Args:
+            records: Iterable of documents, consumed incrementally
+            batch_size: Documents embedded and indexed per batch
+            replace: Build a new corpus (swapped in when done) instead of appending
+            progress: Callback receiving progress stats after each batch
+        """
+        from .ingest import Ingestor
+        
+        ingestor = Ingestor(self, batch_size=batch_size, replace=replace, progress=progress)
+        ingestor.add_many(records)
+        return ingestor.finish()
+    
+    def save_index(self, metadata_format: str = None) -> None:
+        """Save FAISS index and metadata to disk as a new snapshot and reset the WAL"""
+        with self._snapshot_lock(), self._write_lock:
+            if self.index is None:
+                return
+            
             # Ensure directory exists
             os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
             os.makedirs(os.path.dirname(self.metadata_file), exist_ok=True)
             
-            faiss.write_index(self.index, self.index_file)
-            with open(self.metadata_file, 'wb') as f:
-                pickle.dump(self.documents, f)
+            # Write both files next to the live ones, then swap them in
+            snapshot_id = uuid.uuid4().bytes
+            faiss.write_index(self.index, self.index_file + ".tmp")
+            if (metadata_format or Config.METADATA_FORMAT) == "offsets":
+                self.documents.save(self.metadata_file + ".tmp", snapshot_id)
+            else:
+                with open(self.metadata_file + ".tmp", 'wb') as f:
+                    pickle.dump({"snapshot_id": snapshot_id, "documents": list(self.documents)}, f)
+            os.replace(self.index_file + ".tmp", self.index_file)
+            os.replace(self.metadata_file + ".tmp", self.metadata_file)
+            
+            generation = self.generation
+            if self.mmap and not generation.mapped:
+                # Serve the file just written instead of keeping the in-RAM index it came from
+                index = configure_index(faiss.read_index(self.index_file, faiss.IO_FLAG_MMAP_IFC))
+                with self._rw_lock.write():
+                    generation.index, generation.mapped = index, True
+            
+            self.snapshot_id = snapshot_id
+            self._replayed = 0
+            if self.wal is not None:
+                self.wal.reset(snapshot_id)
             print(f"Saved index to {self.index_file} and metadata to {self.metadata_file}")
-        
+            
+            # Vectors of replaced documents are only dead weight once the snapshot no longer holds them
+            if self.embedding_store is not None and len(self.embedding_store) > len(self.documents):
+                dropped = self.embedding_store.compact(self.embedding_store.key(self.create_document_text(item))
+                                                       for item in self.documents)
+                print(f"Dropped {dropped} stale embeddings from {self.embedding_store.path}")
+    
     def load_index(self) -> bool:
-        """Load FAISS index and metadata from disk"""
+        """Load FAISS index and metadata from disk and replay the WAL tail"""
         try:
-            if os.path.exists(self.index_file) and os.path.exists(self.metadata_file):
-                self.index = faiss.read_index(self.index_file)
-                with open(self.metadata_file, 'rb') as f:
-                    self.documents = pickle.load(f)
-                print(f"Loaded index with {self.index.ntotal} documents")
-                return True
-            return False
+            with self._snapshot_lock(exclusive=False):
+                if not (os.path.exists(self.index_file) and os.path.exists(self.metadata_file)):
+                    return False
+                # Mapped indexes share page cache across processes and load in O(1)
+                flags = faiss.IO_FLAG_MMAP_IFC if self.mmap else 0
+                index = configure_index(faiss.read_index(self.index_file, flags))
+                
+                if is_document_file(self.metadata_file):
+                    # Columnar documents are decoded lazily from the mapped file
+                    documents = DocumentStore.open(self.metadata_file)
+                    snapshot_id = documents.snapshot_id
+                else:
+                    with open(self.metadata_file, 'rb') as f:
+                        metadata = pickle.load(f)
+                    
+                    # Snapshots written before the WAL existed are a bare document list
+                    if isinstance(metadata, dict):
+                        snapshot_id, documents = metadata["snapshot_id"], metadata["documents"]
+                    else:
+                        snapshot_id, documents = None, metadata
+                    documents = DocumentStore(documents)
+            
+            with self._write_lock:
+                # Replay into the new generation before anyone can query it
+                generation = IndexGeneration(self.generation.version + 1, index, documents, mapped=self.mmap)
+                self.snapshot_id = snapshot_id
+                replayed = self._replayed = self._replay_wal(generation)
+                self._publish(generation)
+            
+            print(f"Loaded index with {self.index.ntotal} documents")
+            if replayed:
+                print(f"Replayed {replayed} documents from {self.wal_file}")
+            return True
         except Exception as e:
             print(f"Error loading index: {e}")
             return False
     
-    def search(self, query: str, k: int = 3) -> List[Dict[str, Any]]:
-        """Search for relevant documents using vector similarity"""
-        if self.index is None:
+    def _replay_wal(self, generation: IndexGeneration) -> int:
+        """Apply logged documents that are not yet part of the loaded snapshot"""
+        if self.wal is None or self.snapshot_id is None:
+            return 0
+        
+        log_snapshot_id, records = self.wal.replay()
+        if log_snapshot_id != self.snapshot_id:
+            return 0
+        
+        documents, vectors = [], []
+        for seq, document, vector in records:
+            if seq < len(generation.documents) + len(documents):
+                continue
+            if seq > len(generation.documents) + len(documents):
+                print(f"Warning: gap in {self.wal_file} at record {seq}; stopping replay")
+                break
+            documents.append(document)
+            vectors.append(vector)
+        
+        if documents:
+            self._ensure_writable_index(generation)
+            generation.documents.extend(documents)
+            generation.index.add(np.vstack(vectors))
+        return len(documents)
+    
+    def _snapshot_lock(self, exclusive: bool = True):
+        """Cross-process lock on the snapshot files, a no-op unless worker processes share them"""
+        if self.snapshot_lock is None:
+            return nullcontext()
+        return self.snapshot_lock.exclusive() if exclusive else self.snapshot_lock.shared()
+    
+    def _ensure_writable_index(self, generation: IndexGeneration) -> None:
+        """Copy a memory-mapped index into RAM before it is modified"""
+        if generation.mapped:
+            generation.index = configure_index(faiss.deserialize_index(faiss.serialize_index(generation.index)))
+            generation.mapped = False
+    
+    def compact(self, min_records: int = 1) -> bool:
+        """Fold the WAL into a new snapshot once it holds at least min_records documents"""
+        if self.wal is None or self.index is None:
+            return False
+        # Same order as save_index: the snapshot lock before the write lock
+        with self._snapshot_lock(), self._write_lock:
+            if self.snapshot_id is None or self._pending_wal_records() < max(1, min_records):
+                return False
+            self.save_index()
+            return True
+    
+    def _pending_wal_records(self) -> int:
+        """Documents in the WAL that are not part of the snapshot on disk"""
+        if self.wal.snapshot_id == self.snapshot_id:
+            return self.wal.records
+        return self._replayed
+    
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Normalize query text for cache lookups"""
+        return " ".join(query.lower().split())
+    
+    def _bump_index_version(self) -> None:
+        """Mark the index as changed and drop cached results"""
+        self.index_version += 1
+        self.result_cache.clear()
+    
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Encode normalized queries, reusing cached embeddings"""
+        keys = [self.normalize_query(query) for query in queries]
+        embeddings = [self.embedding_cache.get(key) for key in keys]
+        
+        missing = [key for key, embedding in zip(keys, embeddings) if embedding is None]
+        if missing:
+            missing = list(dict.fromkeys(missing))
+            # Tokenization and the forward pass
+            with self.stage_timers["encode"].time():
+                encoded = self.model.encode(missing, convert_to_numpy=True).astype('float32')
+            with self.stage_timers["normalize"].time():
+                faiss.normalize_L2(encoded)
+            fresh = dict(zip(missing, encoded))
+            for key, embedding in fresh.items():
+                self.embedding_cache.put(key, embedding)
+            embeddings = [fresh[key] if embedding is None else embedding
+                          for key, embedding in zip(keys, embeddings)]
+        
+        return np.vstack(embeddings).astype('float32')
+    
+    def search(self, query: str, k: int = 3, filters: Optional[Dict[str, Any]] = None,
+               mode: str = None, fusion: str = None) -> List[Dict[str, Any]]:
+        """Search for relevant documents using vector similarity, BM25 or both"""
+        return self.search_batch([query], k, filters, mode, fusion)[0]
+    
+    def search_batch(self, queries: List[str], k: int = 3, filters: Optional[Dict[str, Any]] = None,
+                     mode: str = None, fusion: str = None,
+                     embeddings: np.ndarray = None) -> List[List[Dict[str, Any]]]:
+        """
+        Search for several queries with one batched encode and one index search
+        
+        filters maps categorical fields (exercise, context, condition) to a value
+        or list of values; only matching documents are searched. mode is dense,
+        lexical (BM25) or hybrid, which fuses both rankings by fusion (rrf or
+        weighted). embeddings, one normalized row per query, skips encoding.
+        The hit dicts are shared with the result cache and must not be modified.
+        """
+        # Read the version before the generation: a swap publishes the generation first
+        version = self.index_version
+        generation = self.generation
+        if generation.index is None:
             raise ValueError("No index loaded. Please load data first.")
+        mode, fusion = self._search_options(mode, fusion)
+        if not queries:
+            return []
         
-        # Generate query embedding
-        query_embedding = self.model.encode([query], convert_to_numpy=True)
-        faiss.normalize_L2(query_embedding)
+        # Serve repeated queries from the result cache
+        filter_key = normalize_filters(filters)
+        search_key = (mode, fusion if mode == "hybrid" else None)
+        keys = [(self.normalize_query(query), k, filter_key, search_key, version) for query in queries]
+        batch_results = [self.result_cache.get(key) for key in keys]
+        pending = [i for i, results in enumerate(batch_results) if results is None]
         
-        # Search
-        scores, indices = self.index.search(query_embedding.astype('float32'), k)
+        if pending:
+            # Encode and build the BM25 index before taking the read lock
+            pending_queries = [queries[i] for i in pending]
+            query_embeddings = None
+            if mode != "lexical":
+                query_embeddings = (self.encode_queries(pending_queries) if embeddings is None
+                                    else embeddings[pending])
+            if mode != "dense":
+                self.lexical_index(generation)
+            
+            # Index ids and documents stay consistent while no add runs
+            with self._rw_lock.read():
+                with self.stage_timers["search"].time():
+                    scores, indices = self._rank(generation, pending_queries, k, filter_key, mode, fusion,
+                                                 query_embeddings)
+                # Prepare results: gather every valid hit of the batch at once
+                hydrate_started = time.perf_counter()
+                valid = indices != -1
+                hits = generation.documents.get_many(indices[valid])
+            hit_ids = indices[valid].tolist()
+            hit_scores = scores[valid].tolist()
+            hit_ranks = (np.nonzero(valid)[1] + 1).tolist()
+            for hit, idx, score, rank in zip(hits, hit_ids, hit_scores, hit_ranks):
+                hit['id'] = idx
+                hit['similarity_score'] = score
+                hit['rank'] = rank
+            
+            bounds = np.cumsum(valid.sum(axis=1)).tolist()
+            for i, start, end in zip(pending, [0] + bounds[:-1], bounds):
+                results = hits[start:end]
+                self.result_cache.put(keys[i], results)
+                batch_results[i] = results
+            self.stage_timers["hydrate"].observe(time.perf_counter() - hydrate_started)
+        
+        return batch_results
+    
+    def search_stream(self, query: str, k: int = 3, filters: Optional[Dict[str, Any]] = None,
+                      mode: str = None, fusion: str = None, chunk_size: int = None) -> Iterator[Dict[str, Any]]:
+        """
+        Rank a query now and return an iterator hydrating its hits lazily
+        
+        Encoding and the index search run before this returns, so errors are
+        raised here. The documents are then built chunk_size at a time as the
+        iterator is consumed, the top hit on its own first, each chunk under
+        the read lock so adds can run between chunks. Streamed results
+        are not added to the result cache, so a large k is never held in full.
+        """
+        version = self.index_version
+        generation = self.generation
+        if generation.index is None:
+            raise ValueError("No index loaded. Please load data first.")
+        mode, fusion = self._search_options(mode, fusion)
         
-        # Prepare results
-        results = []
-        for i, (score, idx) in enumerate(zip(scores[0], indices[0])):
-            if idx != -1:  # Valid result
-                result = self.documents[idx].copy()
-                result['similarity_score'] = float(score)
-                result['rank'] = i + 1
-                results.append(result)
+        filter_key = normalize_filters(filters)
+        key = (self.normalize_query(query), k, filter_key, (mode, fusion if mode == "hybrid" else None), version)
+        cached = self.result_cache.get(key)
+        if cached is not None:
+            return iter(cached)
         
-        return results
+        query_embeddings = self.encode_queries([query]) if mode != "lexical" else None
+        if mode != "dense":
+            self.lexical_index(generation)
+        with self._rw_lock.read():
+            with self.stage_timers["search"].time():
+                scores, indices = self._rank(generation, [query], k, filter_key, mode, fusion, query_embeddings)
+        valid = indices[0] != -1
+        return self._hydrate_stream(generation, scores[0][valid], indices[0][valid],
+                                    chunk_size or Config.STREAM_CHUNK_SIZE)
     
-    def query(self, query: str, k: int = 3) -> str:
-        """Query the agent and get a formatted response"""
-        results = self.search(query, k)
+    def _hydrate_stream(self, generation: IndexGeneration, scores: np.ndarray, ids: np.ndarray,
+                        chunk_size: int) -> Iterator[Dict[str, Any]]:
+        """Yield ranked hits, building their documents one chunk at a time"""
+        hydrate_seconds = 0.0
+        start = 0
+        try:
+            while start < len(ids):
+                end = min(len(ids), start + (1 if start == 0 else chunk_size))
+                hydrate_started = time.perf_counter()
+                # Adds grow the store's vocabularies and columns, so each chunk is read under the lock
+                with self._rw_lock.read():
+                    hits = generation.documents.get_many(ids[start:end])
+                for rank, (hit, idx, score) in enumerate(zip(hits, ids[start:end].tolist(),
+                                                             scores[start:end].tolist()), start + 1):
+                    hit['id'] = idx
+                    hit['similarity_score'] = score
+                    hit['rank'] = rank
+                hydrate_seconds += time.perf_counter() - hydrate_started
+                yield from hits
+                start = end
+        finally:
+            self.stage_timers["hydrate"].observe(hydrate_seconds)
+    
+    @staticmethod
+    def _search_options(mode: str = None, fusion: str = None) -> Tuple[str, str]:
+        """Validated (mode, fusion), defaulting to the configured ones"""
+        mode = (mode or Config.SEARCH_MODE).lower()
+        fusion = (fusion or Config.FUSION_METHOD).lower()
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}. Choose from {', '.join(SEARCH_MODES)}")
+        if fusion not in FUSION_METHODS:
+            raise ValueError(f"Unknown fusion method: {fusion}. Choose from {', '.join(FUSION_METHODS)}")
+        return mode, fusion
+    
+    def _rank(self, generation: IndexGeneration, queries: List[str], k: int, filter_key: Tuple, mode: str,
+              fusion: str, query_embeddings: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k (scores, ids) matrices of a generation for the queries, padded with -1 ids
+        
+        Dense and hybrid modes need query_embeddings, lexical and hybrid modes
+        the generation's BM25 index; callers hold the read lock.
+        """
+        # Restrict to the filtered documents when filters are given
+        allowed = allowed_ids(generation.documents, filter_key) if filter_key else None
+        if mode == "lexical":
+            lexical = generation.lexical
+            return self._pad_rankings([lexical.search(query, k, allowed) for query in queries], k)
+        
+        # Hybrid fusion looks deeper into both rankings
+        depth = k if mode == "dense" else max(k, Config.HYBRID_CANDIDATES)
+        if allowed is not None:
+            scores, indices = filtered_search(generation.index, query_embeddings, depth, allowed)
+        else:
+            scores, indices = generation.index.search(query_embeddings, depth)
+        if mode == "dense":
+            return scores, indices
         
+        lexical = generation.lexical
+        fused = []
+        for query, row_scores, row_indices in zip(queries, scores, indices):
+            valid = row_indices != -1
+            dense = (row_scores[valid], row_indices[valid])
+            sparse = lexical.search(query, depth, allowed)
+            if fusion == "rrf":
+                fused.append(reciprocal_rank_fusion([dense[1], sparse[1]], k))
+            else:
+                fused.append(weighted_fusion([dense, sparse], [Config.HYBRID_ALPHA, 1.0 - Config.HYBRID_ALPHA], k))
+        return self._pad_rankings(fused, k)
+    
+    @staticmethod
+    def _pad_rankings(rankings: List[Tuple[np.ndarray, np.ndarray]], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Stack per-query (scores, ids) rankings into faiss-style result matrices"""
+        scores = np.zeros((len(rankings), k), dtype='float32')
+        indices = np.full((len(rankings), k), -1, dtype=np.int64)
+        for row, (row_scores, row_indices) in enumerate(rankings):
+            scores[row, :len(row_scores)] = row_scores
+            indices[row, :len(row_indices)] = row_indices
+        return scores, indices
+    
+    def lexical_index(self, generation: IndexGeneration = None) -> BM25Index:
+        """BM25 index over all documents of a generation (default: current), built or caught up on first use"""
+        generation = generation or self.generation
+        lexical = generation.lexical
+        if lexical is not None and len(lexical) == len(generation.documents):
+            return lexical
+        with self._write_lock:
+            if generation.lexical is None:
+                # Adds wait on the write lock, so the documents cannot grow meanwhile
+                lexical = BM25Index()
+                lexical.add(generation.documents)
+                generation.lexical = lexical
+            elif len(generation.lexical) < len(generation.documents):
+                with self._rw_lock.write():
+                    generation.lexical.add(generation.documents[len(generation.lexical):])
+            return generation.lexical
+    
+    def format_response(self, query: str, results: List[Dict[str, Any]]) -> str:
+        """Render search results as a formatted text response"""
         if not results:
             return "I couldn't find any relevant fitness advice for your query."
         
-        response = f"Based on your query: '{query}'\n\nHere's what I found:\n\n"
-        
-        for i, result in enumerate(results, 1):
-            response += f"{i}. **{result['exercise'].title()} for {result['condition'].replace('_', ' ').title()}**\n"
-            response += f"   Context: {result['context'].title()}\n"
-            response += f"   Advice: {result['advice']}\n"
-            response += f"   Relevance: {result['similarity_score']:.3f}\n\n"
+        with self.stage_timers["format"].time():
+            response = self.format_header(query)
+            
+            for i, result in enumerate(results, 1):
+                response += self.format_result(i, result)
         
         return response
     
+    @staticmethod
+    def format_header(query: str) -> str:
+        """Opening of a text response"""
+        return f"Based on your query: '{query}'\n\nHere's what I found:\n\n"
+    
+    @staticmethod
+    def format_result(position: int, result: Dict[str, Any]) -> str:
+        """Text response section of one result"""
+        return (f"{position}. **{result['exercise'].title()} for {result['condition'].replace('_', ' ').title()}**\n"
+                f"   Context: {result['context'].title()}\n"
+                f"   Advice: {result['advice']}\n"
+                f"   Relevance: {result['similarity_score']:.3f}\n\n")
+    
+    def search_and_render(self, query: str, k: int = 3) -> Tuple[List[Dict[str, Any]], str]:
+        """Search once and return both the structured results and the formatted response"""
+        results = self.search(query, k)
+        return results, self.format_response(query, results)
+    
+    def query(self, query: str, k: int = 3) -> str:
+        """Query the agent and get a formatted response"""
+        return self.format_response(query, self.search(query, k))
+    
     def add_document(self, document: Dict[str, Any]) -> None:
-        """Add a new document to the index"""
-        # Add to documents list
-        self.documents.append(document)
-        
-        # Create embedding
-        text = self.create_document_text(document)
-        embedding = self.model.encode([text], convert_to_numpy=True)
-        faiss.normalize_L2(embedding)
+        """Add a new document to the index, logging it to the WAL when enabled"""
+        self.add_documents([document])
+        print(f"Added new document. Index now has {self.index.ntotal} documents")
+    
+    def add_documents(self, documents: List[Dict[str, Any]], embeddings: np.ndarray = None) -> None:
+        """Add a batch of documents to the index, logging them to the WAL when enabled"""
+        if not documents:
+            return
+        if embeddings is None:
+            embeddings = self.embed_documents(documents)
         
-        # Add to index
-        self.index.add(embedding.astype('float32'))
+        ticket = None
+        with self._write_lock:
+            # Log first so the documents survive a crash once they are visible
+            if self.wal is not None and self.snapshot_id is not None:
+                if self.wal.snapshot_id != self.snapshot_id:
+                    self.wal.open(self.snapshot_id)
+                for offset, (document, embedding) in enumerate(zip(documents, embeddings)):
+                    ticket = self.wal.append(len(self.documents) + offset, document, embedding)
+            
+            # Add to documents list and index while no search is reading them
+            generation = self.generation
+            self._ensure_writable_index(generation)
+            with self._rw_lock.write():
+                generation.documents.extend(documents)
+                generation.index.add(embeddings)
+                if generation.lexical is not None:
+                    generation.lexical.add(documents)
+                self._bump_index_version()
+            if self._rebuild_adds is not None:
+                self._rebuild_adds.append((documents, embeddings))
         
-        print(f"Added new document. Index now has {self.index.ntotal} documents")
+        if ticket is not None:
+            self.wal.wait_durable(ticket)
+    
+    def is_durable(self) -> bool:
+        """Whether added documents are persisted without a full save_index()"""
+        return self.wal is not None and self.snapshot_id is not None
+    
+    def get_wal_stats(self) -> Dict[str, Any]:
+        """Get write-ahead log statistics"""
+        if self.wal is None:
+            return {"enabled": False}
+        stats = dict(self.wal.get_stats(), enabled=True, durable=self.is_durable())
+        if self.snapshot_id is not None:
+            stats["pending_records"] = self._pending_wal_records()
+        return stats
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get query cache statistics"""
+        return {
+            "index_version": self.index_version,
+            "generation": self.generation.version,
+            "embeddings": self.embedding_cache.get_stats(),
+            "results": self.result_cache.get_stats(),
+            "document_embeddings": self.embedding_store.get_stats() if self.embedding_store else None
+        }
     
     def get_stats(self) -> Dict[str, Any]:
         """Get database statistics"""
-        if not self.documents:
+        generation = self.generation
+        documents = generation.documents
+        if not documents:
             return {"total_documents": 0}
         
-        exercises = set(doc['exercise'] for doc in self.documents)
-        contexts = set(doc['context'] for doc in self.documents)
-        conditions = set(doc['condition'] for doc in self.documents)
+        # Every vocabulary entry is in use since documents are never removed
+        exercises = documents.vocabulary('exercise')
+        contexts = documents.vocabulary('context')
+        conditions = documents.vocabulary('condition')
         
         return {
-            "total_documents": len(self.documents),
+            "total_documents": len(documents),
             "unique_exercises": len(exercises),
             "unique_contexts": len(contexts),
             "unique_conditions": len(conditions),
-            "exercises": list(exercises),
-            "contexts": list(contexts),
-            "conditions": list(conditions)
+            "exercises": exercises,
+            "contexts": contexts,
+            "conditions": conditions,
+            "lexical_index": generation.lexical.memory_usage() if generation.lexical is not None else None,
+            "generation": self.get_generation_stats(),
+            "locks": self._rw_lock.get_stats()
+        }
+    
+    def get_generation_stats(self) -> Dict[str, Any]:
+        """Current generation, rebuild progress and retired generations still held by queries"""
+        return {
+            "version": self.generation.version,
+            "retired_alive": sum(1 for ref in self._retired if ref() is not None),
+            "rebuild": dict(self.rebuild_status)
         }
 
 # Test function
@@ -0,0 +1,143 @@
+import fcntl
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+class ReadWriteLock:
+    """
+    Many concurrent readers or one writer
+    
+    Waiting writers block new readers, so a steady stream of searches cannot
+    starve an add. Not reentrant: a thread holding the read side must not
+    acquire either side again.
+    """
+    
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+        
+        self.reads = 0
+        self.writes = 0
+        self.write_wait_seconds = 0.0
+    
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        """Hold the lock shared with other readers"""
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+            self.reads += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+    
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        """Hold the lock exclusively, once running readers have finished"""
+        started = time.perf_counter()
+        with self._cond:
+            self._waiting_writers += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = True
+            self.writes += 1
+            self.write_wait_seconds += time.perf_counter() - started
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get current holders and lifetime counters"""
+        with self._cond:
+            return {
+                "active_readers": self._readers,
+                "writer_active": self._writer,
+                "waiting_writers": self._waiting_writers,
+                "reads": self.reads,
+                "writes": self.writes,
+                "write_wait_seconds": self.write_wait_seconds
+            }
+
+class FileLock:
+    """
+    Shared or exclusive lock on a file, held across processes with flock
+    
+    The exclusive side is reentrant within a thread, and a thread holding it
+    may also take the shared side; other threads of the process queue on
+    the exclusive side like other processes do.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._owner = None
+        self._depth = 0
+        self._fd = None
+        
+        self.exclusive_acquisitions = 0
+        self.exclusive_wait_seconds = 0.0
+    
+    def _open(self) -> int:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        return os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+    
+    @contextmanager
+    def exclusive(self) -> Iterator[None]:
+        """Hold the lock alone across every process"""
+        started = time.perf_counter()
+        with self._lock:
+            if not self._depth:
+                fd = self._open()
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                except BaseException:
+                    os.close(fd)
+                    raise
+                self._fd, self._owner = fd, threading.get_ident()
+                self.exclusive_acquisitions += 1
+                self.exclusive_wait_seconds += time.perf_counter() - started
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if not self._depth:
+                    # Closing the descriptor releases the flock
+                    fd, self._fd, self._owner = self._fd, None, None
+                    os.close(fd)
+    
+    @contextmanager
+    def shared(self) -> Iterator[None]:
+        """Hold the lock shared with other readers, in this process or others"""
+        if self._owner == threading.get_ident():
+            yield
+            return
+        fd = self._open()
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            yield
+        finally:
+            os.close(fd)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get lifetime counters of the exclusive side"""
+        return {
+            "path": self.path,
+            "exclusive_acquisitions": self.exclusive_acquisitions,
+            "exclusive_wait_seconds": self.exclusive_wait_seconds
+        }
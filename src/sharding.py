@@ -0,0 +1,427 @@
+import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client, Listener
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .config import Config
+from .filters import normalize_filters
+from .index_factory import create_index
+from .lexical import SEARCH_MODES
+from .rag_agent import FitnessRAGAgent
+
+# hash spreads documents evenly; exercise keeps each exercise on one shard so
+# exercise-filtered queries only visit the shards that own it
+SHARD_PARTITIONS = ("hash", "exercise")
+# Seconds to wait for a local shard process to start listening
+SHARD_START_TIMEOUT = 120
+
+class ShardError(RuntimeError):
+    """Raised when a shard is unreachable or fails a request"""
+
+def shard_path(path: str, shard_id: int) -> str:
+    """File path of one shard's copy of an index or metadata file"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard{shard_id}{ext}"
+
+def shard_for(document: Dict[str, Any], num_shards: int, partition: str = None) -> int:
+    """Shard owning a document; stable across processes and restarts"""
+    partition = (partition or Config.SHARD_PARTITION).lower()
+    if partition == "exercise":
+        key = str(document["exercise"])
+    else:
+        key = FitnessRAGAgent.create_document_text(document)
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % num_shards
+
+def parse_addresses(addresses: str) -> List[Tuple[str, int]]:
+    """Parse "host:port,host:port" into listener addresses"""
+    parsed = []
+    for address in addresses.split(","):
+        if address.strip():
+            host, port = address.strip().rsplit(":", 1)
+            parsed.append((host, int(port)))
+    return parsed
+
+class ShardServer:
+    """
+    Serves one shard's agent over multiprocessing.connection
+    
+    Each request is a (method, args) tuple answered with ("ok", result) or
+    ("error", exception type, message). Every client connection gets its own
+    thread, so searches on one connection do not wait for writes on another.
+    """
+    
+    def __init__(self, agent: FitnessRAGAgent, address: Tuple[str, int], authkey: bytes):
+        """
+        Initialize the server
+        
+        Args:
+            agent: Agent holding this shard's documents and index
+            address: (host, port) to listen on; port 0 picks a free port
+            authkey: Shared secret clients must present
+        """
+        self.agent = agent
+        self.authkey = authkey
+        self.listener = Listener(address, authkey=authkey)
+        self.address = self.listener.address
+        self._closed = False
+    
+    def serve_forever(self) -> None:
+        """Accept connections until a shutdown request arrives"""
+        while not self._closed:
+            try:
+                conn = self.listener.accept()
+            except (OSError, EOFError, multiprocessing.AuthenticationError):
+                continue
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+        self.listener.close()
+    
+    def _serve(self, conn) -> None:
+        """Answer requests on one connection until the client disconnects"""
+        with conn:
+            while True:
+                try:
+                    method, args = conn.recv()
+                except (EOFError, OSError):
+                    return
+                handler = getattr(self, f"rpc_{method}", None)
+                try:
+                    if handler is None:
+                        raise ValueError(f"Unknown shard method: {method}")
+                    conn.send(("ok", handler(*args)))
+                except Exception as e:
+                    conn.send(("error", type(e).__name__, str(e)))
+                if method == "shutdown":
+                    # Wake the accept() call so serve_forever sees the flag
+                    Client(self.address, authkey=self.authkey).close()
+                    return
+    
+    def rpc_ping(self) -> Dict[str, Any]:
+        """Process id and document count, for health checks"""
+        return {"pid": os.getpid(), "documents": len(self.agent.documents)}
+    
+    def rpc_search(self, queries: List[str], k: int, filters: Optional[Dict[str, Any]], mode: str,
+                   fusion: str, embeddings: Optional[np.ndarray]) -> List[List[Dict[str, Any]]]:
+        """Top-k hits of this shard for each query"""
+        if self.agent.index is None:
+            return [[] for _ in queries]
+        return self.agent.search_batch(queries, k, filters, mode, fusion, embeddings)
+    
+    def rpc_add_documents(self, documents: List[Dict[str, Any]], embeddings: np.ndarray) -> int:
+        """Add documents with their embeddings; returns the shard size"""
+        if self.agent.index is None:
+            self.rpc_load_data(documents, embeddings)
+        else:
+            self.agent.add_documents(documents, embeddings)
+            if not self.agent.is_durable():
+                self.agent.save_index()
+        return len(self.agent.documents)
+    
+    def rpc_load_data(self, documents: List[Dict[str, Any]], embeddings: np.ndarray) -> int:
+        """Replace this shard's corpus and snapshot it; returns the shard size"""
+        if documents:
+            self.agent.load_data(documents, embeddings)
+        else:
+            # IVF and PQ indexes cannot train on nothing; an empty shard starts flat
+            self.agent.replace_corpus([], create_index(embeddings.shape[1], "flat"))
+        self.agent.save_index()
+        return len(self.agent.documents)
+    
+    def rpc_documents(self) -> List[Dict[str, Any]]:
+        """Every document of this shard, for rebuilds"""
+        return list(self.agent.documents)
+    
+    def rpc_save_index(self) -> None:
+        """Snapshot this shard"""
+        self.agent.save_index()
+    
+    def rpc_load_index(self) -> bool:
+        """Reload this shard from disk"""
+        return self.agent.load_index()
+    
+    def rpc_get_stats(self) -> Dict[str, Any]:
+        """Statistics of this shard"""
+        return self.agent.get_stats()
+    
+    def rpc_shutdown(self) -> None:
+        """Stop serving once the reply is sent"""
+        self._closed = True
+
+def run_shard(index_file: str, metadata_file: str, address: Tuple[str, int], authkey: bytes,
+              model_name: str = None, index_type: str = None, ready=None) -> None:
+    """Load a shard's agent and serve it; sends the bound address through ready when listening"""
+    agent = FitnessRAGAgent(model_name=model_name, index_file=index_file, metadata_file=metadata_file,
+                            index_type=index_type)
+    agent.load_index()
+    server = ShardServer(agent, address, authkey)
+    if ready is not None:
+        ready.send(server.address)
+        ready.close()
+    server.serve_forever()
+
+class ShardClient:
+    """Calls one shard server, keeping a connection per concurrent caller"""
+    
+    def __init__(self, address: Tuple[str, int], authkey: bytes):
+        self.address = tuple(address)
+        self.authkey = authkey
+        self._idle = []
+        self._lock = threading.Lock()
+    
+    def call(self, method: str, *args) -> Any:
+        """Run a method on the shard; ValueErrors are re-raised as ValueError"""
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        try:
+            if conn is None:
+                conn = Client(self.address, authkey=self.authkey)
+            conn.send((method, args))
+            status, *payload = conn.recv()
+        except (EOFError, OSError, multiprocessing.AuthenticationError) as e:
+            if conn is not None:
+                conn.close()
+            raise ShardError(f"Shard at {self.address[0]}:{self.address[1]} is unreachable: {e}")
+        with self._lock:
+            self._idle.append(conn)
+        
+        if status == "ok":
+            return payload[0]
+        error, message = payload
+        if error == "ValueError":
+            raise ValueError(message)
+        raise ShardError(f"Shard at {self.address[0]}:{self.address[1]} failed {method}: {error}: {message}")
+    
+    def close(self) -> None:
+        """Close idle connections"""
+        with self._lock:
+            for conn in self._idle:
+                conn.close()
+            self._idle = []
+
+class ShardedAgent:
+    """
+    Coordinator for a corpus partitioned across shard worker processes
+    
+    Queries are encoded once here and fanned out to the shards in parallel;
+    each shard returns its own top-k and the coordinator merges them by score.
+    Dense scores are inner products and compare exactly across shards. BM25
+    statistics are per shard, so lexical and hybrid scores are approximate
+    when shards hold differently distributed documents.
+    """
+    
+    def __init__(self, num_shards: int = None, partition: str = None, addresses: str = None,
+                 model_name: str = None, index_file: str = None, metadata_file: str = None,
+                 index_type: str = None):
+        """
+        Initialize the coordinator and start or connect to its shards
+        
+        Args:
+            num_shards: Local shard processes to start (defaults to Config.SHARDS)
+            partition: hash or exercise (defaults to Config.SHARD_PARTITION)
+            addresses: "host:port,..." of running shard servers to use instead
+                of local processes (defaults to Config.SHARD_ADDRESSES)
+            model_name: Sentence transformer model name
+            index_file: Base index path; shard i uses <root>.shard<i><ext>
+            metadata_file: Base metadata path, suffixed the same way
+            index_type: FAISS index type of every shard
+        """
+        self.partition = (partition or Config.SHARD_PARTITION).lower()
+        if self.partition not in SHARD_PARTITIONS:
+            raise ValueError(f"Unknown shard partition: {self.partition}. Choose from {', '.join(SHARD_PARTITIONS)}")
+        
+        # Encodes queries and documents for every shard, reusing the embedding store
+        self.embedder = FitnessRAGAgent(model_name=model_name, index_file=index_file,
+                                        metadata_file=metadata_file, index_type=index_type)
+        self._processes = []
+        remote = parse_addresses(Config.SHARD_ADDRESSES if addresses is None else addresses)
+        if remote:
+            self.authkey = Config.SHARD_AUTHKEY.encode("utf-8")
+            endpoints = remote
+        else:
+            self.authkey = Config.SHARD_AUTHKEY.encode("utf-8") or os.urandom(16)
+            endpoints = self._start_local(num_shards or Config.SHARDS)
+        
+        self.shards = [ShardClient(address, self.authkey) for address in endpoints]
+        self.num_shards = len(self.shards)
+        self._pool = ThreadPoolExecutor(max_workers=self.num_shards, thread_name_prefix="shard-rpc")
+    
+    def _start_local(self, num_shards: int) -> List[Tuple[str, int]]:
+        """Start one shard process per shard and wait until each is listening"""
+        if num_shards < 1:
+            raise ValueError("Sharded mode needs at least one shard")
+        context = multiprocessing.get_context("spawn")
+        pending = []
+        for shard_id in range(num_shards):
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(
+                target=run_shard, name=f"shard-{shard_id}", daemon=True,
+                args=(shard_path(self.embedder.index_file, shard_id),
+                      shard_path(self.embedder.metadata_file, shard_id), ("127.0.0.1", 0), self.authkey,
+                      self.embedder.model_name, self.embedder.index_type, sender)
+            )
+            process.start()
+            sender.close()
+            self._processes.append(process)
+            pending.append(receiver)
+        
+        addresses = []
+        for shard_id, receiver in enumerate(pending):
+            if not receiver.poll(SHARD_START_TIMEOUT):
+                self.close()
+                raise ShardError(f"Shard {shard_id} did not start within {SHARD_START_TIMEOUT}s")
+            addresses.append(receiver.recv())
+            receiver.close()
+        return addresses
+    
+    def _call(self, method: str, shard_ids: List[int], *args_per_shard) -> List[Any]:
+        """Call a method on several shards in parallel; args_per_shard[j] are the args of shard_ids[j]"""
+        futures = [self._pool.submit(self.shards[shard_id].call, method, *args)
+                   for shard_id, args in zip(shard_ids, args_per_shard)]
+        return [future.result() for future in futures]
+    
+    def _broadcast(self, method: str, *args) -> List[Any]:
+        """Call a method with the same args on every shard"""
+        return self._call(method, list(range(self.num_shards)), *([args] * self.num_shards))
+    
+    def route(self, filters: Optional[Dict[str, Any]] = None) -> List[int]:
+        """Shards that can hold matches for the filters"""
+        if self.partition == "exercise":
+            for field, values in normalize_filters(filters):
+                if field == "exercise":
+                    return sorted({shard_for({"exercise": value}, self.num_shards, "exercise")
+                                   for value in values})
+        return list(range(self.num_shards))
+    
+    def _partition(self, documents: List[Dict[str, Any]]) -> List[np.ndarray]:
+        """Positions of the documents owned by each shard"""
+        owners = np.array([shard_for(document, self.num_shards, self.partition) for document in documents],
+                          dtype=np.int64)
+        return [np.flatnonzero(owners == shard_id) for shard_id in range(self.num_shards)]
+    
+    def search(self, query: str, k: int = 3, filters: Optional[Dict[str, Any]] = None,
+               mode: str = None, fusion: str = None) -> List[Dict[str, Any]]:
+        """Search every relevant shard and merge the top-k"""
+        return self.search_batch([query], k, filters, mode, fusion)[0]
+    
+    def search_batch(self, queries: List[str], k: int = 3, filters: Optional[Dict[str, Any]] = None,
+                     mode: str = None, fusion: str = None) -> List[List[Dict[str, Any]]]:
+        """Scatter a batch of queries to the shards and gather the merged top-k of each"""
+        mode = (mode or Config.SEARCH_MODE).lower()
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}. Choose from {', '.join(SEARCH_MODES)}")
+        if not queries:
+            return []
+        
+        embeddings = None if mode == "lexical" else self.embedder.encode_queries(queries)
+        shard_ids = self.route(filters)
+        args = (list(queries), k, filters, mode, fusion, embeddings)
+        responses = self._call("search", shard_ids, *([args] * len(shard_ids)))
+        
+        # Hit ids are positions within a shard, so each hit also names its shard
+        for shard_id, response in zip(shard_ids, responses):
+            for hits in response:
+                for hit in hits:
+                    hit['shard'] = shard_id
+        merged = []
+        for i in range(len(queries)):
+            hits = [hit for response in responses for hit in response[i]]
+            hits.sort(key=lambda hit: -hit['similarity_score'])
+            hits = hits[:k]
+            for rank, hit in enumerate(hits, 1):
+                hit['rank'] = rank
+            merged.append(hits)
+        return merged
+    
+    def search_stream(self, query: str, k: int = 3, filters: Optional[Dict[str, Any]] = None,
+                      mode: str = None, fusion: str = None, chunk_size: int = None) -> Iterator[Dict[str, Any]]:
+        """Search the shards and iterate over the merged hits; shards return whole documents"""
+        return iter(self.search(query, k, filters, mode, fusion))
+    
+    def format_response(self, query: str, results: List[Dict[str, Any]]) -> str:
+        """Render search results as a formatted text response"""
+        return self.embedder.format_response(query, results)
+    
+    def query(self, query: str, k: int = 3) -> str:
+        """Query the shards and get a formatted response"""
+        return self.format_response(query, self.search(query, k))
+    
+    def load_data(self, json_data: List[Dict[str, Any]]) -> None:
+        """Embed a corpus once and rebuild every shard from its partition (shards save as they go)"""
+        embeddings = self.embedder.embed_documents(json_data)
+        groups = self._partition(json_data)
+        self._call("load_data", list(range(self.num_shards)),
+                   *[([json_data[i] for i in group], embeddings[group]) for group in groups])
+        print(f"Loaded {len(json_data)} documents into {self.num_shards} shards: "
+              f"{', '.join(str(len(group)) for group in groups)}")
+    
+    def add_document(self, document: Dict[str, Any]) -> None:
+        """Add a document to the shard that owns it"""
+        self.add_documents([document])
+    
+    def add_documents(self, documents: List[Dict[str, Any]]) -> None:
+        """Embed documents once and add each to its owning shard"""
+        if not documents:
+            return
+        embeddings = self.embedder.embed_documents(documents)
+        groups = [(shard_id, group) for shard_id, group in enumerate(self._partition(documents)) if len(group)]
+        self._call("add_documents", [shard_id for shard_id, _ in groups],
+                   *[([documents[i] for i in group], embeddings[group]) for _, group in groups])
+    
+    def rebuild_shard(self, shard_id: int) -> int:
+        """Rebuild one shard's index from its own documents, e.g. after changing index settings"""
+        documents = self.shards[shard_id].call("documents")
+        if not documents:
+            return 0
+        embeddings = self.embedder.embed_documents(documents)
+        return self.shards[shard_id].call("load_data", documents, embeddings)
+    
+    def save_index(self) -> None:
+        """Snapshot every shard"""
+        self._broadcast("save_index")
+    
+    def load_index(self) -> bool:
+        """Reload every shard from disk; True if any shard holds documents"""
+        return any(self._broadcast("load_index"))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Corpus statistics merged across shards"""
+        shard_stats = self._broadcast("get_stats")
+        stats = {"total_documents": sum(s["total_documents"] for s in shard_stats)}
+        for field in ("exercises", "contexts", "conditions"):
+            values = sorted({value for s in shard_stats for value in s.get(field, [])})
+            stats[f"unique_{field}"] = len(values)
+            stats[field] = values
+        stats["shards"] = [{"shard": shard_id, "address": f"{client.address[0]}:{client.address[1]}",
+                            "total_documents": s["total_documents"]}
+                           for shard_id, (client, s) in enumerate(zip(self.shards, shard_stats))]
+        stats["partition"] = self.partition
+        return stats
+    
+    def close(self) -> None:
+        """Stop local shard processes and close connections"""
+        if self._processes:
+            for client in getattr(self, "shards", []):
+                try:
+                    client.call("shutdown")
+                except ShardError:
+                    pass
+            for process in self._processes:
+                process.join(timeout=10)
+                if process.is_alive():
+                    process.terminate()
+            self._processes = []
+        for client in getattr(self, "shards", []):
+            client.close()
+        if hasattr(self, "_pool"):
+            self._pool.shutdown(wait=False)
+    
+    def __enter__(self) -> "ShardedAgent":
+        return self
+    
+    def __exit__(self, *exc) -> None:
+        self.close()
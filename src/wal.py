@@ -0,0 +1,248 @@
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .config import Config
+
+# File header: magic + id of the snapshot the log extends
+WAL_MAGIC = b"FRAGWAL1"
+WAL_HEADER = struct.Struct("<8s16s")
+# Record header: body length + crc32 of the body
+RECORD_HEADER = struct.Struct("<II")
+# Body prefix: length of the JSON part; the float32 vector follows it
+JSON_LENGTH = struct.Struct("<I")
+
+SYNC_MODES = ("always", "group", "none")
+
+class WriteAheadLog:
+    """Append-only log of documents and vectors added since the last snapshot"""
+    
+    def __init__(self, path: str, sync_mode: str = None, group_commit_ms: float = None):
+        """
+        Initialize the write-ahead log
+        
+        Args:
+            path: Log file path
+            sync_mode: "always" fsyncs every append, "group" shares one fsync
+                between appends arriving within group_commit_ms, "none" leaves
+                flushing to the OS
+            group_commit_ms: Group commit window
+        """
+        self.path = path
+        self.sync_mode = (sync_mode or Config.WAL_SYNC_MODE).lower()
+        self.group_commit_ms = Config.WAL_GROUP_COMMIT_MS if group_commit_ms is None else group_commit_ms
+        if self.sync_mode not in SYNC_MODES:
+            raise ValueError(f"Unknown WAL sync mode: {self.sync_mode}")
+        
+        self.snapshot_id = None
+        self.records = 0
+        self._file = None
+        self._cond = threading.Condition()
+        self._written = 0
+        self._synced = 0
+        self._flusher = None
+        self._closing = False
+    
+    @staticmethod
+    def _encode(seq: int, document: Dict[str, Any], vector: np.ndarray) -> bytes:
+        """Serialize one record"""
+        payload = json.dumps({"seq": seq, "document": document}).encode("utf-8")
+        body = JSON_LENGTH.pack(len(payload)) + payload + np.asarray(vector, dtype='float32').tobytes()
+        return RECORD_HEADER.pack(len(body), zlib.crc32(body)) + body
+    
+    def _read(self) -> Tuple[Optional[bytes], List[Tuple[int, Dict[str, Any], np.ndarray]], int]:
+        """Read the snapshot id, the valid records and the end offset of the last valid record"""
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None, [], 0
+        
+        if len(data) < WAL_HEADER.size:
+            return None, [], 0
+        magic, snapshot_id = WAL_HEADER.unpack_from(data, 0)
+        if magic != WAL_MAGIC:
+            return None, [], 0
+        
+        records = []
+        offset = WAL_HEADER.size
+        while offset + RECORD_HEADER.size <= len(data):
+            length, crc = RECORD_HEADER.unpack_from(data, offset)
+            body = data[offset + RECORD_HEADER.size:offset + RECORD_HEADER.size + length]
+            if len(body) < length or zlib.crc32(body) != crc:
+                break  # Torn or corrupt tail from an interrupted write
+            
+            (json_length,) = JSON_LENGTH.unpack_from(body, 0)
+            payload = json.loads(body[JSON_LENGTH.size:JSON_LENGTH.size + json_length])
+            vector = np.frombuffer(body[JSON_LENGTH.size + json_length:], dtype='float32')
+            records.append((payload["seq"], payload["document"], vector))
+            offset += RECORD_HEADER.size + length
+        
+        return snapshot_id, records, offset
+    
+    def replay(self) -> Tuple[Optional[bytes], List[Tuple[int, Dict[str, Any], np.ndarray]]]:
+        """Read the snapshot id and the intact records without modifying the file"""
+        snapshot_id, records, _ = self._read()
+        return snapshot_id, records
+    
+    def open(self, snapshot_id: bytes) -> None:
+        """Open the log for appending on top of a snapshot, discarding a stale or torn log"""
+        with self._cond:
+            self._close_file()
+            on_disk_id, records, end = self._read()
+            
+            if on_disk_id == snapshot_id:
+                self._file = open(self.path, 'r+b')
+                self._file.truncate(end)
+                self._file.seek(end)
+                self.records = len(records)
+            else:
+                self._rewrite(snapshot_id)
+            self.snapshot_id = snapshot_id
+    
+    def reset(self, snapshot_id: bytes) -> None:
+        """Start an empty log on top of a new snapshot"""
+        with self._cond:
+            self._close_file()
+            self._rewrite(snapshot_id)
+            self.snapshot_id = snapshot_id
+    
+    def _rewrite(self, snapshot_id: bytes) -> None:
+        """Atomically replace the log with an empty one"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(WAL_HEADER.pack(WAL_MAGIC, snapshot_id))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        
+        self._file = open(self.path, 'ab')
+        self.records = 0
+    
+    def append(self, seq: int, document: Dict[str, Any], vector: np.ndarray) -> int:
+        """
+        Write one record and return its commit ticket
+        
+        In group mode the record is only buffered; pass the ticket to
+        wait_durable() once any caller-side locks are released.
+        """
+        data = self._encode(seq, document, vector)
+        with self._cond:
+            if self._file is None:
+                raise RuntimeError("Write-ahead log is not open")
+            self._file.write(data)
+            self._file.flush()
+            self.records += 1
+            self._written += 1
+            
+            if self.sync_mode == "always":
+                os.fsync(self._file.fileno())
+                self._synced = self._written
+            elif self.sync_mode == "none":
+                self._synced = self._written
+            elif self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="wal-flusher", daemon=True)
+                self._flusher.start()
+            return self._written
+    
+    def wait_durable(self, ticket: int) -> None:
+        """Block until the record with this ticket has been fsync'd"""
+        with self._cond:
+            while self._synced < ticket and not self._closing:
+                self._cond.wait()
+    
+    def _flush_loop(self) -> None:
+        """Group commit: fsync pending appends once per window"""
+        while True:
+            time.sleep(self.group_commit_ms / 1000.0)
+            with self._cond:
+                if self._closing:
+                    return
+                if self._synced < self._written and self._file is not None:
+                    os.fsync(self._file.fileno())
+                    self._synced = self._written
+                    self._cond.notify_all()
+    
+    def _close_file(self) -> None:
+        """Sync and close the current file handle"""
+        if self._file is not None:
+            self._file.flush()
+            if self.sync_mode != "none":
+                os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+        self._synced = self._written
+        self._cond.notify_all()
+    
+    def size_bytes(self) -> int:
+        """Current size of the log file"""
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get log statistics"""
+        return {
+            "path": self.path,
+            "sync_mode": self.sync_mode,
+            "pending_records": self.records,
+            "size_bytes": self.size_bytes()
+        }
+    
+    def close(self) -> None:
+        """Sync and close the log"""
+        with self._cond:
+            self._close_file()
+            self._closing = True
+            self._cond.notify_all()
+
+class Compactor:
+    """Background thread folding the write-ahead log into a fresh snapshot"""
+    
+    def __init__(self, agent, interval_seconds: float = None, min_records: int = None):
+        """
+        Initialize the compactor
+        
+        Args:
+            agent: FitnessRAGAgent to compact
+            interval_seconds: How often the log is checked
+            min_records: Pending records needed to trigger a compaction
+        """
+        self.agent = agent
+        self.interval_seconds = interval_seconds or Config.COMPACTION_INTERVAL_SECONDS
+        self.min_records = Config.COMPACTION_MIN_RECORDS if min_records is None else min_records
+        self.compactions = 0
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def start(self) -> None:
+        """Start the compaction thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="wal-compactor", daemon=True)
+            self._thread.start()
+    
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                if self.agent.compact(self.min_records):
+                    self.compactions += 1
+            except Exception as e:
+                print(f"Error compacting index: {e}")
+    
+    def stop(self) -> None:
+        """Stop the compaction thread"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
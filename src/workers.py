@@ -0,0 +1,162 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .rag_agent import FitnessRAGAgent
+from .rwlock import FileLock
+from .config import Config
+
+def snapshot_signature(index_file: str, metadata_file: str) -> Optional[Tuple]:
+    """Identity of the snapshot files on disk; changes whenever save_index() replaces them"""
+    try:
+        stats = [os.stat(index_file), os.stat(metadata_file)]
+    except FileNotFoundError:
+        return None
+    return tuple((s.st_ino, s.st_mtime_ns, s.st_size) for s in stats)
+
+def worker_environment(workers: int) -> Dict[str, str]:
+    """
+    Settings every worker process needs to share one snapshot
+    
+    The index is memory-mapped and the documents use the offsets format, so
+    workers share page cache instead of holding N copies. The WAL and the
+    embedding store are per-process files and are turned off; every write
+    saves a new snapshot instead.
+    """
+    return {
+        "API_WORKERS": str(workers),
+        "INDEX_MMAP": "true",
+        "METADATA_FORMAT": "offsets",
+        "WAL_ENABLED": "false",
+        "EMBEDDING_STORE_ENABLED": "false"
+    }
+
+def prepare_shared_index(data_file: str = None) -> bool:
+    """
+    Write the snapshot the workers will map, before they start
+    
+    Loads the existing snapshot (replaying its WAL) or builds one from
+    data_file, then saves it in the offsets format. Returns False when there
+    is neither a snapshot nor data.
+    """
+    data_file = data_file or Config.DATA_FILE
+    agent = FitnessRAGAgent()
+    if not agent.load_index():
+        print("No existing index found. Loading sample data...")
+        try:
+            with open(data_file, 'r') as f:
+                agent.load_data(json.load(f))
+        except FileNotFoundError:
+            print(f"Warning: {data_file} not found.")
+            return False
+    agent.save_index(metadata_format="offsets")
+    return True
+
+class SharedIndex:
+    """
+    Keeps one worker's agent on the snapshot shared by all worker processes
+    
+    A watcher thread polls the snapshot files and reloads them, memory-mapped,
+    when another worker or an offline rebuild replaced them. Writes run under
+    an exclusive lock on <INDEX_FILE>.lock: they first catch up with the
+    latest snapshot, save a new one, and map it back in, so no worker keeps a
+    private copy of the index.
+    """
+    
+    def __init__(self, agent: FitnessRAGAgent, poll_seconds: float = None):
+        """
+        Initialize the shared index
+        
+        Args:
+            agent: This worker's agent; loads must memory-map (INDEX_MMAP)
+            poll_seconds: Interval between checks of the snapshot files
+        """
+        self.agent = agent
+        self.poll_seconds = Config.RELOAD_POLL_SECONDS if poll_seconds is None else poll_seconds
+        self.lock = FileLock(f"{agent.index_file}.lock")
+        agent.snapshot_lock = self.lock
+        self.loaded = None
+        
+        self.reloads = 0
+        self.writes = 0
+        self.last_reload_at = None
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def signature(self) -> Optional[Tuple]:
+        return snapshot_signature(self.agent.index_file, self.agent.metadata_file)
+    
+    def _reload_if_changed(self) -> bool:
+        """Load the snapshot on disk unless it is the one already loaded; callers hold the lock"""
+        before = self.signature()
+        if before is None or before == self.loaded:
+            return False
+        if not self.agent.load_index():
+            return False
+        # A writer that ignored the lock may have replaced a file mid-load; retry on the next poll
+        self.loaded = before if self.signature() == before else None
+        self.reloads += 1
+        self.last_reload_at = time.time()
+        return True
+    
+    def refresh(self) -> bool:
+        """Reload if the snapshot changed since it was loaded"""
+        if self.signature() == self.loaded:
+            return False
+        with self.lock.shared():
+            return self._reload_if_changed()
+    
+    def write(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Apply a write that saves the index, serialized across worker processes
+        
+        fn runs against the latest snapshot and must call save_index() for
+        its changes to reach the other workers.
+        """
+        with self.lock.exclusive():
+            self._reload_if_changed()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.writes += 1
+                # Map the snapshot fn saved instead of keeping the in-RAM copy it wrote
+                self._reload_if_changed()
+    
+    def start(self) -> bool:
+        """Load the shared snapshot and start watching it; returns whether one was loaded"""
+        loaded = self.refresh()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name="snapshot-watcher", daemon=True)
+            self._thread.start()
+        return loaded
+    
+    def stop(self) -> None:
+        """Stop the watcher thread"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+    
+    def _watch(self) -> None:
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error reloading shared index: {e}")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get this worker's view of the shared snapshot"""
+        snapshot_id = self.agent.snapshot_id
+        return {
+            "pid": os.getpid(),
+            "snapshot_id": snapshot_id.hex() if snapshot_id else None,
+            "generation": self.agent.generation.version,
+            "mapped": self.agent.index_mapped,
+            "stale": self.signature() != self.loaded,
+            "reloads": self.reloads,
+            "writes": self.writes,
+            "last_reload_at": self.last_reload_at,
+            "lock": self.lock.get_stats()
+        }
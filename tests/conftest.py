@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+import sys
+import zlib
+from pathlib import Path
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from src.config import Config
+from src.lexical import tokenize
+
+class StubEncoder:
+    """Hashed bag-of-words vectors standing in for the sentence transformer"""
+    
+    dimension = 64
+    
+    def encode(self, texts, convert_to_numpy=True, **kwargs):
+        vectors = np.zeros((len(texts), self.dimension), dtype='float32')
+        for row, text in enumerate(texts):
+            vectors[row, 0] = 1.0
+            for token in tokenize(text):
+                vectors[row, 1 + zlib.crc32(token.encode("utf-8")) % (self.dimension - 1)] += 1.0
+        return vectors
+
+@pytest.fixture(autouse=True)
+def isolated_storage(tmp_path_factory, monkeypatch):
+    """Point the default index paths, and the WAL and embedding store derived from them, at a temp dir"""
+    storage = tmp_path_factory.mktemp("storage")
+    monkeypatch.setattr(Config, "INDEX_FILE", str(storage / "fitness_index.faiss"))
+    monkeypatch.setattr(Config, "METADATA_FILE", str(storage / "fitness_metadata.pkl"))
+    monkeypatch.setattr(Config, "WAL_FILE", "")
+    monkeypatch.setattr(Config, "EMBEDDING_STORE_FILE", "")
+
+@pytest.fixture
+def sample_data():
+    """Two beginner documents most agent tests load"""
+    return [
+        {
+            "exercise": "squat",
+            "context": "personalization",
+            "condition": "beginner",
+            "advice": "Start with box squats or bodyweight squats."
+        },
+        {
+            "exercise": "push_up",
+            "context": "personalization",
+            "condition": "beginner",
+            "advice": "Start with wall push-ups or incline push-ups."
+        }
+    ]
+
+@pytest.fixture
+def stub_encoder(monkeypatch):
+    """Load StubEncoder in place of the model, so tests run without downloading it"""
+    encoder = StubEncoder()
+    monkeypatch.setattr("src.rag_agent.load_encoder", lambda *args, **kwargs: encoder)
+    return encoder
@@ -1,33 +1,50 @@
+import gc
 import pytest
 import sys
+import threading
+import weakref
 from pathlib import Path
 
 # Add src to path
 sys.path.append(str(Path(__file__).parent.parent / "src"))
 
-from src.rag_agent import FitnessRAGAgent
+from src.rag_agent import FitnessRAGAgent, RebuildInProgressError
 
 class TestFitnessRAGAgent:
     """Test cases for FitnessRAGAgent"""
     
-    def setup_method(self):
+    @pytest.fixture(autouse=True)
+    def setup(self, sample_data):
         """Setup test data"""
-        self.sample_data = [
-            {
-                "exercise": "squat",
-                "context": "personalization",
-                "condition": "beginner",
-                "advice": "Start with box squats or bodyweight squats."
-            },
-            {
-                "exercise": "push_up",
-                "context": "personalization",
-                "condition": "beginner",
-                "advice": "Start with wall push-ups or incline push-ups."
-            }
-        ]
+        self.sample_data = sample_data
         self.agent = FitnessRAGAgent()
     
+    def test_model_loads_lazily(self, tmp_path):
+        """Test the encoder is only loaded by the first encode"""
+        writer = FitnessRAGAgent(index_file=str(tmp_path / "index.faiss"),
+                                 metadata_file=str(tmp_path / "meta.pkl"))
+        writer.load_data(self.sample_data)
+        writer.save_index()
+        assert writer.wal_file == str(tmp_path / "index.faiss.wal")
+        
+        agent = FitnessRAGAgent(index_file=str(tmp_path / "index.faiss"),
+                                metadata_file=str(tmp_path / "meta.pkl"))
+        assert not agent.model_loaded
+        assert agent.load_index()
+        assert agent.get_stats()["total_documents"] == 2
+        assert agent.search("squat", k=1, mode="lexical")[0]["exercise"] == "squat"
+        assert not agent.model_loaded
+        
+        assert agent.search("beginner squat", k=1)[0]["exercise"] == "squat"
+        assert agent.model_loaded
+    
+    def test_background_warm_up(self):
+        """Test warm-up loads the encoder in a background thread"""
+        thread = self.agent.warm_up(background=True)
+        assert self.agent.warm_up(background=True) is thread
+        thread.join(timeout=120)
+        assert self.agent.model_loaded
+    
     def test_create_document_text(self):
         """Test document text creation"""
         item = self.sample_data[0]
@@ -52,6 +69,17 @@ class TestFitnessRAGAgent:
         assert results[0]['exercise'] == 'squat'
         assert 'similarity_score' in results[0]
     
+    def test_search_batch_ranks(self):
+        """Test batched results keep per-query order and ranks when k exceeds the corpus"""
+        self.agent.load_data(self.sample_data)
+        batch_results = self.agent.search_batch(["beginner squat", "push up", "beginner squat"], k=5)
+        assert [len(results) for results in batch_results] == [2, 2, 2]
+        for results in batch_results:
+            assert [r['rank'] for r in results] == [1, 2]
+            assert results[0]['similarity_score'] >= results[1]['similarity_score']
+        assert batch_results[0] == batch_results[2]
+        assert batch_results[0][0] is not batch_results[2][0]
+    
     def test_query(self):
         """Test query functionality"""
         self.agent.load_data(self.sample_data)
@@ -59,6 +87,44 @@ class TestFitnessRAGAgent:
         assert "squat" in response.lower()
         assert "beginner" in response.lower()
     
+    def test_search_and_render(self):
+        """Test single-pass search and render"""
+        self.agent.load_data(self.sample_data)
+        calls = []
+        encode = self.agent.model.encode
+        self.agent.model.encode = lambda *args, **kwargs: calls.append(args) or encode(*args, **kwargs)
+        results, response = self.agent.search_and_render("beginner squat", k=1)
+        assert len(calls) == 1
+        assert results[0]['exercise'] == 'squat'
+        assert response == self.agent.format_response("beginner squat", results)
+    
+    def test_search_stream_matches_search(self):
+        """Test streamed hits are the search results, built lazily chunk by chunk"""
+        self.agent.load_data(self.sample_data)
+        stream = self.agent.search_stream("beginner squat push", k=2, mode="lexical", chunk_size=1)
+        first = next(stream)
+        assert first["rank"] == 1
+        streamed = [first] + list(stream)
+        self.agent.result_cache.clear()
+        assert streamed == self.agent.search("beginner squat push", k=2, mode="lexical")
+        
+        with pytest.raises(ValueError):
+            self.agent.search_stream("squat", mode="bogus")
+    
+    def test_results_carry_document_ids(self):
+        """Test each hit names its position in the document store"""
+        self.agent.load_data(self.sample_data)
+        for hit in self.agent.search("push up", k=2, mode="lexical"):
+            assert self.agent.documents.get(hit["id"])["advice"] == hit["advice"]
+    
+    def test_format_response_sections(self):
+        """Test the text response is the header followed by one section per result"""
+        self.agent.load_data(self.sample_data)
+        results = self.agent.search("squat", k=2)
+        expected = self.agent.format_header("squat") + "".join(
+            self.agent.format_result(i, result) for i, result in enumerate(results, 1))
+        assert self.agent.format_response("squat", results) == expected
+    
     def test_get_stats(self):
         """Test statistics generation"""
         self.agent.load_data(self.sample_data)
@@ -80,3 +146,105 @@ class TestFitnessRAGAgent:
         self.agent.add_document(new_doc)
         assert len(self.agent.documents) == 3
         assert self.agent.index.ntotal == 3
+    
+    def test_in_flight_query_finishes_on_old_generation(self):
+        """Test a swap during a query leaves the query on the version it started with"""
+        self.agent.load_data(self.sample_data)
+        old_version = self.agent.generation.version
+        old_generation = weakref.ref(self.agent.generation)
+        
+        # Hold a query between its generation lookup and its index search
+        encoding, release = threading.Event(), threading.Event()
+        encode_queries = self.agent.encode_queries
+        def slow_encode(queries):
+            encoding.set()
+            release.wait(10)
+            return encode_queries(queries)
+        self.agent.encode_queries = slow_encode
+        
+        results = []
+        query = threading.Thread(target=lambda: results.extend(self.agent.search("beginner", k=5)))
+        query.start()
+        assert encoding.wait(10)
+        
+        replacement = [{"exercise": "plank", "context": "injury", "condition": "back_pain",
+                        "advice": "Hold a short side plank."}]
+        self.agent.encode_queries = encode_queries
+        self.agent.rebuild(replacement, save=False)
+        assert self.agent.generation.version == old_version + 1
+        assert self.agent.get_generation_stats()["retired_alive"] == 1
+        
+        release.set()
+        query.join(10)
+        assert {r["exercise"] for r in results} == {"squat", "push_up"}
+        assert [r["exercise"] for r in self.agent.search("beginner", k=5)] == ["plank"]
+        
+        # The old generation is released once its last query is done
+        gc.collect()
+        assert old_generation() is None
+        assert self.agent.get_generation_stats()["retired_alive"] == 0
+    
+    def test_background_rebuild(self):
+        """Test background rebuilds report progress and reject overlapping rebuilds"""
+        self.agent.load_data(self.sample_data)
+        started, release = threading.Event(), threading.Event()
+        embed_documents = self.agent.embed_documents
+        def slow_embed(documents):
+            started.set()
+            release.wait(10)
+            return embed_documents(documents)
+        self.agent.embed_documents = slow_embed
+        
+        thread = self.agent.rebuild(self.sample_data[:1], save=False, background=True)
+        assert started.wait(10)
+        assert self.agent.rebuild_status["state"] == "building"
+        with pytest.raises(RebuildInProgressError):
+            self.agent.rebuild(self.sample_data, save=False)
+        assert len(self.agent.search("squat", k=5)) == 2
+        
+        release.set()
+        thread.join(10)
+        assert self.agent.rebuild_status["state"] == "swapped"
+        assert self.agent.rebuild_status["version"] == self.agent.generation.version
+        assert len(self.agent.documents) == 1
+    
+    def test_add_during_background_rebuild(self, tmp_path):
+        """Test a document added while a rebuild builds is carried into the saved generation"""
+        agent = FitnessRAGAgent(index_file=str(tmp_path / "index.faiss"),
+                                metadata_file=str(tmp_path / "meta.pkl"))
+        agent.load_data(self.sample_data)
+        agent.save_index()
+        started, release = threading.Event(), threading.Event()
+        embed_documents = agent.embed_documents
+        def slow_embed(documents):
+            if threading.current_thread().name == "index-rebuild":
+                started.set()
+                release.wait(10)
+            return embed_documents(documents)
+        agent.embed_documents = slow_embed
+        
+        thread = agent.rebuild(self.sample_data[:1], save=True, background=True)
+        assert started.wait(10)
+        new_doc = {"exercise": "deadlift", "context": "personalization", "condition": "beginner",
+                   "advice": "Start with light weight and focus on form."}
+        agent.add_document(new_doc)
+        release.set()
+        thread.join(10)
+        
+        assert agent.rebuild_status["state"] == "swapped"
+        assert list(agent.documents) == [self.sample_data[0], new_doc]
+        assert agent.index.ntotal == 2
+        assert agent.search("deadlift", k=1, mode="lexical")[0]["exercise"] == "deadlift"
+        
+        reloaded = FitnessRAGAgent(index_file=str(tmp_path / "index.faiss"),
+                                   metadata_file=str(tmp_path / "meta.pkl"))
+        assert reloaded.load_index()
+        assert list(reloaded.documents) == [self.sample_data[0], new_doc]
+    
+    def test_invalid_rebuild_keeps_current_generation(self):
+        """Test an index that fails validation is never swapped in"""
+        self.agent.load_data(self.sample_data)
+        generation = self.agent.generation
+        with pytest.raises(ValueError):
+            self.agent.replace_corpus(self.sample_data[:1], generation.index)
+        assert self.agent.generation is generation
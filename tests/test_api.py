@@ -1,3 +1,4 @@
+import json
 import pytest
 import sys
 from pathlib import Path
@@ -6,14 +7,24 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent / "src"))
 
 from fastapi.testclient import TestClient
-from src.api_wrapper import app
+from src import api_wrapper
+from src.api_wrapper import FastJSONResponse, _project, _stream_events, app
+from src.config import Config
+from src.workers import SharedIndex
 
 class TestAPI:
     """Test cases for FastAPI endpoints"""
     
-    def setup_method(self):
-        """Setup test client"""
-        self.client = TestClient(app)
+    @pytest.fixture(autouse=True)
+    def setup(self, stub_encoder, sample_data, tmp_path, monkeypatch):
+        """Setup a started test client that loads the sample data with the stub encoder"""
+        data_file = tmp_path / "data.json"
+        data_file.write_text(json.dumps(sample_data))
+        monkeypatch.setattr(Config, "DATA_FILE", str(data_file))
+        monkeypatch.setattr(Config, "MODEL_WARMUP", False)
+        with TestClient(app) as client:
+            self.client = client
+            yield
     
     def test_health_check(self):
         """Test health check endpoint"""
@@ -88,6 +99,14 @@ class TestAPI:
         assert "message" in data
         assert "successfully" in data["message"]
     
+    def test_add_document_with_workers(self, monkeypatch):
+        """Test single adds are refused when workers share the snapshot"""
+        monkeypatch.setattr("src.api_wrapper.shared", SharedIndex(api_wrapper.agent))
+        response = self.client.post("/add_document", json={"exercise": "deadlift", "context": "personalization",
+                                                           "condition": "beginner", "advice": "Start light."})
+        assert response.status_code == 409
+        assert "/ingest?replace=false" in response.json()["detail"]
+    
     def test_stats_endpoint(self):
         """Test stats endpoint"""
         # First load some data
@@ -107,3 +126,144 @@ class TestAPI:
         data = response.json()
         assert "stats" in data
         assert "total_documents" in data["stats"]
+    
+    def test_stream_events(self):
+        """Test streamed queries are encoded as NDJSON lines or server-sent events"""
+        hits = [{"exercise": "squat", "context": "form", "condition": "beginner",
+                 "advice": "Brace first.", "similarity_score": 0.9, "rank": 1}]
+        lines = [json.loads(line) for line in _stream_events("squat", iter(hits), "ndjson")]
+        assert [line["event"] for line in lines] == ["start", "result", "end"]
+        assert lines[1]["result"] == hits[0]
+        assert lines[1]["text"].startswith("1. **Squat for Beginner**")
+        assert lines[2]["count"] == 1
+        
+        events = list(_stream_events("squat", iter(hits), "sse"))
+        assert events[1].startswith("event: result\ndata: {")
+        assert events[1].endswith("\n\n")
+    
+    def test_stream_error_event(self):
+        """Test a failure after the stream started is sent as an error event"""
+        def failing():
+            yield {"exercise": "squat", "context": "form", "condition": "beginner",
+                   "advice": "Brace first.", "similarity_score": 0.9, "rank": 1}
+            raise IndexError("document index out of range")
+        
+        lines = [json.loads(line) for line in _stream_events("squat", failing(), "ndjson")]
+        assert [line["event"] for line in lines] == ["start", "result", "error"]
+        assert "out of range" in lines[-1]["detail"]
+    
+    def test_project_results(self):
+        """Test field projection keeps only the requested fields"""
+        results = [{"exercise": "squat", "advice": "Brace first.", "id": 4, "similarity_score": 0.9, "rank": 1}]
+        assert _project(results, None) is results
+        assert _project(results, ["id", "similarity_score"]) == [{"id": 4, "similarity_score": 0.9}]
+        assert _project(results, ["id", "title"]) == [{"id": 4}]
+    
+    def test_fast_json_response(self):
+        """Test responses are encoded as compact JSON"""
+        response = FastJSONResponse({"query": "squat", "results": [{"id": 1, "similarity_score": 0.5}],
+                                     "response": None})
+        assert response.media_type == "application/json"
+        assert json.loads(response.body) == {"query": "squat", "results": [{"id": 1, "similarity_score": 0.5}],
+                                             "response": None}
+    
+    def test_stream_without_text(self):
+        """Test render=False streams projected results without text sections"""
+        hits = [{"exercise": "squat", "context": "form", "condition": "beginner",
+                 "advice": "Brace first.", "id": 3, "similarity_score": 0.9, "rank": 1}]
+        lines = [json.loads(line) for line in _stream_events("squat", iter(hits), "ndjson",
+                                                              fields=["id", "rank"], render=False)]
+        assert lines[0] == {"event": "start", "query": "squat"}
+        assert lines[1] == {"event": "result", "result": {"id": 3, "rank": 1}}
+        assert "text" not in lines[2]
+    
+    def test_query_fields(self):
+        """Test /query returns only the requested fields and no text with render=false"""
+        response = self.client.post("/query", json={"query": "beginner squat", "k": 1, "mode": "lexical",
+                                                    "fields": ["exercise", "rank"], "render": False})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+        assert response.json() == {"query": "beginner squat", "results": [{"exercise": "squat", "rank": 1}],
+                                   "response": None}
+    
+    def test_query_batch(self):
+        """Test /query_batch answers every query in order"""
+        response = self.client.post("/query_batch", json={"queries": ["box squats", "wall push-ups"],
+                                                          "k": 1, "mode": "lexical"})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+        results = response.json()["results"]
+        assert [result["query"] for result in results] == ["box squats", "wall push-ups"]
+        assert [result["results"][0]["exercise"] for result in results] == ["squat", "push_up"]
+        assert "**Squat for Beginner**" in results[0]["response"]
+        
+        response = self.client.post("/query_batch", json={"queries": ["box squats"], "k": 2, "mode": "lexical",
+                                                          "fields": ["id"], "render": False})
+        assert response.json()["results"] == [{"query": "box squats", "results": [{"id": 0}], "response": None}]
+    
+    def test_invalid_k(self):
+        """Test k < 1 is rejected before it reaches a search"""
+        for path, body in (("/query", {"query": "squat", "k": 0}), ("/query_batch", {"queries": ["squat"], "k": -1}),
+                           ("/query/stream", {"query": "squat", "k": 0})):
+            response = self.client.post(path, json=body)
+            assert response.status_code == 422
+            assert response.json()["detail"][0]["loc"] == ["body", "k"]
+    
+    def test_query_batch_too_large(self, monkeypatch):
+        """Test batches over QUERY_BATCH_MAX_SIZE are rejected"""
+        monkeypatch.setattr(Config, "QUERY_BATCH_MAX_SIZE", 1)
+        response = self.client.post("/query_batch", json={"queries": ["squat", "push up"]})
+        assert response.status_code == 400
+        assert "At most 1" in response.json()["detail"]
+    
+    def test_query_stream_ndjson(self):
+        """Test /query/stream sends a start line, one line per hit and an end line"""
+        response = self.client.post("/query/stream", json={"query": "beginner", "k": 2, "mode": "lexical"})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [line["event"] for line in lines] == ["start", "result", "result", "end"]
+        assert lines[0]["text"].startswith("Based on your query: 'beginner'")
+        assert {line["result"]["exercise"] for line in lines[1:3]} == {"squat", "push_up"}
+        assert lines[-1]["count"] == 2
+    
+    def test_query_stream_sse(self):
+        """Test /query/stream sends server-sent events when the client accepts them"""
+        response = self.client.post("/query/stream", json={"query": "box squats", "k": 1, "mode": "lexical"},
+                                    headers={"Accept": "text/event-stream"})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = [event.split("\n", 1) for event in response.text.split("\n\n") if event]
+        assert [name for name, data in events] == ["event: start", "event: result", "event: end"]
+        assert json.loads(events[1][1][len("data: "):])["result"]["exercise"] == "squat"
+        
+        response = self.client.post("/query/stream?format=xml", json={"query": "box squats"})
+        assert response.status_code == 400
+    
+    def test_ingest(self):
+        """Test /ingest replaces the corpus with the streamed NDJSON documents"""
+        records = [{"exercise": exercise, "context": "personalization", "condition": "beginner",
+                    "advice": f"Practice the {exercise} slowly."} for exercise in ("plank", "lunge", "row")]
+        body = "".join(json.dumps(record) + "\n" for record in records)
+        response = self.client.post("/ingest?batch_size=2", content=body,
+                                    headers={"Content-Type": "application/x-ndjson"})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+        data = response.json()
+        assert data["documents"] == 3
+        assert data["batches"] == 2
+        assert self.client.get("/stats").json()["stats"]["total_documents"] == 3
+        
+        response = self.client.post("/ingest", content="not json\n")
+        assert response.status_code == 400
+        assert "invalid JSON" in response.json()["detail"]
+    
+    def test_metrics(self):
+        """Test /metrics exposes request latency and index gauges in the Prometheus text format"""
+        self.client.post("/query", json={"query": "beginner squat", "k": 1})
+        response = self.client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert 'fitness_rag_http_request_seconds_count{method="POST",route="/query",status="200"}' in response.text
+        assert "\nfitness_rag_documents 2\n" in response.text
+        assert "# TYPE fitness_rag_executor_in_flight gauge" in response.text
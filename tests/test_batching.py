@@ -0,0 +1,74 @@
+import asyncio
+import pytest
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from src.rag_agent import FitnessRAGAgent
+from src.batching import QueryBatcher
+
+class TestQueryBatcher:
+    """Test cases for QueryBatcher"""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self, sample_data):
+        """Setup agent with test data"""
+        self.sample_data = sample_data
+        self.agent = FitnessRAGAgent()
+        self.agent.load_data(self.sample_data)
+    
+    def test_search_batch_matches_search(self):
+        """Test batched search returns the same results as single searches"""
+        queries = ["beginner squat", "push up"]
+        batch_results = self.agent.search_batch(queries, k=2)
+        assert len(batch_results) == 2
+        for query, results in zip(queries, batch_results):
+            assert results == self.agent.search(query, k=2)
+    
+    def test_concurrent_queries_share_batch(self):
+        """Test concurrent queries are coalesced into one batch"""
+        batcher = QueryBatcher(self.agent, max_batch_size=8, max_wait_ms=50)
+        
+        async def run():
+            return await asyncio.gather(
+                batcher.search("beginner squat", 1),
+                batcher.search("push up", 2),
+                batcher.search("squat form", 1),
+            )
+        
+        results = asyncio.run(run())
+        assert [len(r) for r in results] == [1, 2, 1]
+        assert results[0] == self.agent.search("beginner squat", 1)
+        
+        stats = batcher.get_stats()
+        assert stats['total_batches'] == 1
+        assert stats['total_queries'] == 3
+        assert stats['batch_size_counts'] == {"3": 1}
+        assert stats['latency_p99_ms'] is not None
+    
+    def test_max_batch_size_splits_batches(self):
+        """Test batches never exceed the configured size"""
+        batcher = QueryBatcher(self.agent, max_batch_size=2, max_wait_ms=50)
+        
+        async def run():
+            return await asyncio.gather(*[batcher.search("squat", 1) for _ in range(5)])
+        
+        results = asyncio.run(run())
+        assert len(results) == 5
+        assert batcher.get_stats()['max_observed_batch'] == 2
+        assert batcher.get_stats()['total_batches'] == 3
+    
+    def test_invalid_k_stays_out_of_batch(self):
+        """Test a query with k < 1 is rejected without failing the batch it would join"""
+        batcher = QueryBatcher(self.agent, max_batch_size=8, max_wait_ms=50)
+        
+        async def run():
+            return await asyncio.gather(batcher.search("squat", 0), batcher.search("push up", 1),
+                                        return_exceptions=True)
+        
+        rejected, results = asyncio.run(run())
+        assert isinstance(rejected, ValueError)
+        assert len(results) == 1
+        assert batcher.get_stats()['total_queries'] == 1
@@ -0,0 +1,85 @@
+import pytest
+import sys
+import time
+from pathlib import Path
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from src.cache import LRUCache
+from src.rag_agent import FitnessRAGAgent
+
+class TestLRUCache:
+    """Test cases for LRUCache"""
+    
+    def test_lru_eviction(self):
+        """Test the least recently used entry is evicted first"""
+        cache = LRUCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        assert cache.get("a") == 1
+        cache.put("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert cache.get_stats()['evictions'] == 1
+    
+    def test_ttl_expiry(self):
+        """Test entries expire after the TTL"""
+        cache = LRUCache(maxsize=4, ttl=0.05)
+        cache.put("a", 1)
+        assert cache.get("a") == 1
+        time.sleep(0.1)
+        assert cache.get("a") is None
+        assert cache.get_stats()['expirations'] == 1
+    
+    def test_disabled(self):
+        """Test a zero-size cache stores nothing"""
+        cache = LRUCache(maxsize=0)
+        cache.put("a", 1)
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+class TestAgentQueryCache:
+    """Test cases for the agent's query caches"""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self, sample_data):
+        """Setup agent with test data"""
+        self.sample_data = sample_data
+        self.agent = FitnessRAGAgent()
+        self.agent.load_data(self.sample_data)
+        self.calls = []
+        encode = self.agent.model.encode
+        self.agent.model.encode = lambda *args, **kwargs: self.calls.append(args) or encode(*args, **kwargs)
+    
+    def test_repeated_query_skips_encode(self):
+        """Test normalized repeats are served from the cache"""
+        first = self.agent.search("Beginner  squat", k=1)
+        second = self.agent.search("beginner squat", k=1)
+        assert first == second
+        assert len(self.calls) == 1
+        assert self.agent.get_cache_stats()['results']['hits'] == 1
+    
+    def test_cached_results_are_not_copied(self):
+        """Test repeated searches hand out the cached hit dicts themselves"""
+        first = self.agent.search("beginner squat", k=1)
+        assert self.agent.search("beginner squat", k=1)[0] is first[0]
+    
+    def test_add_document_invalidates_results(self):
+        """Test index changes invalidate cached results but keep embeddings"""
+        self.agent.search("deadlift", k=3)
+        version = self.agent.index_version
+        self.agent.add_document({
+            "exercise": "deadlift",
+            "context": "personalization",
+            "condition": "beginner",
+            "advice": "Start with light weight and focus on form."
+        })
+        assert self.agent.index_version == version + 1
+        
+        self.calls.clear()
+        results = self.agent.search("deadlift", k=3)
+        assert len(results) == 3
+        assert len(self.calls) == 0
+        assert self.agent.get_cache_stats()['embeddings']['hits'] == 1
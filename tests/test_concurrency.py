@@ -0,0 +1,145 @@
+import pytest
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from src.rag_agent import FitnessRAGAgent
+from src.rwlock import ReadWriteLock
+
+class TestReadWriteLock:
+    """Test cases for ReadWriteLock"""
+    
+    def test_readers_share(self):
+        """Test readers hold the lock at the same time"""
+        lock = ReadWriteLock()
+        barrier = threading.Barrier(3, timeout=5)
+        
+        def reader():
+            with lock.read():
+                barrier.wait()
+        
+        threads = [threading.Thread(target=reader) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+        assert not barrier.broken
+        assert lock.get_stats()["reads"] == 3
+    
+    def test_writer_excludes_readers(self):
+        """Test a writer waits for readers and a waiting writer blocks new readers"""
+        lock = ReadWriteLock()
+        events = []
+        reading = threading.Event()
+        release = threading.Event()
+        
+        def first_reader():
+            with lock.read():
+                reading.set()
+                release.wait(timeout=5)
+                events.append("first read done")
+        
+        def writer():
+            with lock.write():
+                events.append("write")
+        
+        def late_reader():
+            with lock.read():
+                events.append("late read")
+        
+        threads = [threading.Thread(target=first_reader)]
+        threads[0].start()
+        reading.wait(timeout=5)
+        threads.append(threading.Thread(target=writer))
+        threads[1].start()
+        while not lock.get_stats()["waiting_writers"]:
+            time.sleep(0.001)
+        threads.append(threading.Thread(target=late_reader))
+        threads[2].start()
+        time.sleep(0.05)
+        assert events == []
+        
+        release.set()
+        for thread in threads:
+            thread.join(timeout=10)
+        assert events == ["first read done", "write", "late read"]
+
+class TestConcurrentAgent:
+    """Stress searches against concurrent adds on one agent"""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self, sample_data):
+        """Setup test data"""
+        self.sample_data = sample_data
+    
+    def test_searches_during_adds(self, tmp_path):
+        """Test every hit is a whole document and the index, documents and BM25 stay in step"""
+        agent = FitnessRAGAgent(index_file=str(tmp_path / "index.faiss"),
+                                metadata_file=str(tmp_path / "metadata.pkl"))
+        agent.load_data(self.sample_data)
+        errors = []
+        searches = []
+        done = threading.Event()
+        
+        def reader(mode):
+            try:
+                while not done.is_set():
+                    filters = {"exercise": "squat"} if mode == "lexical" else None
+                    results = agent.search("squat form advice", k=5, filters=filters, mode=mode)
+                    scores = [r["similarity_score"] for r in results]
+                    assert scores == sorted(scores, reverse=True)
+                    for result in results:
+                        # Added documents name their exercise in the advice
+                        if result["context"] == "stress":
+                            assert result["advice"].endswith(result["exercise"])
+                        if filters:
+                            assert result["exercise"] == "squat"
+                    searches.append(len(results))
+            except Exception as e:
+                errors.append(e)
+        
+        def writer(writer_id):
+            try:
+                for i in range(15):
+                    exercise = ["squat", "push_up", "plank"][i % 3]
+                    agent.add_document({"exercise": exercise, "context": "stress", "condition": f"w{writer_id}",
+                                        "advice": f"stress note {writer_id} {i} for {exercise}"})
+            except Exception as e:
+                errors.append(e)
+        
+        readers = [threading.Thread(target=reader, args=(mode,)) for mode in ["dense", "lexical", "hybrid"] * 2]
+        writers = [threading.Thread(target=writer, args=(writer_id,)) for writer_id in range(2)]
+        for thread in readers + writers:
+            thread.start()
+        for thread in writers:
+            thread.join(timeout=120)
+        done.set()
+        for thread in readers:
+            thread.join(timeout=120)
+        
+        assert errors == []
+        assert searches
+        total = len(self.sample_data) + 30
+        assert len(agent.documents) == agent.index.ntotal == len(agent.lexical_index()) == total
+        assert agent.get_stats()["locks"]["writes"] >= 30
+    
+    def test_stream_chunks_wait_for_adds(self, tmp_path):
+        """Test each streamed chunk is hydrated under the read lock, between adds"""
+        agent = FitnessRAGAgent(index_file=str(tmp_path / "index.faiss"),
+                                metadata_file=str(tmp_path / "metadata.pkl"))
+        agent.load_data(self.sample_data)
+        stream = agent.search_stream("squat push", k=2, mode="lexical", chunk_size=1)
+        assert next(stream)["rank"] == 1
+        
+        hits = []
+        with agent._rw_lock.write():
+            thread = threading.Thread(target=lambda: hits.extend(stream))
+            thread.start()
+            time.sleep(0.05)
+            assert hits == []
+        thread.join(timeout=10)
+        assert [hit["rank"] for hit in hits] == [2]
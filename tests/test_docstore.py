@@ -0,0 +1,112 @@
+import pytest
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from src.config import Config
+from src.docstore import DocumentStore, is_document_file
+from src.rag_agent import FitnessRAGAgent
+
+SNAPSHOT = b"0123456789abcdef"
+
+class TestDocumentStore:
+    """Test cases for the columnar document store"""
+    
+    def setup_method(self):
+        """Setup test data"""
+        self.documents = [
+            {"exercise": "squat", "context": "personalization", "condition": "beginner",
+             "advice": "Start with box squats or bodyweight squats."},
+            {"exercise": "push_up", "context": "personalization", "condition": "beginner",
+             "advice": "Start with wall push-ups — or incline push-ups."},
+            {"exercise": "squat", "context": "injury", "condition": "knee_pain",
+             "advice": "Reduce depth.", "source": "physio"}
+        ]
+    
+    def test_lookup_api(self):
+        """Test the store behaves like the list of documents it replaces"""
+        store = DocumentStore(self.documents)
+        assert len(store) == 3
+        assert store[1] == self.documents[1]
+        assert store[-1] == self.documents[2]
+        assert list(store) == self.documents
+        assert store[0:2] == self.documents[0:2]
+        with pytest.raises(IndexError):
+            store[3]
+    
+    def test_get_many(self):
+        """Test gathering many documents at once matches single lookups"""
+        store = DocumentStore(self.documents)
+        ids = [2, 0, 2, 1]
+        assert store.get_many(ids) == [self.documents[i] for i in ids]
+        assert store.get_many([]) == []
+        with pytest.raises(IndexError):
+            store.get_many([3])
+    
+    def test_dictionary_encoding(self):
+        """Test categorical fields are stored as codes into a vocabulary"""
+        store = DocumentStore(self.documents)
+        assert store.vocabulary('exercise') == ["squat", "push_up"]
+        assert store.codes('exercise').tolist() == [0, 1, 0]
+        assert store.codes('context').dtype.itemsize == 2
+        assert store.get(2, fields=["condition", "advice"]) == {"condition": "knee_pain", "advice": "Reduce depth."}
+    
+    def test_view_reads_without_copying(self):
+        """Test views decode fields on access"""
+        store = DocumentStore(self.documents)
+        view = store.view(2)
+        assert view['exercise'] == "squat"
+        assert dict(view) == self.documents[2]
+    
+    def test_code_promotion(self):
+        """Test codes widen once a vocabulary outgrows uint16"""
+        store = DocumentStore()
+        store.extend({"exercise": f"e{i}", "context": "c", "condition": "b", "advice": ""} for i in range(70000))
+        assert store.codes('exercise').dtype.itemsize == 4
+        assert store[69999]['exercise'] == "e69999"
+    
+    def test_save_and_open(self, tmp_path):
+        """Test a saved store maps back and copies on the first append"""
+        path = str(tmp_path / "docs.bin")
+        DocumentStore(self.documents).save(path, SNAPSHOT)
+        assert is_document_file(path)
+        
+        store = DocumentStore.open(path)
+        assert store.snapshot_id == SNAPSHOT
+        assert list(store) == self.documents
+        store.append({"exercise": "lunge", "context": "injury", "condition": "beginner", "advice": "Go slow."})
+        assert len(store) == 4
+        assert store[3]['exercise'] == "lunge"
+        assert store[0] == self.documents[0]
+    
+    def test_pickle_is_not_document_file(self, tmp_path):
+        """Test format detection on other files"""
+        path = tmp_path / "metadata.pkl"
+        path.write_bytes(b"\x80\x04")
+        assert not is_document_file(str(path))
+
+class TestMappedAgent:
+    """Test cases for memory-mapped loading in the agent"""
+    
+    def test_mapped_load_search_and_add(self, tmp_path, monkeypatch, sample_data):
+        """Test a mapped index serves searches and is copied on first write"""
+        monkeypatch.setattr(Config, "METADATA_FORMAT", "offsets")
+        writer = FitnessRAGAgent(index_file=str(tmp_path / "index.faiss"),
+                                 metadata_file=str(tmp_path / "metadata.bin"))
+        writer.load_data(sample_data)
+        writer.save_index()
+        
+        agent = FitnessRAGAgent(index_file=str(tmp_path / "index.faiss"),
+                                metadata_file=str(tmp_path / "metadata.bin"), mmap=True)
+        assert agent.load_index()
+        assert agent.index_mapped
+        assert agent.documents.snapshot_id == writer.snapshot_id
+        assert agent.search("beginner squat", k=1) == writer.search("beginner squat", k=1)
+        
+        agent.add_document({"exercise": "deadlift", "context": "personalization",
+                            "condition": "beginner", "advice": "Start with light weight."})
+        assert not agent.index_mapped
+        assert agent.index.ntotal == 3
+        assert agent.documents[2]['exercise'] == "deadlift"
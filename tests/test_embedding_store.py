@@ -0,0 +1,92 @@
+import pytest
+import sys
+import numpy as np
+from pathlib import Path
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from src.embedding_store import EmbeddingStore, EMB_HEADER
+from src.rag_agent import FitnessRAGAgent
+
+class TestEmbeddingStore:
+    """Test cases for the persistent document embedding cache"""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self, sample_data):
+        """Setup test data"""
+        self.sample_data = sample_data
+    
+    def test_put_and_lookup(self, tmp_path):
+        """Test stored vectors are found again, also after reopening"""
+        store = EmbeddingStore(str(tmp_path / "emb"), "model-a")
+        keys = [store.key("a"), store.key("b")]
+        vectors = np.arange(8, dtype='float32').reshape(2, 4)
+        store.put(keys, vectors)
+        store.put(keys[:1], vectors[:1])  # Already stored; not appended twice
+        
+        reopened = EmbeddingStore(str(tmp_path / "emb"), "model-a")
+        assert len(reopened) == 2
+        stored, found = reopened.lookup([keys[1], reopened.key("c"), keys[0]])
+        assert found.tolist() == [True, False, True]
+        assert np.array_equal(stored, vectors[[1, 0]])
+        assert reopened.get_stats()["last_hit_ratio"] == pytest.approx(2 / 3)
+    
+    def test_keys_depend_on_model(self, tmp_path):
+        """Test vectors from one model are never served for another"""
+        a = EmbeddingStore(str(tmp_path / "emb"), "model-a")
+        b = EmbeddingStore(str(tmp_path / "emb"), "model-b")
+        assert a.key("text") != b.key("text")
+    
+    def test_torn_tail_is_dropped(self, tmp_path):
+        """Test a partially written record is discarded on load"""
+        path = tmp_path / "emb"
+        store = EmbeddingStore(str(path), "model-a")
+        store.put([store.key("a")], np.ones((1, 4), dtype='float32'))
+        with open(path, 'ab') as f:
+            f.write(b"partial")
+        
+        reopened = EmbeddingStore(str(path), "model-a")
+        assert len(reopened) == 1
+        assert path.stat().st_size == EMB_HEADER.size + 16 + 4 * 4
+    
+    def test_rebuild_encodes_only_changed_documents(self, tmp_path):
+        """Test load_data reuses stored vectors for unchanged documents"""
+        agent = FitnessRAGAgent(index_file=str(tmp_path / "index.faiss"),
+                                metadata_file=str(tmp_path / "meta.pkl"))
+        agent.load_data(self.sample_data)
+        first = agent.index.reconstruct(0)
+        
+        encoded = []
+        encode = agent.model.encode
+        agent.model.encode = lambda texts, **kwargs: encoded.extend(texts) or encode(texts, **kwargs)
+        changed = self.sample_data + [{"exercise": "lunge", "context": "injury",
+                                       "condition": "knee_pain", "advice": "Shorten the stride."}]
+        agent.load_data(changed)
+        
+        assert len(encoded) == 1 and "lunge" in encoded[0]
+        assert np.allclose(agent.index.reconstruct(0), first)
+        assert agent.get_cache_stats()["document_embeddings"]["last_hits"] == 2
+    
+    def test_save_compacts_store(self, tmp_path):
+        """Test saving after a corpus replacement drops the vectors of the replaced documents"""
+        agent = FitnessRAGAgent(index_file=str(tmp_path / "index.faiss"),
+                                metadata_file=str(tmp_path / "meta.pkl"))
+        agent.load_data(self.sample_data)
+        agent.save_index()
+        path = tmp_path / "index.faiss.emb"
+        size = path.stat().st_size
+        
+        agent.load_data(self.sample_data[:1] + [{"exercise": "lunge", "context": "injury",
+                                                 "condition": "knee_pain", "advice": "Shorten the stride."}])
+        assert path.stat().st_size > size
+        agent.save_index()
+        assert path.stat().st_size == size
+        
+        store = agent.embedding_store
+        assert len(store) == 2
+        keys = [store.key(agent.create_document_text(item)) for item in agent.documents]
+        stored, found = store.lookup(keys)
+        assert found.all()
+        assert np.allclose(stored, [agent.index.reconstruct(i) for i in range(2)])
+        assert len(EmbeddingStore(str(path), store.model_name)) == 2
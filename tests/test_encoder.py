@@ -0,0 +1,53 @@
+import pytest
+import sys
+import numpy as np
+from pathlib import Path
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from src.config import Config
+from src.encoder import cosine_parity, encode_normalized, encoder_id, load_encoder
+from src.rag_agent import FitnessRAGAgent
+
+class TestEncoder:
+    """Test cases for the encoder backends"""
+    
+    def setup_method(self):
+        """Setup test texts"""
+        self.texts = [
+            "Exercise: squat | Context: personalization | Condition: beginner | Advice: Start with box squats.",
+            "Exercise: push_up | Context: injury | Condition: wrist_pain | Advice: Use push-up handles.",
+            "beginner squat advice"
+        ]
+    
+    def test_onnx_requires_recent_sentence_transformers(self, monkeypatch):
+        """Test the onnx backend names the sentence-transformers release it needs"""
+        import sentence_transformers
+        monkeypatch.setattr(sentence_transformers, "__version__", "2.2.2")
+        with pytest.raises(ImportError, match="sentence-transformers>=3.2"):
+            load_encoder(Config.MODEL_NAME, "onnx")
+    
+    def test_int8_parity(self):
+        """Test dynamic int8 quantization stays close to the fp32 reference"""
+        reference = encode_normalized(load_encoder(Config.MODEL_NAME, "torch"), self.texts)
+        quantized = encode_normalized(load_encoder(Config.MODEL_NAME, "torch_int8", threads=1), self.texts)
+        parity = cosine_parity(reference, quantized)
+        assert parity["min_cosine"] > 0.98
+        assert np.allclose(np.linalg.norm(quantized, axis=1), 1.0, atol=1e-5)
+    
+    def test_unknown_backend(self):
+        """Test an unknown backend is rejected"""
+        with pytest.raises(ValueError):
+            load_encoder(Config.MODEL_NAME, "tensorrt")
+    
+    def test_stored_embeddings_keyed_by_backend(self, tmp_path):
+        """Test vectors from different backends are never mixed in the embedding store"""
+        assert encoder_id("m", "torch") == "m"
+        assert encoder_id("m", "torch_int8") != encoder_id("m", "torch")
+        
+        agent = FitnessRAGAgent(index_file=str(tmp_path / "index.faiss"), encoder_backend="torch_int8")
+        assert agent.embedding_store.model_name == encoder_id(agent.model_name, "torch_int8")
+        agent.load_data([{"exercise": "squat", "context": "personalization", "condition": "beginner",
+                          "advice": "Start with box squats."}])
+        assert agent.search("squat", k=1)[0]["exercise"] == "squat"
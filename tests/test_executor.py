@@ -0,0 +1,77 @@
+import asyncio
+import pytest
+import sys
+import threading
+from pathlib import Path
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from src.rag_agent import FitnessRAGAgent
+from src.executor import AgentExecutor, ExecutorBusyError
+
+class TestAgentExecutor:
+    """Test cases for AgentExecutor"""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self, sample_data):
+        """Setup agent with test data"""
+        self.sample_data = sample_data
+        self.agent = FitnessRAGAgent()
+        self.agent.load_data(self.sample_data)
+    
+    def test_thread_search_runs_off_loop(self):
+        """Test searches run in the worker pool, not the event loop thread"""
+        executor = AgentExecutor(self.agent, kind="thread", max_workers=2)
+        loop_thread = []
+        
+        async def run():
+            loop_thread.append(threading.get_ident())
+            return await executor.run(threading.get_ident), await executor.search_batch(["beginner squat"], 1)
+        
+        try:
+            worker_thread, results = asyncio.run(run())
+        finally:
+            executor.shutdown()
+        assert worker_thread != loop_thread[0]
+        assert results == self.agent.search_batch(["beginner squat"], 1)
+        assert executor.get_stats()['completed'] == 2
+    
+    def test_queue_depth_rejects_work(self):
+        """Test work is rejected once the queue is full"""
+        executor = AgentExecutor(self.agent, kind="thread", max_workers=1, queue_depth=1)
+        release = threading.Event()
+        
+        async def run():
+            blocked = asyncio.ensure_future(executor.run(release.wait, 5))
+            await asyncio.sleep(0.05)
+            try:
+                with pytest.raises(ExecutorBusyError):
+                    await executor.run(lambda: None)
+            finally:
+                release.set()
+                await blocked
+        
+        try:
+            asyncio.run(run())
+        finally:
+            executor.shutdown()
+        assert executor.get_stats()['rejected'] == 1
+    
+    def test_process_search_uses_persisted_index(self, tmp_path):
+        """Test process pool workers serve searches from the saved index"""
+        self.agent.index_file = str(tmp_path / "index.faiss")
+        self.agent.metadata_file = str(tmp_path / "metadata.pkl")
+        self.agent.save_index()
+        executor = AgentExecutor(self.agent, kind="process", max_workers=1)
+        
+        try:
+            results = asyncio.run(executor.search_batch(["beginner squat"], 2))
+        finally:
+            executor.shutdown()
+        assert results == self.agent.search_batch(["beginner squat"], 2)
+    
+    def test_unknown_type(self):
+        """Test invalid executor types are rejected"""
+        with pytest.raises(ValueError):
+            AgentExecutor(self.agent, kind="fiber")
@@ -0,0 +1,113 @@
+import faiss
+import pytest
+import sys
+import numpy as np
+from pathlib import Path
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from src.config import Config
+from src.docstore import DocumentStore
+from src.filters import allowed_ids, filtered_search, normalize_filters
+from src.index_factory import build_index, configure_index
+from src.rag_agent import FitnessRAGAgent
+
+class TestFilters:
+    """Test cases for metadata pre-filtering"""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self, sample_data):
+        """Setup test data"""
+        self.documents = sample_data + [
+            {"exercise": "squat", "context": "injury", "condition": "knee_pain",
+             "advice": "Reduce depth and keep the knees tracking over the toes."},
+            {"exercise": "push_up", "context": "injury", "condition": "wrist_pain",
+             "advice": "Use push-up handles to keep the wrists neutral."}
+        ]
+    
+    def test_normalize_filters(self):
+        """Test filters are canonicalized into a hashable key"""
+        assert normalize_filters(None) == ()
+        assert normalize_filters({"exercise": "squat"}) == (("exercise", ("squat",)),)
+        assert normalize_filters({"context": ["b", "a", "a"], "exercise": "squat"}) == \
+            (("context", ("a", "b")), ("exercise", ("squat",)))
+    
+    def test_allowed_ids(self):
+        """Test values are OR-ed within a field and fields are AND-ed"""
+        store = DocumentStore(self.documents)
+        assert allowed_ids(store, normalize_filters({"exercise": "squat"})).tolist() == [0, 2]
+        assert allowed_ids(store, normalize_filters({"condition": ["beginner", "wrist_pain"]})).tolist() == [0, 1, 3]
+        assert allowed_ids(store, normalize_filters({"exercise": "squat", "context": "injury"})).tolist() == [2]
+        assert allowed_ids(store, normalize_filters({"exercise": "deadlift"})).tolist() == []
+        with pytest.raises(ValueError):
+            allowed_ids(store, normalize_filters({"advice": "x"}))
+    
+    def test_postings_follow_appends(self):
+        """Test documents added after the postings are built are filterable"""
+        store = DocumentStore(self.documents)
+        assert store.ids_for("exercise", ["squat"]).tolist() == [0, 2]
+        store.append({"exercise": "squat", "context": "injury", "condition": "back_pain", "advice": "Brace."})
+        store.append({"exercise": "lunge", "context": "injury", "condition": "back_pain", "advice": "Step."})
+        assert store.ids_for("exercise", ["squat"]).tolist() == [0, 2, 4]
+        assert store.ids_for("condition", ["back_pain"]).tolist() == [4, 5]
+    
+    @pytest.mark.parametrize("index_type", ["flat", "hnsw", "ivf_flat"])
+    def test_filtered_search_matches_brute_force(self, index_type):
+        """Test filtered search returns the exact top-k among the allowed ids"""
+        rng = np.random.default_rng(0)
+        embeddings = rng.standard_normal((2000, 16)).astype('float32')
+        queries = rng.standard_normal((3, 16)).astype('float32')
+        index = build_index(embeddings, index_type)
+        ids = np.sort(rng.choice(2000, 50, replace=False))
+        
+        scores, indices = filtered_search(index, queries, 5, ids)
+        expected = ids[np.argsort(-(queries @ embeddings[ids].T), axis=1)[:, :5]]
+        assert np.array_equal(indices, expected)
+        assert np.all(np.diff(scores, axis=1) <= 0)
+    
+    def test_ivf_direct_map_built_up_front(self, tmp_path):
+        """Test IVF indexes can be gathered by id once built or loaded, so searches never change them"""
+        rng = np.random.default_rng(0)
+        embeddings = rng.standard_normal((2000, 16)).astype('float32')
+        index = build_index(embeddings, "ivf_flat", nlist=16)
+        assert not faiss.extract_index_ivf(index).direct_map.no()
+        
+        faiss.write_index(index, str(tmp_path / "index.faiss"))
+        loaded = configure_index(faiss.read_index(str(tmp_path / "index.faiss")))
+        assert np.allclose(loaded.reconstruct(7), embeddings[7])
+    
+    def test_selector_search_with_rerank(self, monkeypatch):
+        """Test the ID selector reaches the compressed index under a re-rank stage"""
+        monkeypatch.setattr(Config, "FILTER_EXACT_MAX", 0)
+        rng = np.random.default_rng(0)
+        embeddings = rng.standard_normal((2000, 16)).astype('float32')
+        index = build_index(embeddings, "hnsw", vector_storage="sq8", rerank_factor=4)
+        ids = np.arange(100, 300, dtype=np.int64)
+        
+        _, indices = filtered_search(index, embeddings[:3], 5, ids)
+        assert np.isin(indices, ids).all()
+    
+    def test_filtered_search_pads_small_subsets(self):
+        """Test fewer allowed ids than k are padded with -1"""
+        embeddings = np.eye(4, dtype='float32')
+        index = build_index(embeddings, "flat")
+        _, indices = filtered_search(index, embeddings[:1], 3, np.array([2], dtype=np.int64))
+        assert indices.tolist() == [[2, -1, -1]]
+        _, indices = filtered_search(index, embeddings[:1], 3, np.empty(0, dtype=np.int64))
+        assert indices.tolist() == [[-1, -1, -1]]
+    
+    def test_agent_search_with_filters(self):
+        """Test the agent only returns documents matching the filters"""
+        agent = FitnessRAGAgent()
+        agent.load_data(self.documents)
+        
+        results = agent.search("beginner exercise", k=4, filters={"exercise": "push_up"})
+        assert [r["exercise"] for r in results] == ["push_up", "push_up"]
+        
+        results = agent.search("pain", k=4, filters={"context": "injury", "exercise": ["squat"]})
+        assert len(results) == 1 and results[0]["condition"] == "knee_pain"
+        assert agent.search("pain", k=4, filters={"exercise": "deadlift"}) == []
+        
+        # Filtered and unfiltered results are cached separately
+        assert len(agent.search("pain", k=4)) == 4
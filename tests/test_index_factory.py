@@ -0,0 +1,125 @@
+import pytest
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+import faiss
+from src.config import Config
+from src.index_factory import (INDEX_TYPES, base_index, build_index, configure_index, index_description,
+                               keeps_rerank_vectors)
+from src.rag_agent import FitnessRAGAgent
+
+def random_vectors(count, dimension=32, seed=0):
+    """Generate normalized random vectors"""
+    vectors = np.random.default_rng(seed).standard_normal((count, dimension)).astype('float32')
+    faiss.normalize_L2(vectors)
+    return vectors
+
+class TestIndexFactory:
+    """Test cases for the index factory"""
+    
+    def test_descriptions(self):
+        """Test factory strings and small-corpus clamping"""
+        assert index_description("flat", 384, 10) == "Flat"
+        assert index_description("hnsw", 384, 10, hnsw_m=16) == "HNSW16"
+        assert index_description("ivf_flat", 384, 100000, nlist=1024) == "IVF1024,Flat"
+        assert index_description("ivf_flat", 384, 100, nlist=1024) == "IVF2,Flat"
+        assert index_description("ivf_pq", 384, 100000, nlist=256, pq_m=16, pq_nbits=8) == "IVF256,PQ16x8"
+        assert index_description("ivf_pq", 30, 10, pq_m=16, pq_nbits=8) == "IVF1,PQ15x3"
+        with pytest.raises(ValueError):
+            index_description("annoy", 384, 10)
+    
+    def test_storage_descriptions(self):
+        """Test compressed vector codes and the optional re-rank stage"""
+        assert index_description("flat", 384, 10, vector_storage="fp16") == "SQfp16"
+        assert index_description("flat", 384, 10, vector_storage="sq8", rerank_factor=4) == "SQ8,RFlat"
+        assert index_description("flat", 384, 10, vector_storage="float32", rerank_factor=4) == "Flat"
+        assert index_description("hnsw", 384, 10, hnsw_m=16, vector_storage="sq8") == "HNSW16_SQ8"
+        assert index_description("ivf_flat", 384, 100000, nlist=256, vector_storage="fp16") == "IVF256,SQfp16"
+        assert index_description("ivf_pq", 384, 100000, nlist=256, pq_m=16, pq_nbits=8,
+                                 rerank_factor=4) == "IVF256,PQ16x8,RFlat"
+        with pytest.raises(ValueError):
+            index_description("flat", 384, 10, vector_storage="int4")
+    
+    def test_rerank_restores_recall(self, tmp_path):
+        """Test exact re-ranking of PQ candidates recovers the float32 top-k, also when mapped"""
+        vectors = random_vectors(2000)
+        queries = vectors[:20] + 0.05 * random_vectors(20, seed=1)
+        _, truth = build_index(vectors, "flat").search(queries, 5)
+        
+        def recall(index):
+            _, ids = index.search(queries, 5)
+            return np.mean([len(set(a) & set(b)) / 5 for a, b in zip(ids, truth)])
+        
+        compressed = build_index(vectors, "flat", vector_storage="pq", pq_m=8, pq_nbits=8)
+        reranked = build_index(vectors, "flat", vector_storage="pq", pq_m=8, pq_nbits=8, rerank_factor=10)
+        assert recall(reranked) == 1.0
+        assert recall(reranked) > recall(compressed)
+        
+        faiss.write_index(reranked, str(tmp_path / "index.faiss"))
+        mapped = configure_index(faiss.read_index(str(tmp_path / "index.faiss"), faiss.IO_FLAG_MMAP_IFC),
+                                 rerank_factor=10)
+        assert mapped.k_factor == 10
+        assert recall(mapped) == 1.0
+    
+    def test_agent_maps_rerank_vectors(self, tmp_path, sample_data, monkeypatch):
+        """Test an index keeping re-rank vectors is served memory-mapped once saved"""
+        monkeypatch.setattr(Config, "VECTOR_STORAGE", "sq8")
+        monkeypatch.setattr(Config, "RERANK_FACTOR", 4)
+        assert keeps_rerank_vectors("flat") and keeps_rerank_vectors("ivf_pq", vector_storage="float32")
+        assert not keeps_rerank_vectors("flat", rerank_factor=0)
+        paths = {"index_file": str(tmp_path / "index.faiss"), "metadata_file": str(tmp_path / "metadata.pkl")}
+        assert not FitnessRAGAgent(mmap=False, **paths).mmap
+        
+        agent = FitnessRAGAgent(**paths)
+        assert agent.mmap
+        agent.load_data(sample_data)
+        assert isinstance(agent.index, faiss.IndexRefine) and not agent.index_mapped
+        agent.save_index()
+        assert agent.index_mapped
+        assert agent.index.k_factor == 4
+        assert len(agent.search("push up", k=2)) == 2
+        
+        # Adds write to an in-RAM copy until the next save maps it again
+        agent.add_document({"exercise": "plank", "context": "core", "condition": "beginner",
+                            "advice": "Hold a kneeling plank."})
+        assert not agent.index_mapped and agent.index.ntotal == 3
+    
+    @pytest.mark.parametrize("index_type", list(INDEX_TYPES))
+    def test_build_and_search(self, index_type):
+        """Test every index type finds a stored vector as its own neighbour"""
+        vectors = random_vectors(2000)
+        index = build_index(vectors, index_type, nlist=16, nprobe=16, pq_m=8, pq_nbits=6)
+        assert index.ntotal == 2000
+        _, ids = index.search(vectors[:5], 1)
+        if index_type != "ivf_pq":
+            assert list(ids[:, 0]) == [0, 1, 2, 3, 4]
+    
+    def test_configure_search_params(self):
+        """Test nprobe and efSearch are applied"""
+        vectors = random_vectors(2000)
+        ivf = configure_index(build_index(vectors, "ivf_flat", nlist=16), nprobe=4)
+        assert faiss.extract_index_ivf(ivf).nprobe == 4
+        hnsw = configure_index(build_index(vectors, "hnsw"), ef_search=99)
+        assert hnsw.hnsw.efSearch == 99
+        refined = configure_index(build_index(vectors, "hnsw", vector_storage="sq8", rerank_factor=2),
+                                  ef_search=77, rerank_factor=8)
+        assert base_index(refined).hnsw.efSearch == 77
+        assert refined.k_factor == 8
+    
+    def test_agent_with_hnsw_index(self, tmp_path, sample_data):
+        """Test the agent builds, saves and reloads a non-flat index"""
+        agent = FitnessRAGAgent(index_file=str(tmp_path / "index.faiss"),
+                                metadata_file=str(tmp_path / "metadata.pkl"), index_type="hnsw")
+        agent.load_data(sample_data)
+        assert hasattr(agent.index, "hnsw")
+        assert agent.search("beginner squat", k=1)[0]['exercise'] == 'squat'
+        agent.save_index()
+        
+        assert agent.load_index()
+        assert hasattr(agent.index, "hnsw")
+        assert len(agent.search("push up", k=2)) == 2
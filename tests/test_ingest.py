@@ -0,0 +1,80 @@
+import io
+import json
+import pytest
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from src.ingest import NDJSONParser, iter_json_array, iter_ndjson
+from src.rag_agent import FitnessRAGAgent
+
+def make_records(count):
+    """Generate simple documents"""
+    exercises = ["squat", "push_up", "deadlift", "lunge"]
+    return [
+        {
+            "exercise": exercises[i % len(exercises)],
+            "context": "personalization",
+            "condition": "beginner",
+            "advice": f"Variation {i}: start light and focus on form."
+        }
+        for i in range(count)
+    ]
+
+class TestParsers:
+    """Test cases for the incremental parsers"""
+    
+    def test_ndjson_split_across_chunks(self):
+        """Test records split across chunk boundaries are reassembled"""
+        records = make_records(5)
+        data = "\n".join(json.dumps(r) for r in records).encode("utf-8")
+        assert list(iter_ndjson(io.BytesIO(data), chunk_size=7)) == records
+    
+    def test_ndjson_rejects_incomplete_record(self):
+        """Test records missing fields are rejected with their position"""
+        parser = NDJSONParser()
+        with pytest.raises(ValueError, match="Record 2"):
+            parser.feed(b'{"exercise": "squat", "context": "c", "condition": "b", "advice": "a"}\n{"exercise": "x"}\n')
+    
+    def test_json_array_streaming(self):
+        """Test a JSON array is parsed incrementally"""
+        records = make_records(6)
+        assert list(iter_json_array(io.StringIO(json.dumps(records)), chunk_size=5)) == records
+    
+    def test_json_array_truncated(self):
+        """Test a truncated array is reported"""
+        with pytest.raises(ValueError):
+            list(iter_json_array(io.StringIO(json.dumps(make_records(2))[:-20]), chunk_size=5))
+
+class TestIngestion:
+    """Test cases for batched ingestion"""
+    
+    def test_ingest_replace(self):
+        """Test documents are embedded and indexed batch by batch"""
+        agent = FitnessRAGAgent()
+        progress = []
+        stats = agent.ingest(iter(make_records(10)), batch_size=4, progress=progress.append)
+        assert stats['documents'] == 10
+        assert stats['batches'] == 3
+        assert [p['documents'] for p in progress] == [4, 8, 10]
+        assert agent.index.ntotal == 10
+        assert len(agent.documents) == 10
+        assert agent.search("deadlift", k=1)
+    
+    def test_ingest_append(self):
+        """Test appending keeps the existing corpus"""
+        agent = FitnessRAGAgent()
+        agent.load_data(make_records(3))
+        agent.ingest(make_records(5), batch_size=2, replace=False)
+        assert agent.index.ntotal == 8
+        assert len(agent.documents) == 8
+    
+    def test_ingest_trains_ivf_index(self):
+        """Test trained index types are trained on the first batches"""
+        agent = FitnessRAGAgent(index_type="ivf_flat")
+        agent.ingest(make_records(100), batch_size=16)
+        assert agent.index.is_trained
+        assert agent.index.ntotal == 100
+        assert [r['advice'] for r in agent.documents] == [r['advice'] for r in make_records(100)]
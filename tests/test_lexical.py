@@ -0,0 +1,83 @@
+import pytest
+import sys
+import numpy as np
+from pathlib import Path
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from src.lexical import BM25Index, reciprocal_rank_fusion, tokenize, weighted_fusion
+from src.rag_agent import FitnessRAGAgent
+
+class TestLexical:
+    """Test cases for BM25 retrieval and rank fusion"""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self, sample_data):
+        """Setup test data"""
+        self.documents = sample_data + [
+            {"exercise": "deadlift", "context": "injury", "condition": "back_pain",
+             "advice": "Use a trap bar and keep the spine neutral."}
+        ]
+    
+    def test_tokenize(self):
+        """Test tokens are lowercase and split on punctuation and underscores"""
+        assert tokenize("Push_up: Wall-Push-ups!") == ["push", "up", "wall", "push", "ups"]
+    
+    def test_bm25_ranking(self):
+        """Test documents containing rarer query terms rank first"""
+        index = BM25Index()
+        index.add(self.documents)
+        scores, ids = index.search("trap bar deadlift", 3)
+        assert ids.tolist() == [2]
+        scores, ids = index.search("beginner squats", 3)
+        assert ids.tolist() == [0, 1]
+        assert scores[0] > scores[1]
+        assert len(index.search("unknown", 3)[1]) == 0
+    
+    def test_bm25_allowed_and_incremental(self):
+        """Test allowed ids restrict results and added documents are searchable"""
+        index = BM25Index()
+        index.add(self.documents[:2])
+        index.add(self.documents[2:])
+        assert index.search("beginner", 3, allowed=np.array([1]))[1].tolist() == [1]
+        assert index.search("spine", 3)[1].tolist() == [2]
+    
+    def test_fusion(self):
+        """Test documents ranked by both retrievers come first"""
+        scores, ids = reciprocal_rank_fusion([np.array([1, 2, 3]), np.array([2, 4])], k=3)
+        assert ids.tolist() == [2, 1, 4]
+        scores, ids = weighted_fusion([(np.array([0.9, 0.8, 0.1]), np.array([1, 2, 5])),
+                                       (np.array([3.0, 1.0]), np.array([2, 3]))], [0.5, 0.5], k=2)
+        assert ids.tolist() == [2, 1]
+    
+    def test_agent_search_modes(self):
+        """Test lexical and hybrid modes through the agent"""
+        agent = FitnessRAGAgent()
+        agent.load_data(self.documents)
+        
+        lexical = agent.search("trap bar", k=3, mode="lexical")
+        assert [r["exercise"] for r in lexical] == ["deadlift"]
+        for fusion in ("rrf", "weighted"):
+            hybrid = agent.search("trap bar", k=3, mode="hybrid", fusion=fusion)
+            assert hybrid[0]["exercise"] == "deadlift"
+            assert [r["rank"] for r in hybrid] == list(range(1, len(hybrid) + 1))
+        
+        agent.add_document({"exercise": "lunge", "context": "injury", "condition": "knee_pain",
+                            "advice": "Shorten the stride."})
+        assert agent.search("stride", k=1, mode="lexical")[0]["exercise"] == "lunge"
+        with pytest.raises(ValueError):
+            agent.search("squat", mode="sparse")
+    
+    def test_lexical_index_rebuilt_after_load(self, tmp_path):
+        """Test the BM25 index is rebuilt lazily from a loaded snapshot"""
+        agent = FitnessRAGAgent(index_file=str(tmp_path / "index.faiss"),
+                                metadata_file=str(tmp_path / "meta.pkl"))
+        agent.load_data(self.documents)
+        agent.save_index()
+        
+        loaded = FitnessRAGAgent(index_file=str(tmp_path / "index.faiss"),
+                                 metadata_file=str(tmp_path / "meta.pkl"))
+        assert loaded.load_index()
+        assert loaded.lexical is None
+        assert loaded.search("spine", k=1, mode="lexical")[0]["exercise"] == "deadlift"
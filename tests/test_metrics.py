@@ -0,0 +1,65 @@
+import pytest
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from src.metrics import METRICS, Histogram, MetricsRegistry
+from src.rag_agent import STAGES, FitnessRAGAgent
+
+class TestMetrics:
+    """Test cases for latency histograms and the Prometheus rendering"""
+    
+    def test_histogram_buckets_and_quantiles(self):
+        """Test observations land in the first bucket bounding them"""
+        histogram = Histogram(buckets=(0.001, 0.01, 0.1))
+        for value in [0.0005, 0.001, 0.005, 0.05, 0.5]:
+            histogram.observe(value)
+        counts, total, count = histogram.snapshot()
+        assert counts == [2, 1, 1, 1]
+        assert count == 5 and total == pytest.approx(0.5565)
+        assert histogram.quantile(0.5) == 0.01
+        assert histogram.quantile(0.99) == float("inf")
+    
+    def test_render_prometheus_text(self):
+        """Test buckets are cumulative with a +Inf bucket, and labels are escaped"""
+        registry = MetricsRegistry(enabled=True)
+        histogram = registry.histogram("demo_seconds", "Demo latency", buckets=(0.01, 0.1), route='/a"b')
+        histogram.observe(0.005)
+        histogram.observe(0.05)
+        histogram.observe(1.0)
+        registry.set_gauge("demo_documents", 7, "Demo gauge")
+        lines = registry.render().splitlines()
+        assert "# TYPE demo_seconds histogram" in lines
+        assert 'demo_seconds_bucket{route="/a\\"b",le="0.01"} 1' in lines
+        assert 'demo_seconds_bucket{route="/a\\"b",le="0.1"} 2' in lines
+        assert 'demo_seconds_bucket{route="/a\\"b",le="+Inf"} 3' in lines
+        assert 'demo_seconds_count{route="/a\\"b"} 3' in lines
+        assert "demo_documents 7" in lines
+        stats = registry.get_stats()['demo_seconds{route="/a\\"b"}']
+        assert stats["count"] == 3 and stats["p99_ms"] is None
+    
+    def test_disabled_registry_records_nothing(self):
+        """Test timers are no-ops when metrics are disabled"""
+        histogram = MetricsRegistry(enabled=False).histogram("off_seconds", "Off")
+        with histogram.time():
+            pass
+        histogram.observe(1.0)
+        assert histogram.snapshot()[2] == 0
+    
+    def test_agent_times_query_stages(self, tmp_path):
+        """Test a query records every hot-path stage once"""
+        agent = FitnessRAGAgent(index_file=str(tmp_path / "index.faiss"),
+                                metadata_file=str(tmp_path / "metadata.pkl"))
+        agent.load_data([
+            {"exercise": "squat", "context": "personalization", "condition": "beginner",
+             "advice": "Start with bodyweight squats and focus on form."},
+            {"exercise": "push_up", "context": "injury", "condition": "wrist_pain",
+             "advice": "Use push-up handles to keep the wrists neutral."}
+        ])
+        before = {stage: agent.stage_timers[stage].snapshot()[2] for stage in STAGES}
+        agent.query("a squat question nobody asked before", k=2)
+        after = {stage: agent.stage_timers[stage].snapshot()[2] for stage in STAGES}
+        assert all(after[stage] == before[stage] + 1 for stage in STAGES)
+        assert "fitness_rag_stage_seconds_bucket" in METRICS.render()
@@ -0,0 +1,137 @@
+import asyncio
+import json
+import pytest
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from src.batching import QueryBatcher
+from src.profiling import RequestProfiler, run_profiled
+
+def _work(n: int) -> int:
+    return sum(i * i for i in range(n))
+
+class TestProfiling:
+    """Test cases for sampled and slow-request profiling"""
+    
+    def test_disabled_by_default(self, tmp_path):
+        """Test nothing is profiled without a sample rate or threshold"""
+        profiler = RequestProfiler(sample_rate=0, slow_ms=0, directory=str(tmp_path))
+        assert not profiler.enabled
+        with profiler.profile("/query") as session:
+            assert session is None
+            assert run_profiled(session, _work, 10) == 285
+        assert list(tmp_path.iterdir()) == []
+    
+    def test_sampled_request_saved(self, tmp_path):
+        """Test a sampled request writes a .prof and its metadata"""
+        profiler = RequestProfiler(sample_rate=1.0, slow_ms=0, directory=str(tmp_path))
+        with profiler.profile("/query", {"query": "squat form", "k": 3}) as session:
+            run_profiled(session, _work, 1000)
+        
+        assert profiler.saved == 1
+        prof = Path(profiler.last_saved)
+        assert prof.exists() and prof.name.endswith(".prof") and "_query_" in prof.name
+        metadata = json.loads(prof.with_suffix(".json").read_text())
+        assert metadata["endpoint"] == "/query"
+        assert metadata["status"] == 200
+        assert metadata["reason"] == "sampled"
+        assert metadata["request"] == {"query": "squat form", "k": 3}
+        assert any("_work" in row["function"] for row in metadata["top_functions"])
+    
+    def test_other_endpoints_ignored(self, tmp_path):
+        """Test only the configured endpoints are profiled"""
+        profiler = RequestProfiler(sample_rate=1.0, directory=str(tmp_path), endpoints="/load_data")
+        with profiler.profile("/query") as session:
+            assert session is None
+    
+    def test_slow_threshold(self, tmp_path):
+        """Test only requests over the threshold are kept"""
+        profiler = RequestProfiler(sample_rate=0, slow_ms=50, directory=str(tmp_path))
+        with profiler.profile("/query") as session:
+            run_profiled(session, _work, 10)
+        assert profiler.profiled == 1 and profiler.saved == 0
+        
+        with profiler.profile("/query") as session:
+            run_profiled(session, time.sleep, 0.06)
+        assert profiler.saved == 1
+        metadata = json.loads(Path(profiler.last_saved).with_suffix(".json").read_text())
+        assert metadata["reason"] == "slow" and metadata["elapsed_ms"] >= 50
+    
+    def test_error_status_recorded(self, tmp_path):
+        """Test the status comes from the exception leaving the block"""
+        class NotFound(Exception):
+            status_code = 404
+        
+        profiler = RequestProfiler(sample_rate=1.0, directory=str(tmp_path))
+        with pytest.raises(NotFound):
+            with profiler.profile("/query") as session:
+                run_profiled(session, _work, 10)
+                raise NotFound()
+        metadata = json.loads(Path(profiler.last_saved).with_suffix(".json").read_text())
+        assert metadata["status"] == 404
+    
+    def test_prune_keeps_newest(self, tmp_path):
+        """Test old profiles are deleted beyond max_files"""
+        profiler = RequestProfiler(sample_rate=1.0, directory=str(tmp_path), max_files=2)
+        for _ in range(4):
+            with profiler.profile("/query") as session:
+                run_profiled(session, _work, 10)
+            time.sleep(0.01)
+        
+        assert profiler.saved == 4
+        assert len(list(tmp_path.glob("*.prof"))) == 2
+        assert len(list(tmp_path.glob("*.json"))) == 2
+        assert Path(profiler.last_saved).exists()
+    
+    def test_one_session_at_a_time(self, tmp_path):
+        """Test requests arriving while one is profiled run unprofiled instead of failing"""
+        profiler = RequestProfiler(sample_rate=1.0, directory=str(tmp_path))
+        with profiler.profile("/query") as session:
+            assert session is not None
+            with profiler.profile("/query") as other:
+                assert other is None
+                assert run_profiled(other, _work, 10) == 285
+        assert profiler.profiled == 1 and profiler.skipped == 1
+        
+        # The slot is free again once the profiled request finished
+        with profiler.profile("/query") as session:
+            assert session is not None
+    
+    def test_concurrent_calls_share_session(self, tmp_path):
+        """Test threads running work of one session concurrently never enable the profiler twice"""
+        profiler = RequestProfiler(sample_rate=1.0, directory=str(tmp_path))
+        with profiler.profile("/query") as session:
+            results = []
+            threads = [threading.Thread(target=lambda: results.append(session.call(_work, 100000)))
+                       for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        assert len(results) == 4 and len(set(results)) == 1
+        assert profiler.saved == 1
+    
+    def test_profiled_query_stays_batched(self, tmp_path):
+        """Test a profiled query shares its batch and the batch search runs under its session"""
+        calls = []
+        
+        async def search_fn(queries, k, filters=None, mode=None, fusion=None, session=None):
+            calls.append((list(queries), session))
+            return [[{"query": query}] for query in queries]
+        
+        profiler = RequestProfiler(sample_rate=1.0, directory=str(tmp_path))
+        
+        async def run():
+            batcher = QueryBatcher(None, max_batch_size=2, max_wait_ms=50, search_fn=search_fn)
+            with profiler.profile("/query") as session:
+                return session, await asyncio.gather(batcher.search("squat", session=session),
+                                                     batcher.search("push up"))
+        
+        session, results = asyncio.run(run())
+        assert results == [[{"query": "squat"}], [{"query": "push up"}]]
+        assert calls == [(["squat", "push up"], session)]
@@ -0,0 +1,97 @@
+import pytest
+import sys
+import threading
+from pathlib import Path
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from src.rag_agent import FitnessRAGAgent
+from src.sharding import (ShardClient, ShardedAgent, ShardError, ShardServer, parse_addresses,
+                          shard_for, shard_path)
+
+class TestSharding:
+    """Test cases for the sharded coordinator and shard RPC"""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self, sample_data):
+        """Setup test data"""
+        self.documents = sample_data + [
+            {"exercise": "squat", "context": "injury", "condition": "knee_pain",
+             "advice": "Reduce depth and keep the knees tracking over the toes."},
+            {"exercise": "push_up", "context": "injury", "condition": "wrist_pain",
+             "advice": "Use push-up handles to keep the wrists neutral."},
+            {"exercise": "plank", "context": "personalization", "condition": "beginner",
+             "advice": "Hold a kneeling plank for twenty seconds."},
+            {"exercise": "lunge", "context": "injury", "condition": "knee_pain",
+             "advice": "Shorten the stride and keep the front shin vertical."}
+        ]
+    
+    def test_partitioning(self):
+        """Test shard assignment is stable and exercise partitioning groups an exercise"""
+        owners = [shard_for(document, 3, "hash") for document in self.documents]
+        assert owners == [shard_for(document, 3, "hash") for document in self.documents]
+        assert all(0 <= owner < 3 for owner in owners)
+        squats = {shard_for(document, 3, "exercise") for document in self.documents
+                  if document["exercise"] == "squat"}
+        assert len(squats) == 1
+    
+    def test_paths_and_addresses(self):
+        """Test shard file naming and address parsing"""
+        assert shard_path("storage/index.faiss", 2) == "storage/index.shard2.faiss"
+        assert parse_addresses("10.0.0.1:9001, 10.0.0.2:9002,") == [("10.0.0.1", 9001), ("10.0.0.2", 9002)]
+    
+    def test_rpc_round_trip(self, tmp_path):
+        """Test a client reaches a server's agent and errors keep their type"""
+        agent = FitnessRAGAgent(index_file=str(tmp_path / "index.faiss"),
+                                metadata_file=str(tmp_path / "metadata.pkl"))
+        server = ShardServer(agent, ("127.0.0.1", 0), b"secret")
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        
+        client = ShardClient(server.address, b"secret")
+        assert client.call("ping")["documents"] == 0
+        assert client.call("search", ["squat"], 3, None, "dense", "rrf", None) == [[]]
+        with pytest.raises(ValueError):
+            client.call("drop_everything")
+        with pytest.raises(ShardError):
+            ShardClient(server.address, b"wrong").call("ping")
+        
+        client.call("shutdown")
+        thread.join(timeout=10)
+        assert not thread.is_alive()
+    
+    def test_scatter_gather_matches_single_agent(self, tmp_path):
+        """Test sharded search, adds and rebuilds against one unsharded agent"""
+        single = FitnessRAGAgent(index_file=str(tmp_path / "single.faiss"),
+                                 metadata_file=str(tmp_path / "single.pkl"))
+        single.load_data(self.documents)
+        
+        with ShardedAgent(2, "exercise", addresses="", index_file=str(tmp_path / "index.faiss"),
+                          metadata_file=str(tmp_path / "metadata.pkl")) as sharded:
+            sharded.load_data(self.documents)
+            assert sharded.get_stats()["total_documents"] == len(self.documents)
+            
+            for query in ["knee pain when squatting", "beginner push up"]:
+                expected = [(r["advice"], r["rank"]) for r in single.search(query, k=4)]
+                assert [(r["advice"], r["rank"]) for r in sharded.search(query, k=4)] == expected
+            
+            # Exercise filters only visit the shard owning the exercise
+            assert len(sharded.route({"exercise": "squat"})) == 1
+            results = sharded.search("advice", k=5, filters={"exercise": "squat"})
+            assert [r["exercise"] for r in results] == ["squat", "squat"]
+            
+            document = {"exercise": "squat", "context": "injury", "condition": "back_pain",
+                        "advice": "Brace the core and keep a neutral spine."}
+            sharded.add_document(document)
+            assert sharded.get_stats()["total_documents"] == len(self.documents) + 1
+            owner = shard_for(document, 2, "exercise")
+            assert sharded.rebuild_shard(owner) == sharded.get_stats()["shards"][owner]["total_documents"]
+            
+            with pytest.raises(ValueError):
+                sharded.search("squat", mode="bogus")
+        
+        # Shards persisted their partitions
+        with ShardedAgent(2, "exercise", addresses="", index_file=str(tmp_path / "index.faiss"),
+                          metadata_file=str(tmp_path / "metadata.pkl")) as reopened:
+            assert reopened.get_stats()["total_documents"] == len(self.documents) + 1
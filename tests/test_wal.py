@@ -0,0 +1,166 @@
+import pytest
+import sys
+import threading
+from pathlib import Path
+
+import numpy as np
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from src.wal import WriteAheadLog
+from src.rag_agent import FitnessRAGAgent
+from src.rwlock import FileLock
+
+SNAPSHOT = b"0123456789abcdef"
+
+class TestWriteAheadLog:
+    """Test cases for WriteAheadLog"""
+    
+    def test_append_and_replay(self, tmp_path):
+        """Test records round-trip through the log"""
+        wal = WriteAheadLog(str(tmp_path / "test.wal"), sync_mode="always")
+        wal.reset(SNAPSHOT)
+        wal.append(0, {"exercise": "squat"}, np.ones(4, dtype='float32'))
+        wal.append(1, {"exercise": "lunge"}, np.zeros(4, dtype='float32'))
+        wal.close()
+        
+        snapshot_id, records = WriteAheadLog(str(tmp_path / "test.wal")).replay()
+        assert snapshot_id == SNAPSHOT
+        assert [seq for seq, _, _ in records] == [0, 1]
+        assert records[1][1] == {"exercise": "lunge"}
+        assert records[0][2].tolist() == [1.0] * 4
+    
+    def test_torn_tail_is_dropped(self, tmp_path):
+        """Test a partially written record is ignored and truncated on open"""
+        path = tmp_path / "test.wal"
+        wal = WriteAheadLog(str(path), sync_mode="none")
+        wal.reset(SNAPSHOT)
+        wal.append(0, {"exercise": "squat"}, np.ones(4, dtype='float32'))
+        wal.close()
+        with open(path, 'ab') as f:
+            f.write(b"\x40\x00\x00\x00garbage")
+        
+        wal = WriteAheadLog(str(path), sync_mode="none")
+        assert len(wal.replay()[1]) == 1
+        wal.open(SNAPSHOT)
+        wal.append(1, {"exercise": "lunge"}, np.ones(4, dtype='float32'))
+        wal.close()
+        assert [seq for seq, _, _ in wal.replay()[1]] == [0, 1]
+    
+    def test_open_discards_stale_log(self, tmp_path):
+        """Test a log written for another snapshot is discarded"""
+        wal = WriteAheadLog(str(tmp_path / "test.wal"), sync_mode="none")
+        wal.reset(SNAPSHOT)
+        wal.append(0, {"exercise": "squat"}, np.ones(4, dtype='float32'))
+        wal.open(b"fedcba9876543210")
+        assert wal.records == 0
+        assert wal.replay() == (b"fedcba9876543210", [])
+        wal.close()
+    
+    def test_group_commit(self, tmp_path):
+        """Test concurrent appends become durable through shared fsyncs"""
+        wal = WriteAheadLog(str(tmp_path / "test.wal"), sync_mode="group", group_commit_ms=5)
+        wal.reset(SNAPSHOT)
+        
+        def writer(seq):
+            wal.wait_durable(wal.append(seq, {"seq": seq}, np.ones(4, dtype='float32')))
+        
+        threads = [threading.Thread(target=writer, args=(seq,)) for seq in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+        wal.close()
+        assert len(wal.replay()[1]) == 8
+
+class TestAgentRecovery:
+    """Test cases for WAL-backed persistence in the agent"""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self, sample_data):
+        """Setup test data"""
+        self.sample_data = sample_data
+        self.new_doc = {
+            "exercise": "deadlift",
+            "context": "personalization",
+            "condition": "beginner",
+            "advice": "Start with light weight and focus on form."
+        }
+    
+    def make_agent(self, tmp_path):
+        return FitnessRAGAgent(index_file=str(tmp_path / "index.faiss"),
+                               metadata_file=str(tmp_path / "metadata.pkl"))
+    
+    def test_replay_unsnapshotted_adds(self, tmp_path):
+        """Test documents added after the last snapshot survive a restart"""
+        agent = self.make_agent(tmp_path)
+        agent.load_data(self.sample_data)
+        agent.save_index()
+        agent.add_document(self.new_doc)
+        assert agent.get_wal_stats()['pending_records'] == 1
+        
+        restarted = self.make_agent(tmp_path)
+        assert restarted.load_index()
+        assert len(restarted.documents) == 3
+        assert restarted.index.ntotal == 3
+        assert restarted.documents[2] == self.new_doc
+        assert restarted.search("deadlift light weight", k=3)
+    
+    def test_compact_folds_log(self, tmp_path):
+        """Test compaction writes a snapshot and empties the log"""
+        agent = self.make_agent(tmp_path)
+        agent.load_data(self.sample_data)
+        agent.save_index()
+        agent.add_document(self.new_doc)
+        assert not agent.compact(min_records=2)
+        assert agent.compact()
+        assert agent.get_wal_stats()['pending_records'] == 0
+        
+        restarted = self.make_agent(tmp_path)
+        assert restarted.load_index()
+        assert len(restarted.documents) == 3
+        assert restarted.compact() is False
+    
+    def test_compact_takes_snapshot_lock_first(self, tmp_path):
+        """Test a compaction waiting on the shared snapshot lock does not hold the write lock"""
+        agent = self.make_agent(tmp_path)
+        agent.snapshot_lock = FileLock(str(tmp_path / "index.lock"))
+        agent.load_data(self.sample_data)
+        agent.save_index()
+        agent.add_document(self.new_doc)
+        
+        holding, release = threading.Event(), threading.Event()
+        
+        def other_writer():
+            with agent.snapshot_lock.exclusive():
+                holding.set()
+                release.wait(timeout=10)
+        
+        writer = threading.Thread(target=other_writer)
+        writer.start()
+        holding.wait(timeout=10)
+        compactor = threading.Thread(target=agent.compact)
+        compactor.start()
+        try:
+            assert agent._write_lock.acquire(timeout=1)
+            agent._write_lock.release()
+        finally:
+            release.set()
+            writer.join(timeout=10)
+            compactor.join(timeout=10)
+        assert agent.get_wal_stats()['pending_records'] == 0
+    
+    def test_unsaved_corpus_is_not_logged(self, tmp_path):
+        """Test adds on top of an unsaved load_data are not replayed onto the old snapshot"""
+        agent = self.make_agent(tmp_path)
+        agent.load_data(self.sample_data)
+        agent.save_index()
+        
+        agent.load_data(self.sample_data[:1])
+        assert not agent.is_durable()
+        agent.add_document(self.new_doc)
+        
+        restarted = self.make_agent(tmp_path)
+        assert restarted.load_index()
+        assert len(restarted.documents) == 2
@@ -0,0 +1,84 @@
+import pytest
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Add src to path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from src.config import Config
+from src.rag_agent import FitnessRAGAgent
+from src.rwlock import FileLock
+from src.workers import SharedIndex, prepare_shared_index, snapshot_signature
+
+class TestSharedIndex:
+    """Test cases for worker processes sharing one snapshot"""
+    
+    @pytest.fixture(autouse=True)
+    def setup(self, sample_data):
+        """Setup test data"""
+        self.sample_data = sample_data
+    
+    def worker(self, tmp_path) -> SharedIndex:
+        """An agent set up the way an API worker is"""
+        agent = FitnessRAGAgent(index_file=str(tmp_path / "index.faiss"),
+                                metadata_file=str(tmp_path / "metadata.bin"), mmap=True)
+        return SharedIndex(agent, poll_seconds=0.05)
+    
+    def add_and_save(self, agent, advice):
+        agent.add_document({"exercise": "plank", "context": "core", "condition": "beginner", "advice": advice})
+        agent.save_index()
+    
+    def test_file_lock(self, tmp_path):
+        """Test the exclusive side is reentrant and keeps other threads' shared side out"""
+        lock = FileLock(str(tmp_path / "index.lock"))
+        entered = threading.Event()
+        
+        def reader():
+            with lock.shared():
+                entered.set()
+        
+        with lock.exclusive():
+            with lock.exclusive(), lock.shared():
+                pass
+            thread = threading.Thread(target=reader)
+            thread.start()
+            assert not entered.wait(0.2)
+        assert entered.wait(5)
+        thread.join(timeout=5)
+        assert lock.get_stats()["exclusive_acquisitions"] == 1
+    
+    def test_workers_follow_writes(self, tmp_path, monkeypatch):
+        """Test a write in one worker is saved, mapped back and picked up by the others"""
+        monkeypatch.setattr(Config, "METADATA_FORMAT", "offsets")
+        monkeypatch.setattr(Config, "WAL_ENABLED", False)
+        monkeypatch.setattr(Config, "EMBEDDING_STORE_ENABLED", False)
+        monkeypatch.setattr(Config, "DATA_FILE", str(tmp_path / "missing.json"))
+        first, second = self.worker(tmp_path), self.worker(tmp_path)
+        assert not prepare_shared_index()
+        
+        first.agent.load_data(self.sample_data)
+        first.agent.save_index()
+        assert first.start() and second.start()
+        assert first.agent.index_mapped and second.agent.index_mapped
+        
+        # The second worker writes without having seen the first one's add
+        first.write(self.add_and_save, first.agent, "Hold a kneeling plank.")
+        second.write(self.add_and_save, second.agent, "Hold a forearm plank.")
+        assert second.agent.index_mapped
+        assert len(second.agent.documents) == second.agent.index.ntotal == 4
+        
+        # The watcher reloads the first worker
+        deadline = time.time() + 10
+        while len(first.agent.documents) < 4 and time.time() < deadline:
+            time.sleep(0.05)
+        results = first.agent.search("forearm plank", k=1, mode="lexical")
+        assert results[0]["advice"] == "Hold a forearm plank."
+        stats = first.get_stats()
+        assert stats["reloads"] >= 2 and not stats["stale"] and stats["mapped"]
+        assert first.refresh() is False
+        
+        first.stop()
+        second.stop()
+        assert snapshot_signature(str(tmp_path / "index.faiss"), str(tmp_path / "metadata.bin")) is not None